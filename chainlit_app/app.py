@@ -3,187 +3,217 @@ Fixed Chainlit application for the Virtual Gynecology Chatbot.
 """
 
 import chainlit as cl
-import os
+from chainlit.input_widget import Select, Switch
 from dotenv import load_dotenv
-import openai
-import google.generativeai as genai
 import asyncio
 import uuid
 from config import config
+from services.conversation_store import ConversationStore
+from services.conversation_backends import create_backend
+from services.tokens import count_tokens
+from services.summarizer import refresh_summary
+from services.providers import providers
+from services.metrics import Gauge, metrics
+from services.circuit_breaker import get_breaker
+from services.concurrency import PRIMARY, SECONDARY, ProviderBusy, request_priority
+from services.faq_index import get_faq_index
+from services.routing import router
+from services.turns import TurnCancelled, turns
+from components.comparison import ComparisonPanel
 
 # Load environment variables
 load_dotenv()
 
-# Configure API keys
-openai_api_key = os.getenv("OPENAI_API_KEY", "")
-gemini_api_key = os.getenv("GEMINI_API_KEY", "")
-
-# Configure models
-openai_model = os.getenv("OPENAI_MODEL", "gpt-4")
-gemini_model = os.getenv("GEMINI_MODEL", "gemini-pro")
-
-# Configure OpenAI
-if config.llms["openai"].api_key:
-    openai.api_key = config.llms["openai"].api_key
-else:
-    print("Warning: OpenAI API key not found in config. OpenAI features will be limited.")
-
-# Configure Gemini
-if gemini_api_key:
-    genai.configure(api_key=gemini_api_key)
-else:
-    print("Warning: Gemini API key not found in config. Gemini features will be limited.")
-
-
-# System prompt for gynecology assistant
-SYSTEM_PROMPT = """
-You are a virtual gynecology assistant designed to provide support, information,
-and reassurance to users with gynecological concerns. Provide clear, accurate,
-and concise information. Emphasize when symptoms are likely benign, but always
-recommend consulting a healthcare provider for proper diagnosis when appropriate.
-Do not provide definitive diagnoses. Be supportive, informative, and reassuring.
-"""
+# Providers are imported and initialized on first use by the provider registry;
+# disabled providers, or those without an API key, are skipped entirely
+for provider, llm in config.llms.items():
+    if llm.enabled and not llm.api_key:
+        print(f"Warning: {llm.display_name} API key not found in config. {llm.display_name} responses will be unavailable.")
+
+# Store chat histories and settings per conversation ID. Idle conversations
+# are evicted from memory after the Chainlit session timeout and the store is
+# bounded; with a persistent backend (CONVERSATION_BACKEND) changes are
+# written behind in batches, so conversations survive restarts and can be
+# served by any worker.
+conversations = ConversationStore(
+    ttl=config.conversation_ttl,
+    max_conversations=config.max_conversations,
+    max_bytes_per_conversation=config.max_conversation_bytes,
+    backend=create_backend(),
+    flush_interval=config.conversation_flush_interval
+)
+
+# Report the live conversation count when metrics are scraped
+metrics.register(Gauge(
+    "chat_live_conversations",
+    "Conversations currently held in the store.",
+    collect=lambda: {(): len(conversations)}
+))
+
+if config.metrics_enabled:
+    from chainlit.server import app as server
+    from fastapi.responses import PlainTextResponse
+    
+    async def metrics_endpoint():
+        """Serve the app's metrics in the Prometheus text format."""
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+    
+    server.add_api_route(config.metrics_path, metrics_endpoint, methods=["GET"], include_in_schema=False)
+    # Chainlit's catch-all frontend route would otherwise shadow the endpoint
+    server.router.routes.insert(0, server.router.routes.pop())
+
+# Keep references to background tasks so they aren't garbage collected mid-flight
+background_tasks = set()
+
+# Recent turns per session whose other model responses can still be requested
+COMPARABLE_TURNS = 5
 
-# Store chat histories using conversation IDs instead of user session IDs
-chat_histories = {}
-# Store user settings using conversation IDs
-user_settings = {}
+# Primary model choice that routes each turn to the fastest healthy provider
+AUTO_MODEL = "Auto"
 
 # Generate a unique conversation ID for each chat
 async def get_conversation_id():
     """Get a unique conversation ID for the current chat."""
-    # Create a random ID if none exists
-    session_id = str(uuid.uuid4())
+    # Use the Chainlit thread ID, so a resumed thread finds its conversation;
+    # create a random ID if there is none
+    session_id = getattr(cl.context.session, "thread_id", None) or str(uuid.uuid4())
     return session_id
 
-async def get_openai_response(user_message, chat_history=None):
-    """Get response from OpenAI's GPT model."""
-    if not openai_api_key:
-        return "Error: OpenAI API key not configured."
-    
-    try:
-        # Create messages array with system prompt
-        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-        
-        # Add chat history if provided
-        if chat_history:
-            messages.extend(chat_history)
-        
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
-        
-        # Call OpenAI API
-        response = await openai.ChatCompletion.acreate(
-            model=config.llms["openai"].model_id, # Use model_id from config
-            messages=messages,
-            max_tokens=config.llms["openai"].max_tokens,
-            temperature=config.llms["openai"].temperature
-        )
-        # response = await openai.ChatCompletion.acreate(
-        #     model=openai_model,
-        #     messages=messages,
-        #     max_tokens=500,
-        #     temperature=0.7
-        # )
-        
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"Error generating response from ChatGPT: {str(e)}"
+def run_in_background(coro):
+    """Run a coroutine as a background task, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
 
-async def get_gemini_response(user_message, chat_history=None):
-    """Get response from Google's Gemini model."""
-    if not gemini_api_key:
-        return "Error: Gemini API key not configured."
+def build_history(conversation, provider, user_message):
+    """Return the history to send to a provider, in its format and fitted to its token budget.
     
-    try:
-        # Format history for Gemini
-        formatted_history = []
-        
-        # Add system instruction
-        formatted_history.append({
-            "role": "user",
-            "parts": [{"text": SYSTEM_PROMPT}]
-        })
-        
-        # Add chat history if provided
-        if chat_history:
-            for msg in chat_history:
-                role = "user" if msg["role"] == "user" else "model"
-                formatted_history.append({
-                    "role": role,
-                    "parts": [{"text": msg["content"]}]
-                })
-        
-        # Add current user message
-        formatted_history.append({
-            "role": "user",
-            "parts": [{"text": user_message}]
-        })
-        
-        # Make synchronous call in executor to be async-compatible
-        loop = asyncio.get_event_loop()
-        
+    The budget is what remains of the provider's context after the system
+    prompt, the new message and the completion allowance.
+    """
+    llm = config.llms[provider]
+    budget = (
+        llm.context_tokens
+        - llm.max_tokens
+        - count_tokens(config.system_prompt)
+        - count_tokens(user_message)
+    )
+    return conversation.window(max(0, budget), provider)
 
-        def generate_response():
-            try:
-                generation_config = {
-                    "temperature": config.llms["gemini"].temperature,    # Use config
-                    "max_output_tokens": config.llms["gemini"].max_tokens, # Use config
-                }
+async def generate_summary(prompt):
+    """Generate a history summary with the configured summary provider."""
+    if not providers.is_enabled(config.summary_provider):
+        return None
+    
+    summary = await providers.get(config.summary_provider).generate_response(prompt)
+    if summary.startswith("Error"):
+        cl.logger.warning(f"History summarization failed: {summary}")
+        return None
+    return summary
 
-                model = genai.GenerativeModel(
-                    model_name=config.llms["gemini"].model_id, # Use config
-                    generation_config=generation_config
-                )
+def schedule_summary(conversation):
+    """Refresh the conversation's rolling summary in the background, between turns."""
+    run_in_background(
+        refresh_summary(conversation, generate_summary, config.history_window_tokens)
+    )
 
-                response = model.generate_content(formatted_history)
-                return response.text
-            except Exception as e:
-                return f"Error in Gemini generation: {str(e)}"
+def stream_into(msg, prefix=""):
+    """Return an ``on_token`` callback that streams tokens into a Chainlit message.
+    
+    The first token replaces whatever placeholder the message currently holds
+    (optionally preceded by ``prefix``); later tokens are appended.
+    """
+    started = False
+    
+    async def on_token(token):
+        nonlocal started
+        if not started:
+            started = True
+            await msg.stream_token(prefix + token, is_sequence=True)
+        else:
+            await msg.stream_token(token)
+    
+    return on_token
 
-        response_text = await loop.run_in_executor(None, generate_response)
-        return response_text
+def fan_out(*callbacks):
+    """Return an ``on_token`` callback that forwards each token to every given callback."""
+    callbacks = [callback for callback in callbacks if callback]
+    if len(callbacks) <= 1:
+        return callbacks[0] if callbacks else None
+    
+    async def on_token(token):
+        for callback in callbacks:
+            await callback(token)
+    
+    return on_token
 
+async def run_model(provider, user_input, history, on_token=None, reserve=False, priority=PRIMARY):
+    """Get one provider's response to a turn as ``(provider, text, succeeded)``.
+    
+    Failures come back as a placeholder or error text. With ``reserve`` the
+    provider's circuit breaker is checked here, when the call is actually made.
+    ``priority`` decides who gets the provider's next free slot when it is at
+    its concurrency limit: secondary (comparison) requests wait behind primary
+    ones and are shed if they wait too long.
+    """
+    display_name = config.llms[provider].display_name
+    if reserve and not get_breaker(provider).allow():
+        return provider, f"_{display_name} is temporarily unavailable._", False
+    try:
+        # Record latency, time to first token, tokens and outcome per provider,
+        # and feed the outcome to the provider's circuit breaker
+        with get_breaker(provider).track(), request_priority(priority):
+            response_text = await metrics.track_request(
+                provider,
+                user_input,
+                history,
+                lambda on_token: providers.get(provider).complete(
+                    user_input,
+                    history,
+                    on_token
+                ),
+                on_token
+            )
+    except asyncio.TimeoutError:
+        # The provider missed its deadline; show a placeholder instead
+        return provider, f"_{display_name} did not respond in time. Please try again._", False
+    except ProviderBusy:
+        # The provider stayed saturated; this comparison response was skipped
+        return provider, f"_{display_name} is busy right now, so its response was skipped._", False
     except Exception as e:
-        return f"Error generating response from Gemini: {str(e)}"
-        # Define the function to call in the executor
-        # def generate_response():
-        #     try:
-        #         # Initialize Gemini model
-        #         generation_config = {
-        #             "temperature": 0.7,
-        #             "max_output_tokens": 500,
-        #         }
-                
-        #         model = genai.GenerativeModel(
-        #             model_name=gemini_model,
-        #             generation_config=generation_config
-        #         )
-                
-        #         # Generate response
-        #         response = model.generate_content(formatted_history)
-        #         return response.text
-        #     except Exception as e:
-        #         return f"Error in Gemini generation: {str(e)}"
-        
-        # # Run in executor
-        # response_text = await loop.run_in_executor(None, generate_response)
-        # return response_text
-        
-    # except Exception as e:
-    #     return f"Error generating response from Gemini: {str(e)}"
-
-async def get_grok_response(user_message, chat_history=None):
-    """Simulate a response from Grok (as no public API exists yet)."""
-    await asyncio.sleep(1)  # Simulate API delay
-    
-    return (
-        f"[SIMULATED GROK RESPONSE] As Grok doesn't have a public API yet, "
-        f"this is a simulated response to demonstrate functionality.\n\n"
-        f"In response to your query about '{user_message[:30]}...', "
-        f"I would provide gynecological information while recommending "
-        f"consultation with a healthcare provider for proper diagnosis."
-    )
+        return provider, f"Error generating response from {display_name}: {str(e)}", False
+    return provider, response_text, True
+
+def remember_turn(turn_id, turn):
+    """Keep a turn's prompt payload so its other model responses can be requested later."""
+    comparable = cl.user_session.get("comparable_turns") or {}
+    comparable[turn_id] = turn
+    while len(comparable) > COMPARABLE_TURNS:
+        comparable.pop(next(iter(comparable)))
+    cl.user_session.set("comparable_turns", comparable)
+
+async def send_chat_settings(settings=None):
+    """Send the chat settings panel, showing the conversation's current settings if given."""
+    settings = settings or {}
+    
+    # Offer the enabled providers as primary model choices, plus automatic routing
+    model_names = [config.llms[provider].display_name for provider in providers.enabled()]
+    if len(model_names) > 1:
+        model_names.append(AUTO_MODEL)
+    primary_model = settings.get("primary_model", "ChatGPT")
+    
+    # Set chat settings
+    settings_elements = [
+        Switch(id="show_all_models", label="Show All Model Responses", value=settings.get("show_all_models", True)), # Use value instead of initial
+        Select(
+            id="primary_model",
+            label="Primary Response Model",
+            values=model_names,
+            initial_value=primary_model if primary_model in model_names else (model_names or [""])[0] # Use initial_value instead of initial
+        )
+    ]
+    await cl.ChatSettings(elements=settings_elements).send() # Pass elements as a keyword argument
 
 @cl.on_chat_start
 async def on_chat_start():
@@ -194,31 +224,19 @@ async def on_chat_start():
     # Store the conversation ID in the user's session data
     cl.user_session.set("conversation_id", conversation_id)
     
-    # Initialize empty chat history for this conversation
-    chat_histories[conversation_id] = []
+    # Load enabled providers and open their connections ahead of the first
+    # message (once per process); this also logs the startup report
+    run_in_background(providers.warm())
     
-    # Set default settings for this conversation
-    user_settings[conversation_id] = {
-        "show_all_models": True,
-        "primary_model": "ChatGPT"
-    }
+    # Initialize empty chat history and default settings for this conversation
+    conversations.create(conversation_id)
     
     await cl.Message(
         content="Welcome to the Virtual Gynecology Assistant. How can I help you today?",
         author="Assistant"
     ).send()
     
-    # Set chat settings
-    settings_elements = [
-        cl.Switch(id="show_all_models", label="Show All Model Responses", value=True), # Use value instead of initial
-        cl.Select(
-            id="primary_model",
-            label="Primary Response Model",
-            values=["ChatGPT", "Gemini", "Grok"],
-            initial_value="ChatGPT" # Use initial_value instead of initial
-        )
-    ]
-    await cl.ChatSettings(elements=settings_elements).send() # Pass elements as a keyword argument
+    await send_chat_settings()
 
     # # Set chat settings
     # await cl.ChatSettings(
@@ -236,26 +254,98 @@ async def on_chat_start():
 @cl.on_message
 async def on_message(message: cl.Message):
     """Process user messages and generate responses."""
-    # Get user message
-    user_input = message.content
-    
     # Get conversation ID from session data
     conversation_id = cl.user_session.get("conversation_id")
     if not conversation_id:
         # Create a new conversation ID if none exists
         conversation_id = await get_conversation_id()
         cl.user_session.set("conversation_id", conversation_id)
-        chat_histories[conversation_id] = []
+    
+    # Time the whole turn and count it as in flight
+    with metrics.track_turn():
+        try:
+            # A conversation's turns run one at a time, in order, so they never
+            # race on its history; with TURN_POLICY=supersede a new message
+            # cancels the earlier turns and their provider calls instead
+            await turns.run(conversation_id, lambda: respond(message, conversation_id))
+        except TurnCancelled:
+            pass
+
+async def respond(message: cl.Message, conversation_id):
+    """Generate the responses to one user message."""
+    # Get user message
+    user_input = message.content
+    
+    # Get the conversation (from the shared backend if another worker or an
+    # earlier process served it), starting a fresh one if it was evicted
+    conversation = await conversations.load(conversation_id)
     
     # Get settings for this conversation
-    settings = user_settings.get(conversation_id, {
-        "show_all_models": True,
-        "primary_model": "ChatGPT"
-    })
+    settings = conversation.settings
     
     show_all_models = settings.get("show_all_models", True)
     primary_model = settings.get("primary_model", "ChatGPT")
     
+    # Serve frequent questions instantly from the prebuilt, reviewed answers,
+    # but only to open a conversation: they can't take earlier turns into account
+    faq_index = get_faq_index()
+    first_turn = not conversation.history and not conversation.summary
+    faq_entry = faq_index.lookup(user_input, config.faq_threshold) if faq_index and first_turn else None
+    if faq_entry:
+        metrics.faq_answers.inc()
+        await cl.Message(
+            content=f"{faq_entry['answer']}\n\n_Cached answer to a frequently asked question._",
+            author="Assistant"
+        ).send()
+        
+        conversation.append("user", user_input)
+        conversation.append("assistant", faq_entry["answer"])
+        schedule_summary(conversation)
+        return
+    
+    # Dispatch to the enabled providers; fall back to the first one if the
+    # selected primary model is not available
+    enabled_providers = providers.enabled()
+    if not enabled_providers:
+        await cl.Message(content="Error: No AI models are configured.", author="Assistant").send()
+        return
+    
+    # "Auto" routes the turn to the provider that is currently fastest and
+    # healthy; the decision and its inputs are recorded by the router
+    if primary_model == AUTO_MODEL:
+        decision = router.choose(
+            [provider for provider in enabled_providers if get_breaker(provider).ready()],
+            conversation_id
+        )
+        if decision:
+            primary_model = config.llms[decision["provider"]].display_name
+    if providers.provider_for(primary_model) not in enabled_providers:
+        primary_model = config.llms[enabled_providers[0]].display_name
+    
+    # Skip providers whose circuit is open; if the selected primary is one of
+    # them, the first healthy provider in the fallback order answers instead.
+    # When only the primary is shown, the other providers are called only if
+    # needed, so their breakers are checked (reserving any half-open probe)
+    # when the call is made rather than here.
+    requested_primary = primary_model
+    available_providers = [
+        provider for provider in enabled_providers
+        if (get_breaker(provider).allow() if show_all_models else get_breaker(provider).ready())
+    ]
+    fallback_providers = [
+        provider for provider in config.fallback_order
+        if provider in available_providers and config.llms[provider].display_name != primary_model
+    ]
+    if providers.provider_for(primary_model) not in available_providers:
+        if not fallback_providers:
+            await cl.Message(
+                content="All AI models are temporarily unavailable. Please try again shortly.",
+                author="Assistant"
+            ).send()
+            return
+        primary_model = config.llms[fallback_providers.pop(0)].display_name
+    primary_provider = providers.provider_for(primary_model)
+    
     # Send thinking message
     thinking_msg = cl.Message(content="Generating responses...", author="Assistant")
     await thinking_msg.send()
@@ -265,50 +355,181 @@ async def on_message(message: cl.Message):
     # await thinking_msg.send()
     
     try:
-        # Generate responses from all models concurrently
-        tasks = [
-            get_openai_response(user_input, chat_histories[conversation_id]),
-            get_gemini_response(user_input, chat_histories[conversation_id]),
-            get_grok_response(user_input, chat_histories[conversation_id])
-        ]
+        # Stream the primary model into the thinking message and, when enabled,
+        # every model into one comparison panel (or each secondary model into
+        # its own message) as tokens arrive
+        secondary_msgs = {}
+        panel = None
+        if show_all_models and config.comparison_panel:
+            panel = ComparisonPanel(
+                user_input,
+                [config.llms[provider].display_name for provider in enabled_providers]
+            )
+            await panel.send()
+        elif show_all_models:
+            for provider in enabled_providers:
+                model_name = config.llms[provider].display_name
+                if model_name != primary_model:
+                    secondary_msgs[model_name] = cl.Message(
+                        content="",
+                        author=f"AI - {model_name}"
+                    )
         
-        responses = await asyncio.gather(*tasks)
+        def token_callback(model_name):
+            if model_name in secondary_msgs:
+                return stream_into(
+                    secondary_msgs[model_name],
+                    prefix=f"**{model_name} Response:**\n\n"
+                )
+            return fan_out(
+                stream_into(thinking_msg) if model_name == primary_model else None,
+                panel.stream(model_name) if panel else None
+            )
         
-        # Map responses to model names
-        response_dict = {
-            "ChatGPT": responses[0],
-            "Gemini": responses[1],
-            "Grok": responses[2]
+        # Fit the history to each provider's budget up front so every provider
+        # sees the same turns even after the primary response is appended mid-turn
+        # (and so the other models can be asked later with the same payload)
+        histories = {
+            provider: build_history(conversation, provider, user_input)
+            for provider in enabled_providers
         }
         
-        # Get primary response
-        primary_response = response_dict[primary_model]
-        
-        # Update thinking message with primary response
-        thinking_msg.content = primary_response # Set the content attribute
-        await thinking_msg.update()             # Call update without arguments
-
-        # # Update thinking message with primary response
-        # await thinking_msg.update(content=primary_response)
+        # When every response is shown, generate them all concurrently and handle
+        # each one as soon as it finishes, so the primary is never held back by
+        # the slowest. Otherwise only the primary is called (and a fallback only
+        # if it fails); the others can be requested with the compare action.
+        tasks = {}
         
-        # Add to chat history
-        chat_histories[conversation_id].append({
-            "role": "user",
-            "content": user_input
-        })
-        chat_histories[conversation_id].append({
-            "role": "assistant",
-            "content": primary_response
-        })
+        def launch(provider, on_token, priority=PRIMARY):
+            tasks[provider] = asyncio.create_task(run_model(
+                provider, user_input, histories[provider], on_token,
+                reserve=not show_all_models, priority=priority
+            ))
         
-        # Show all model responses if enabled
+        # The primary's requests get free provider slots ahead of the other
+        # models' (which may be shed when a provider is saturated)
         if show_all_models:
-            for model_name, response_text in response_dict.items():
-                if model_name != primary_model:
-                    await cl.Message(
-                        content=f"**{model_name} Response:**\n\n{response_text}",
-                        author=f"AI - {model_name}"
-                    ).send()
+            for provider in available_providers:
+                launch(
+                    provider,
+                    token_callback(config.llms[provider].display_name),
+                    PRIMARY if provider == primary_provider else SECONDARY
+                )
+        else:
+            launch(primary_provider, token_callback(primary_model))
+        
+        # Providers whose circuit was open are shown as unavailable
+        for provider in enabled_providers:
+            model_name = config.llms[provider].display_name
+            if provider not in available_providers and model_name in secondary_msgs:
+                secondary_msgs[model_name].content = (
+                    f"**{model_name} Response:**\n\n_{model_name} is temporarily unavailable._"
+                )
+                await secondary_msgs[model_name].send()
+            if provider not in available_providers and panel:
+                await panel.set(model_name, f"{model_name} is temporarily unavailable.")
+        
+        # The answer comes from the primary or, if it fails, the first
+        # provider in the fallback order that succeeds
+        candidates = [primary_provider] + fallback_providers
+        results = {}
+        answered = False
+        
+        def pick_answer():
+            for provider in candidates:
+                if provider not in results:
+                    # Still waiting on a preferred provider
+                    return None
+                if results[provider][1]:
+                    return provider
+            # Every candidate failed; show the primary's error
+            return primary_provider
+        
+        try:
+            pending = set(tasks.values())
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    provider, response_text, succeeded = finished.result()
+                    results[provider] = (response_text, succeeded)
+                    model_name = config.llms[provider].display_name
+                    
+                    if model_name in secondary_msgs:
+                        # Finalize this secondary model message (ends its stream)
+                        secondary_msg = secondary_msgs[model_name]
+                        secondary_msg.content = f"**{model_name} Response:**\n\n{response_text}"
+                        await secondary_msg.send()
+                    elif panel:
+                        await panel.set(model_name, response_text)
+                    
+                    answer_provider = None if answered else pick_answer()
+                    if answer_provider is None:
+                        continue
+                    answered = True
+                    
+                    response_text, succeeded = results[answer_provider]
+                    answer_model = config.llms[answer_provider].display_name
+                    if succeeded and answer_model != requested_primary:
+                        metrics.fallbacks.inc(answer_provider)
+                        thinking_msg.content = (
+                            f"_{requested_primary} is unavailable right now, so this answer is from {answer_model}._"
+                            f"\n\n{response_text}"
+                        )
+                    else:
+                        # Finalize the streamed thinking message with the full primary response
+                        thinking_msg.content = response_text # Set the content attribute
+                    await thinking_msg.update()              # Call update without arguments
+                    
+                    # Offer the responses that weren't generated, for this turn's payload
+                    if not show_all_models and len(enabled_providers) > 1:
+                        remember_turn(message.id, {
+                            "user_input": user_input,
+                            "histories": histories,
+                            "answer_provider": answer_provider if succeeded else None,
+                            "answer": response_text if succeeded else None
+                        })
+                        await cl.Action(
+                            name="compare_models",
+                            value=message.id,
+                            label="Compare with other models",
+                            description="Generate the other models' responses to this message"
+                        ).send(for_id=thinking_msg.id)
+                    
+                    # Failed turns are shown but not added to the history
+                    if not succeeded:
+                        continue
+                    
+                    # Add the complete turn to chat history as soon as the answer lands
+                    conversation.append("user", user_input)
+                    conversation.append("assistant", response_text)
+                    
+                    # Fold older turns into the rolling summary before the next turn
+                    schedule_summary(conversation)
+                
+                # Only the primary was called and it failed: try the next provider
+                # in the fallback order, streaming it into the answer message
+                if not answered and not pending:
+                    next_provider = next(provider for provider in candidates if provider not in tasks)
+                    next_model = config.llms[next_provider].display_name
+                    launch(next_provider, stream_into(
+                        thinking_msg,
+                        prefix=f"_{requested_primary} is unavailable right now, so this answer is from {next_model}._\n\n"
+                    ))
+                    pending = {tasks[next_provider]}
+        except asyncio.CancelledError:
+            # The turn was stopped or superseded before its answer landed: keep
+            # what has streamed so far, and leave the history untouched
+            if not answered:
+                streamed = thinking_msg.content != "Generating responses..."
+                thinking_msg.content = (thinking_msg.content + "\n\n" if streamed else "") + "_Response stopped._"
+                await thinking_msg.update()
+            raise
+        finally:
+            # Don't leave provider calls running if the turn is aborted
+            for task in tasks.values():
+                task.cancel()
+            if panel:
+                await panel.close()
 
     except Exception as e:
         error_message = f"An error occurred: {str(e)}"
@@ -321,6 +542,91 @@ async def on_message(message: cl.Message):
     #     await thinking_msg.update(content=error_message)
     #     cl.logger.error(f"Error processing message: {str(e)}")
 
+@cl.action_callback("compare_models")
+async def on_compare_models(action: cl.Action):
+    """Generate the other models' responses to an earlier message, on request."""
+    await action.remove()
+    comparable = cl.user_session.get("comparable_turns") or {}
+    turn = comparable.pop(action.value, None)
+    if turn is None:
+        await cl.Message(content="That comparison is no longer available.", author="System").send()
+        return
+    
+    conversation_id = cl.user_session.get("conversation_id")
+    if not conversation_id:
+        conversation_id = await get_conversation_id()
+        cl.user_session.set("conversation_id", conversation_id)
+    
+    with metrics.track_turn():
+        try:
+            # Scheduled like a message, so the stop button (and a superseding
+            # message) cancels the comparison and frees its provider slots
+            await turns.run(conversation_id, lambda: compare_turn(action.value, turn))
+        except TurnCancelled:
+            pass
+
+async def compare_turn(turn_id, turn):
+    """Show the responses of the models that didn't answer a turn, reusing its prompt payload."""
+    user_input = turn["user_input"]
+    other_providers = [
+        provider for provider in providers.enabled()
+        if provider in turn["histories"] and provider != turn["answer_provider"]
+    ]
+    if not other_providers:
+        await cl.Message(content="No other models are available to compare.", author="System").send()
+        return
+    
+    # Stream into one comparison panel (next to the answer) or a message per model
+    secondary_msgs = {}
+    panel = None
+    if config.comparison_panel:
+        model_names = [config.llms[provider].display_name for provider in other_providers]
+        if turn["answer_provider"]:
+            model_names.insert(0, config.llms[turn["answer_provider"]].display_name)
+        panel = ComparisonPanel(user_input, model_names)
+        if turn["answer_provider"]:
+            await panel.set(model_names[0], turn["answer"])
+        await panel.send()
+    else:
+        for provider in other_providers:
+            model_name = config.llms[provider].display_name
+            secondary_msgs[model_name] = cl.Message(content="", author=f"AI - {model_name}")
+    
+    def token_callback(model_name):
+        if panel:
+            return panel.stream(model_name)
+        return stream_into(secondary_msgs[model_name], prefix=f"**{model_name} Response:**\n\n")
+    
+    tasks = [
+        asyncio.create_task(run_model(
+            provider,
+            user_input,
+            turn["histories"][provider],
+            token_callback(config.llms[provider].display_name),
+            reserve=True,
+            priority=SECONDARY
+        ))
+        for provider in other_providers
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            provider, response_text, succeeded = await next_done
+            model_name = config.llms[provider].display_name
+            if panel:
+                await panel.set(model_name, response_text)
+            else:
+                secondary_msg = secondary_msgs[model_name]
+                secondary_msg.content = f"**{model_name} Response:**\n\n{response_text}"
+                await secondary_msg.send()
+    except asyncio.CancelledError:
+        await cl.Message(content="_Comparison stopped._", author="System").send()
+        raise
+    finally:
+        for task in tasks:
+            task.cancel()
+        if panel:
+            await panel.close()
+
 @cl.on_settings_update
 async def on_settings_update(settings):
     """Handle updates to chat settings."""
@@ -330,24 +636,18 @@ async def on_settings_update(settings):
         conversation_id = await get_conversation_id()
         cl.user_session.set("conversation_id", conversation_id)
 
-        # Initialize settings for this new/unexpected conversation_id
-        chat_histories[conversation_id] = [] # Also good to initialize history
-        user_settings[conversation_id] = {
-            "show_all_models": True,
-            "primary_model": "ChatGPT"
-        }
+    # Get the conversation, initializing history and settings if it is new or was evicted
+    conversation = await conversations.load(conversation_id)
     
     # Update settings for this conversation
-    user_settings[conversation_id].update(settings) # Use update to merge new settings
-    # # Update settings for this conversation
-    # user_settings[conversation_id] = settings
+    conversation.update_settings(settings) # Merges the new settings and schedules a write
     
-    model_name = user_settings[conversation_id].get("primary_model", "ChatGPT")
-    show_all = user_settings[conversation_id].get("show_all_models", True)
-    # model_name = settings.get("primary_model", "ChatGPT")
-    # show_all = settings.get("show_all_models", True)
+    model_name = conversation.settings.get("primary_model", "ChatGPT")
+    show_all = conversation.settings.get("show_all_models", True)
     
     message = f"Settings updated: Primary model set to {model_name}."
+    if model_name == AUTO_MODEL:
+        message += " Each message is answered by the fastest healthy model."
     if show_all:
         message += " All model responses will be shown."
     else:
@@ -355,6 +655,37 @@ async def on_settings_update(settings):
         
     await cl.Message(content=message, author="System").send()
 
+@cl.on_chat_resume
+async def on_chat_resume(thread):
+    """Pick up a resumed thread's conversation from the conversation backend."""
+    conversation_id = thread["id"]
+    cl.user_session.set("conversation_id", conversation_id)
+    
+    # With the in-memory backend only a conversation still held by this
+    # process can be resumed; otherwise it starts empty
+    conversation = await conversations.load(conversation_id)
+    
+    run_in_background(providers.warm())
+    await send_chat_settings(conversation.settings)
+
+@cl.on_stop
+async def on_stop():
+    """Cancel the conversation's running and queued turns when the user stops generation."""
+    conversation_id = cl.user_session.get("conversation_id")
+    if conversation_id:
+        # Their provider calls are cancelled too, so no one pays for unread answers
+        turns.cancel(conversation_id, "stopped")
+
+@cl.on_chat_end
+async def on_chat_end():
+    """Release the conversation's history and settings when the chat ends."""
+    conversation_id = cl.user_session.get("conversation_id")
+    if conversation_id:
+        turns.cancel(conversation_id, "ended")
+        
+        # Pending changes are written first, so a persisted conversation can be resumed
+        await conversations.release(conversation_id)
+
 if __name__ == "__main__":
     # Chainlit takes care of running the app
     pass
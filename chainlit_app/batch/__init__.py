@@ -0,0 +1,3 @@
+"""
+Command-line batch tools for the Chainlit app.
+"""
@@ -0,0 +1,240 @@
+"""
+Batch evaluation of the providers over a question bank.
+
+Streams questions from a JSONL file, sends each to every selected provider
+through the ``models/`` wrappers (with their deadlines, concurrency limits and
+rate limits) and appends one JSONL record per question and provider as soon
+as it finishes. Rerunning with the same output file resumes where an
+interrupted run stopped.
+
+Input lines look like ``{"id": "q1", "question": "...", "history": [...]}``;
+``id`` defaults to the line number and ``history`` (OpenAI format) is optional.
+
+Usage (from the chainlit_app directory):
+    python -m batch.run questions.jsonl --output results.jsonl
+    python -m batch.run questions.jsonl --output results.jsonl --providers openai,gemini --concurrency 8
+    python -m batch.run questions.jsonl --output results.jsonl --report report.html
+"""
+
+import argparse
+import asyncio
+import html
+import json
+import os
+import statistics
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from config import config
+from services.history_buffers import PROVIDER_FORMATS, format_message
+from services.providers import providers
+from services.tokens import count_message_tokens, count_tokens
+
+def read_questions(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream the questions from a JSONL file, filling in missing ids with line numbers."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item["id"] = str(item.get("id", line_number))
+            yield item
+
+def read_results(path: str) -> List[Dict[str, Any]]:
+    """Read the records written so far, ignoring a torn last line from an interrupted run."""
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+def completed(records: List[Dict[str, Any]], retry_errors: bool) -> Set[Tuple[str, str]]:
+    """(question id, provider) pairs that don't need to run again."""
+    done = set()
+    for record in records:
+        key = (record["id"], record["provider"])
+        if record.get("error") and retry_errors:
+            done.discard(key)
+        else:
+            done.add(key)
+    return done
+
+def provider_history(provider: str, history: Optional[List[Dict[str, str]]]) -> List[Dict[str, Any]]:
+    """Convert an OpenAI-format history to the provider's message format."""
+    return [
+        format_message(PROVIDER_FORMATS[provider], message["role"], message["content"])
+        for message in history or []
+    ]
+
+async def evaluate(provider: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    """Ask one provider one question and describe the outcome."""
+    llm = config.llms[provider]
+    history = provider_history(provider, item.get("history"))
+    first_token_at = None
+    
+    async def on_token(token: str) -> None:
+        nonlocal first_token_at
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+    
+    started = time.perf_counter()
+    response, error = "", None
+    try:
+        response = await providers.get(provider).complete(item["question"], history, on_token)
+    except asyncio.TimeoutError:
+        error = f"{llm.display_name} did not respond within {llm.timeout:g} seconds"
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    finished = time.perf_counter()
+    
+    return {
+        "id": item["id"],
+        "question": item["question"],
+        "provider": provider,
+        "model": llm.model_id,
+        "response": response,
+        "error": error,
+        "latency_ms": round((finished - started) * 1000, 1),
+        "ttft_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+        "prompt_tokens": (
+            count_tokens(config.system_prompt) + count_tokens(item["question"]) + count_message_tokens(history)
+        ),
+        "completion_tokens": count_tokens(response) if response else 0,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+
+async def run_batch(args: argparse.Namespace) -> None:
+    """Evaluate every pending question and provider pair, appending results as they finish."""
+    selected = args.providers or providers.enabled()
+    for provider in selected:
+        if not providers.is_enabled(provider):
+            raise SystemExit(f"Provider '{provider}' is not enabled or has no API key.")
+    
+    done = completed(read_results(args.output), args.retry_errors)
+    if done:
+        print(f"Resuming: {len(done)} results already in {args.output}")
+    
+    # Bounded queue: questions are read from the file only as workers free up
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    counts = {"written": 0, "errors": 0}
+    
+    with open(args.output, "a", encoding="utf-8") as output:
+        async def worker() -> None:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                pending = [provider for provider in selected if (item["id"], provider) not in done]
+                # Fan the question out to every provider; write each result as it lands
+                for next_done in asyncio.as_completed([evaluate(provider, item) for provider in pending]):
+                    record = await next_done
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output.flush()
+                    counts["written"] += 1
+                    counts["errors"] += bool(record["error"])
+                    status = f"error: {record['error']}" if record["error"] else f"{record['latency_ms']:.0f} ms"
+                    print(f"[{record['id']}] {config.llms[record['provider']].display_name}: {status}")
+        
+        workers = [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+        for item in read_questions(args.input):
+            if all((item["id"], provider) in done for provider in selected):
+                continue
+            await queue.put(item)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    
+    print(f"Wrote {counts['written']} results ({counts['errors']} errors) to {args.output}")
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-provider latency, error and token totals."""
+    summary = {}
+    for provider in dict.fromkeys(record["provider"] for record in records):
+        rows = [record for record in records if record["provider"] == provider]
+        latencies = sorted(record["latency_ms"] for record in rows if not record["error"])
+        summary[provider] = {
+            "results": len(rows),
+            "errors": sum(1 for record in rows if record["error"]),
+            "mean_latency_ms": statistics.fmean(latencies) if latencies else 0.0,
+            "p95_latency_ms": latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+            "prompt_tokens": sum(record["prompt_tokens"] for record in rows),
+            "completion_tokens": sum(record["completion_tokens"] for record in rows)
+        }
+    return summary
+
+async def write_report(results_path: str, report_path: str) -> None:
+    """Write an HTML report: a per-provider summary and a side-by-side comparison per question."""
+    from components.comparison import COMPARISON_CSS, render_comparison
+    
+    # Later records (such as retried errors) replace earlier ones
+    latest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for record in read_results(results_path):
+        latest[(record["id"], record["provider"])] = record
+    records = list(latest.values())
+    
+    rows = "".join(
+        f"<tr><td>{html.escape(config.llms[provider].display_name)}</td><td>{stats['results']}</td>"
+        f"<td>{stats['errors']}</td><td>{stats['mean_latency_ms']:.0f}</td><td>{stats['p95_latency_ms']:.0f}</td>"
+        f"<td>{stats['prompt_tokens']}</td><td>{stats['completion_tokens']}</td></tr>"
+        for provider, stats in summarize(records).items()
+    )
+    sections = [
+        "<table class=\"summary\"><tr><th>Model</th><th>Results</th><th>Errors</th>"
+        "<th>Mean latency (ms)</th><th>p95 latency (ms)</th><th>Prompt tokens</th>"
+        f"<th>Completion tokens</th></tr>{rows}</table>"
+    ]
+    
+    questions: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        entry = questions.setdefault(record["id"], {"question": record["question"], "responses": {}})
+        text = f"Error: {record['error']}" if record["error"] else record["response"]
+        entry["responses"][config.llms[record["provider"]].display_name] = text
+    
+    for entry in questions.values():
+        sections.append(render_comparison(entry["question"], entry["responses"]))
+    
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write(
+            "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Model comparison</title>"
+            f"{COMPARISON_CSS}<style>.summary {{ border-collapse: collapse; margin-bottom: 2rem; }} "
+            ".summary td, .summary th { border: 1px solid #ddd; padding: 0.4rem 0.8rem; }</style></head>"
+            f"<body>{''.join(sections)}</body></html>\n"
+        )
+    print(f"Report written to {report_path}")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description="Compare the models over a JSONL question bank.")
+    parser.add_argument("input", help="JSONL file of questions")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--providers", type=lambda value: [name.strip() for name in value.split(",")],
+                        help="Comma-separated providers (default: every enabled one)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions in flight at once")
+    parser.add_argument("--retry-errors", action="store_true", help="When resuming, redo results that failed")
+    parser.add_argument("--use-cache", action="store_true", help="Allow answers from the response cache")
+    parser.add_argument("--report", help="Also write an HTML comparison report to this path")
+    return parser.parse_args(argv)
+
+async def run(args: argparse.Namespace) -> None:
+    """Run the batch and optionally write the report."""
+    await run_batch(args)
+    if args.report:
+        await write_report(args.output, args.report)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Parse options and run."""
+    args = parse_args(argv)
+    
+    # Measure the providers themselves, not earlier answers
+    if not args.use_cache:
+        config.cache_enabled = False
+    
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
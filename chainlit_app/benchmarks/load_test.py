@@ -0,0 +1,390 @@
+"""
+End-to-end load generator for a running Chainlit worker.
+
+Opens many simulated client sessions over Chainlit's websocket protocol,
+drives scripted multi-turn conversations through them at increasing
+concurrency levels and reports throughput, latency percentiles, worker memory
+growth and the level at which latency degrades.
+
+With ``--launch`` the tool starts a local OpenAI-compatible stub server and a
+worker (``chainlit run app.py --headless``) pointed at it, so upstream
+providers are never called. Otherwise point it at a running worker with
+``--url`` (and ``--pid`` to track its memory).
+
+Usage (from the chainlit_app directory):
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.load_test --launch --levels 1,10,50,100 --mean 0.5 --error-rate 0.01
+    python -m benchmarks.load_test --url http://localhost:8000 --pid 12345
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from benchmarks.run import QUESTIONS, percentile, summarize, git_commit
+from benchmarks.stub_server import add_stub_arguments, stub_from_args
+
+# Socket.IO endpoint and event names used by the Chainlit frontend
+SOCKETIO_PATH = "/ws/socket.io"
+MESSAGE_EVENT = "ui_message"
+
+# Multi-turn conversations replayed by simulated users (cycled)
+SCRIPTS = [
+    QUESTIONS[:3],
+    [QUESTIONS[3], "What tests are used to diagnose it?", "Can diet changes help?"],
+    [QUESTIONS[4], QUESTIONS[0], "When should I see a doctor?"]
+]
+
+def worker_rss(pid: Optional[int]) -> Optional[int]:
+    """Resident memory of process ``pid`` in bytes, if it can be read."""
+    if pid is None:
+        return None
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    
+    # Without psutil, fall back to /proc (Linux only)
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+class SimulatedUser:
+    """
+    One browser session: connects, replays a script and times each turn.
+    
+    A turn starts when the message is emitted and ends on the worker's
+    ``task_end`` event; time to first token is taken from the first
+    ``stream_token`` event of the turn.
+    """
+    
+    def __init__(self, url: str, script: List[str], turn_timeout: float, think_time: float):
+        """Create a user that will replay ``script`` against ``url``."""
+        import socketio
+        
+        self.url = url
+        self.script = script
+        self.turn_timeout = turn_timeout
+        self.think_time = think_time
+        self.session_id = str(uuid.uuid4())
+        self.sio = socketio.AsyncClient(reconnection=False)
+        
+        self.ready = asyncio.Event()
+        self.turn_done = asyncio.Event()
+        self.turn_active = False
+        self.turn_started_at = 0.0
+        self.first_token_at: Optional[float] = None
+        self.turn_failed = False
+        
+        self.latencies: List[float] = []
+        self.ttfts: List[float] = []
+        self.errors = 0
+        self.timeouts = 0
+        
+        self.sio.on("new_message", self._on_message)
+        self.sio.on("update_message", self._on_message)
+        self.sio.on("stream_token", self._on_stream_token)
+        self.sio.on("task_start", self._on_task_start)
+        self.sio.on("task_end", self._on_task_end)
+    
+    async def _on_message(self, step: Dict[str, Any]) -> None:
+        self.ready.set()
+        text = step.get("output") or step.get("content") or ""
+        if self.turn_active and (step.get("isError") or text.startswith(("Error", "An error occurred"))):
+            self.turn_failed = True
+    
+    async def _on_stream_token(self, data: Dict[str, Any]) -> None:
+        if self.turn_active and self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+    
+    async def _on_task_start(self, *args) -> None:
+        if self.turn_active:
+            self.turn_done.clear()
+    
+    async def _on_task_end(self, *args) -> None:
+        if self.turn_active:
+            self.turn_done.set()
+    
+    async def run(self) -> None:
+        """Connect, replay the script and disconnect."""
+        try:
+            await self.sio.connect(
+                self.url,
+                headers={"X-Chainlit-Session-Id": self.session_id, "X-Chainlit-Client-Type": "webapp"},
+                socketio_path=SOCKETIO_PATH,
+                transports=["websocket"]
+            )
+            await self.sio.emit("connection_successful")
+            # The welcome message means on_chat_start has run
+            await asyncio.wait_for(self.ready.wait(), self.turn_timeout)
+            
+            for text in self.script:
+                await self._turn(text)
+                if self.think_time:
+                    await asyncio.sleep(self.think_time)
+        except Exception:
+            # Connection failures count against every turn that could not run
+            self.errors += len(self.script) - len(self.latencies) - self.timeouts
+        finally:
+            if self.sio.connected:
+                await self.sio.disconnect()
+    
+    async def _turn(self, text: str) -> None:
+        """Send one message and wait for the worker to finish answering it."""
+        self.turn_done.clear()
+        self.turn_failed = False
+        self.first_token_at = None
+        self.turn_active = True
+        self.turn_started_at = time.perf_counter()
+        
+        await self.sio.emit(MESSAGE_EVENT, {
+            "message": {
+                "id": str(uuid.uuid4()),
+                "threadId": "",
+                "name": "User",
+                "type": "user_message",
+                "output": text,
+                "createdAt": datetime.now(timezone.utc).isoformat()
+            },
+            "fileReferences": None
+        })
+        
+        try:
+            await asyncio.wait_for(self.turn_done.wait(), self.turn_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return
+        finally:
+            self.turn_active = False
+        
+        self.latencies.append(time.perf_counter() - self.turn_started_at)
+        if self.first_token_at is not None:
+            self.ttfts.append(self.first_token_at - self.turn_started_at)
+        if self.turn_failed:
+            self.errors += 1
+
+async def run_level(url: str, concurrency: int, scripts: List[List[str]], args: argparse.Namespace) -> Dict[str, Any]:
+    """Run ``concurrency`` simultaneous users once through their scripts."""
+    users = [
+        SimulatedUser(url, scripts[index % len(scripts)], args.turn_timeout, args.think_time)
+        for index in range(concurrency)
+    ]
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(user.run() for user in users))
+    elapsed = time.perf_counter() - started
+    
+    latencies = [value for user in users for value in user.latencies]
+    ttfts = [value for user in users for value in user.ttfts]
+    turns = sum(len(user.script) for user in users)
+    errors = sum(user.errors for user in users)
+    timeouts = sum(user.timeouts for user in users)
+    
+    result = summarize(latencies)
+    result.update({
+        "concurrency": concurrency,
+        "turns": turns,
+        "errors": errors,
+        "timeouts": timeouts,
+        "error_rate": (errors + timeouts) / turns if turns else 0.0,
+        "turns_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "ttft_p50_ms": percentile(ttfts, 50) * 1000,
+        "ttft_p95_ms": percentile(ttfts, 95) * 1000
+    })
+    return result
+
+def find_degradation(levels: List[Dict[str, Any]], factor: float, max_error_rate: float) -> Optional[int]:
+    """
+    First concurrency level whose p95 exceeds ``factor`` times the lowest
+    level's p95, or whose error rate exceeds ``max_error_rate``.
+    """
+    if not levels:
+        return None
+    baseline = levels[0]["p95_ms"]
+    for level in levels:
+        if level["p95_ms"] > baseline * factor or level["error_rate"] > max_error_rate:
+            return level["concurrency"]
+    return None
+
+def log_tail(path: str, lines: int = 30) -> str:
+    """Return the last ``lines`` lines of a log file (empty if it can't be read)."""
+    try:
+        with open(path, errors="replace") as f:
+            return "".join(f.readlines()[-lines:])
+    except OSError:
+        return ""
+
+def check_worker(worker: subprocess.Popen, log_path: str) -> None:
+    """Raise with the end of the worker's log if the worker has exited."""
+    if worker.poll() is not None:
+        raise RuntimeError(
+            f"Worker exited with code {worker.returncode}; last lines of {log_path}:\n{log_tail(log_path)}"
+        )
+
+def wait_for_http(url: str, timeout: float, worker: Optional[subprocess.Popen] = None, log_path: str = "") -> None:
+    """Block until ``url`` answers, raising if it does not within ``timeout`` or ``worker`` exits."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except Exception:
+            if worker is not None:
+                check_worker(worker, log_path)
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up within {timeout:g} seconds")
+            time.sleep(0.5)
+
+def launch_worker(port: int, stub_port: int, log_path: str) -> subprocess.Popen:
+    """Start a headless Chainlit worker whose OpenAI and Grok calls go to the stub server.
+    
+    The worker's output goes to ``log_path``, so a crash can be diagnosed.
+    """
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+        "OPENAI_ENABLED": "True",
+        "GROK_API_KEY": "stub",
+        "GROK_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+        "GROK_ENABLED": "True",
+        # Only the OpenAI-compatible providers are stubbed
+        "GEMINI_ENABLED": "False",
+        "SUMMARY_PROVIDER": "openai",
+        "RESPONSE_CACHE": "False"
+    })
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(log_path, "w") as log:
+        # The child keeps its own copy of the file handle
+        return subprocess.Popen(
+            [sys.executable, "-m", "chainlit", "run", "app.py", "--headless", "--port", str(port)],
+            cwd=app_dir,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT
+        )
+
+def load_scripts(path: Optional[str]) -> List[List[str]]:
+    """Read conversation scripts (one JSON list of messages per line), or use the built-in ones."""
+    if not path:
+        return SCRIPTS
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+async def run_load_test(args: argparse.Namespace) -> Dict[str, Any]:
+    """Start the stub and worker if asked, ramp through the levels and collect results."""
+    stub = worker = None
+    url, pid = args.url, args.pid
+    
+    try:
+        if args.launch:
+            stub = stub_from_args(args)
+            stub_port = await stub.start(port=args.stub_port)
+            worker = launch_worker(args.port, stub_port, args.worker_log)
+            print(f"Worker output: {args.worker_log}")
+            url, pid = f"http://127.0.0.1:{args.port}", worker.pid
+            await asyncio.to_thread(wait_for_http, url, args.startup_timeout, worker, args.worker_log)
+        
+        scripts = load_scripts(args.script)
+        rss_start = worker_rss(pid)
+        
+        levels = []
+        for concurrency in args.levels:
+            if worker:
+                check_worker(worker, args.worker_log)
+            result = await run_level(url, concurrency, scripts, args)
+            result["worker_rss_mb"] = (worker_rss(pid) or 0) / 2**20
+            levels.append(result)
+            print(
+                f"{concurrency:>5} users: p50 {result['p50_ms']:8.1f} ms  p95 {result['p95_ms']:8.1f} ms  "
+                f"p99 {result['p99_ms']:8.1f} ms  ttft p95 {result['ttft_p95_ms']:8.1f} ms  "
+                f"{result['turns_per_second']:6.1f} turns/s  errors {result['error_rate']:6.1%}  "
+                f"rss {result['worker_rss_mb']:7.1f} MB"
+            )
+        
+        rss_end = worker_rss(pid)
+        degraded_at = find_degradation(levels, args.degradation_factor, args.max_error_rate)
+        
+        return {
+            "meta": {
+                "commit": git_commit(),
+                "url": url,
+                "launched": args.launch,
+                "stub": {
+                    "latency": args.latency, "mean": args.mean, "spread": args.spread,
+                    "error_rate": args.error_rate, "rate_limit_rate": args.rate_limit_rate
+                } if args.launch else None,
+                "levels": args.levels,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")
+            },
+            "results": {
+                "levels": levels,
+                "worker_rss_growth_mb": (
+                    (rss_end - rss_start) / 2**20 if rss_start is not None and rss_end is not None else None
+                ),
+                "degraded_at_concurrency": degraded_at,
+                "stub_requests": stub.stats if stub else None
+            }
+        }
+    finally:
+        if worker:
+            worker.terminate()
+            worker.wait(timeout=10)
+        if stub:
+            await stub.stop()
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description="Load test a Chainlit worker with simulated users.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Worker to test (ignored with --launch)")
+    parser.add_argument("--pid", type=int, help="Worker process ID, to track its memory")
+    parser.add_argument("--launch", action="store_true", help="Start a stub server and worker locally")
+    parser.add_argument("--port", type=int, default=8010, help="Port for the launched worker")
+    parser.add_argument("--stub-port", type=int, default=0, help="Port for the stub server (0 = any free port)")
+    parser.add_argument("--worker-log", default="load_test_worker.log", help="File the launched worker's output goes to")
+    parser.add_argument("--startup-timeout", type=float, default=60.0, help="Seconds to wait for the launched worker")
+    parser.add_argument("--levels", type=lambda value: [int(level) for level in value.split(",")],
+                        default=[1, 5, 10, 25, 50, 100], help="Comma-separated concurrent user counts")
+    parser.add_argument("--script", help="JSONL file of conversations (one JSON list of messages per line)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds a user waits between turns")
+    parser.add_argument("--turn-timeout", type=float, default=120.0, help="Seconds before a turn counts as timed out")
+    parser.add_argument("--degradation-factor", type=float, default=2.0,
+                        help="p95 growth over the lowest level that counts as degraded")
+    parser.add_argument("--max-error-rate", type=float, default=0.05, help="Error rate that counts as degraded")
+    parser.add_argument("--output", default="load_test_results.json", help="Where to write the results")
+    add_stub_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the load test and write the results."""
+    args = parse_args(argv)
+    results = asyncio.run(run_load_test(args))
+    
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    
+    summary = results["results"]
+    degraded_at = summary["degraded_at_concurrency"]
+    print(f"Latency degrades at: {f'{degraded_at} concurrent users' if degraded_at else 'not reached'}")
+    if summary["worker_rss_growth_mb"] is not None:
+        print(f"Worker memory growth: {summary['worker_rss_growth_mb']:+.1f} MB")
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
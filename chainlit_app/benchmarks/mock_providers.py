@@ -0,0 +1,170 @@
+"""
+Deterministic, in-process mock providers for benchmarks.
+"""
+
+import asyncio
+import random
+from typing import Dict, List, Optional
+
+from config import config
+from services.concurrency import provider_slot
+from services.deadlines import call_with_deadline
+from services.providers import providers
+from services.rate_limits import rate_limited
+from services.response_cache import cached_generate
+from services.streaming import TokenCallback
+from services.tokens import count_message_tokens
+
+# Canned answer streamed by the mock providers
+CANNED_RESPONSE = (
+    "Light spotting between periods is common and often harmless. It can be caused by "
+    "hormonal changes around ovulation, starting or changing hormonal contraception, or "
+    "minor irritation of the cervix. However, persistent, heavy or painful bleeding, or "
+    "spotting after menopause, should be checked by a healthcare provider, who can examine "
+    "you and recommend tests if needed."
+)
+
+class LatencyModel:
+    """
+    Seeded latency distribution, so runs with the same seed are reproducible.
+    
+    Kinds:
+        fixed: always ``mean``
+        uniform: uniformly distributed in ``mean ± spread``
+        lognormal: median ``mean`` with shape ``spread`` (long right tail)
+    """
+    
+    def __init__(self, kind: str = "fixed", mean: float = 0.2, spread: float = 0.0, seed: int = 0):
+        """Create the distribution."""
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.mean = mean
+        self.spread = spread
+        self._random = random.Random(seed)
+    
+    def sample(self) -> float:
+        """Draw one latency in seconds."""
+        if self.kind == "uniform":
+            return max(0.0, self._random.uniform(self.mean - self.spread, self.mean + self.spread))
+        if self.kind == "lognormal":
+            return self.mean * self._random.lognormvariate(0.0, self.spread)
+        return self.mean
+
+class MockModel:
+    """
+    Stand-in for a model wrapper that streams canned text after a sampled delay.
+    
+    Only the upstream call is simulated: requests go through the same response
+    cache, coalescing, deadline, rate-limit and concurrency layers as the real
+    wrappers. A share of each sampled latency (``ttft_fraction``) passes before
+    the first token; the rest is spread over the remaining chunks.
+    """
+    
+    def __init__(self,
+                 provider: str,
+                 latency: LatencyModel,
+                 text: str = CANNED_RESPONSE,
+                 ttft_fraction: float = 0.3,
+                 words_per_chunk: int = 3,
+                 error_rate: float = 0.0,
+                 seed: int = 0):
+        """Create a mock for ``provider``."""
+        self.provider = provider
+        self.name = config.llms[provider].display_name
+        self.latency = latency
+        self.ttft_fraction = ttft_fraction
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        
+        words = text.split(" ")
+        self.chunks: List[str] = [
+            " ".join(words[i:i + words_per_chunk]) + " "
+            for i in range(0, len(words), words_per_chunk)
+        ]
+        self.calls = 0
+    
+    async def complete(self,
+                       user_message: str,
+                       chat_history: Optional[List[Dict[str, str]]] = None,
+                       on_token: Optional[TokenCallback] = None) -> str:
+        """Get the canned response through the wrappers' pipeline, raising on injected errors."""
+        llm = config.llms[self.provider]
+        messages = [{"role": "system", "content": config.system_prompt}]
+        messages.extend(chat_history or [])
+        messages.append({"role": "user", "content": user_message})
+        request_tokens = count_message_tokens(messages) + llm.max_tokens
+        
+        return await cached_generate(
+            llm,
+            user_message,
+            chat_history,
+            config.system_prompt,
+            lambda cache_on_token: call_with_deadline(
+                lambda attempt_on_token: rate_limited(
+                    self.provider,
+                    request_tokens,
+                    lambda: self._stream_response(attempt_on_token)
+                ),
+                on_token=cache_on_token,
+                timeout=llm.timeout,
+                hedge_after=llm.hedge_after
+            ),
+            on_token=on_token
+        )
+    
+    async def _stream_response(self, on_token: Optional[TokenCallback]) -> str:
+        """Simulate one streaming upstream call."""
+        async with provider_slot(self.provider):
+            self.calls += 1
+            total = self.latency.sample()
+            
+            await asyncio.sleep(total * self.ttft_fraction)
+            if self._random.random() < self.error_rate:
+                raise RuntimeError(f"Injected {self.name} failure")
+            
+            gap = total * (1 - self.ttft_fraction) / max(1, len(self.chunks) - 1)
+            for index, chunk in enumerate(self.chunks):
+                if index and gap:
+                    await asyncio.sleep(gap)
+                if on_token:
+                    await on_token(chunk)
+        
+        return "".join(self.chunks)
+    
+    async def generate_response(self,
+                                user_message: str,
+                                chat_history: Optional[List[Dict[str, str]]] = None,
+                                on_token: Optional[TokenCallback] = None) -> str:
+        """Like ``complete`` but failures are returned as text, as the wrappers do."""
+        try:
+            return await self.complete(user_message, chat_history, on_token)
+        except Exception as e:
+            return f"Error generating response from {self.name}: {str(e)}"
+
+def install_mock_providers(kind: str = "fixed",
+                           mean: float = 0.2,
+                           spread: float = 0.0,
+                           seed: int = 0,
+                           error_rate: float = 0.0) -> Dict[str, MockModel]:
+    """
+    Replace every provider in ``config.llms`` with a mock in the provider registry.
+    
+    Each provider gets its own seeded latency stream, derived from ``seed``.
+    API keys are cleared so that nothing (such as connection warm-up) reaches
+    the real providers while the mocks are installed.
+    
+    Returns:
+        The installed mocks by provider
+    """
+    mocks = {}
+    for index, (provider, llm) in enumerate(config.llms.items()):
+        llm.api_key = ""
+        mocks[provider] = MockModel(
+            provider,
+            LatencyModel(kind, mean, spread, seed=seed * 1000 + index),
+            error_rate=error_rate,
+            seed=seed * 1000 + index
+        )
+        providers.override(provider, mocks[provider])
+    return mocks
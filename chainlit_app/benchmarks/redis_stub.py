@@ -0,0 +1,136 @@
+"""
+Local stand-in for a Redis server, for exercising the Redis conversation
+backend without running Redis.
+
+Speaks enough of the Redis protocol (RESP) for the backend: PING, GET, SET
+(with EX/PX), DEL, EXISTS, DBSIZE and FLUSHALL, with pipelining. Data lives in
+memory and is lost when the process exits.
+
+Usage (from the chainlit_app directory):
+    python -m benchmarks.redis_stub --port 6380
+
+Then run the app with ``CONVERSATION_BACKEND=redis CONVERSATION_REDIS_URL=redis://127.0.0.1:6380/0``.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+class RedisStub:
+    """Minimal in-memory server speaking the Redis protocol."""
+    
+    def __init__(self):
+        """Create an empty server; call ``start`` to begin listening."""
+        # Key -> (value, expiry as a monotonic time or None)
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.stats = {"connections": 0, "commands": 0}
+        self._server: Optional[asyncio.AbstractServer] = None
+    
+    async def start(self, host: str = "127.0.0.1", port: int = 6380) -> int:
+        """Start listening and return the bound port (useful with port 0)."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+    
+    async def stop(self) -> None:
+        """Stop listening."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+    
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+    
+    def execute(self, command: List[bytes]) -> bytes:
+        """Run one command and return its encoded reply."""
+        self.stats["commands"] += 1
+        name = command[0].upper()
+        args = command[1:]
+        
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"GET" and len(args) == 1:
+            return bulk(self._get(args[0]))
+        if name == b"SET" and len(args) >= 2:
+            expires_at = None
+            options = [arg.upper() for arg in args[2:]]
+            for index, option in enumerate(options[:-1]):
+                if option == b"EX":
+                    expires_at = time.monotonic() + int(options[index + 1])
+                elif option == b"PX":
+                    expires_at = time.monotonic() + int(options[index + 1]) / 1000
+            self.data[args[0]] = (args[1], expires_at)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            deleted = sum(1 for key in args if self.data.pop(key, None) is not None)
+            return f":{deleted}\r\n".encode()
+        if name == b"EXISTS":
+            return f":{sum(1 for key in args if self._get(key) is not None)}\r\n".encode()
+        if name == b"DBSIZE":
+            return f":{len(self.data)}\r\n".encode()
+        if name == b"FLUSHALL":
+            self.data.clear()
+            return b"+OK\r\n"
+        return f"-ERR unknown command '{name.decode(errors='replace')}'\r\n".encode()
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats["connections"] += 1
+        try:
+            while True:
+                command = await read_command(reader)
+                if command is None:
+                    break
+                if not command:
+                    continue
+                writer.write(self.execute(command))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+def bulk(value: Optional[bytes]) -> bytes:
+    """Encode a bulk string reply (nil for None)."""
+    if value is None:
+        return b"$-1\r\n"
+    return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    """Read one command (an array of bulk strings, or an inline command)."""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()
+    command = []
+    for _ in range(int(line[1:])):
+        length = int((await reader.readline())[1:])
+        command.append((await reader.readexactly(length + 2))[:-2])
+    return command
+
+async def serve(args: argparse.Namespace) -> None:
+    """Run the stand-in until interrupted."""
+    server = RedisStub()
+    port = await server.start(args.host, args.port)
+    print(f"Redis stand-in listening on redis://{args.host}:{port}/0")
+    await asyncio.Event().wait()
+
+def main() -> None:
+    """Parse options and serve."""
+    parser = argparse.ArgumentParser(description="In-memory stand-in for a Redis server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Micro-benchmark suite for the Chainlit app.
+
+Runs the app's handlers against in-process mock providers and writes the
+results to a JSON file that can be compared between commits.
+
+Usage (from the chainlit_app directory):
+    python -m benchmarks.run
+    python -m benchmarks.run --latency lognormal --mean 0.4 --spread 0.5
+    python -m benchmarks.run --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import time
+from typing import Any, Dict, List, Optional
+
+import chainlit as cl
+from chainlit.context import init_http_context
+
+from config import config
+from benchmarks.mock_providers import install_mock_providers, CANNED_RESPONSE
+from services.conversation_store import Conversation
+
+# Questions cycled through by simulated users
+QUESTIONS = [
+    "Is light spotting between periods normal?",
+    "What can help with severe menstrual cramps?",
+    "How often should I have a cervical screening?",
+    "What are common symptoms of PCOS?",
+    "Is it normal for my cycle length to change?"
+]
+
+def percentile(values: List[float], p: float) -> float:
+    """Return the ``p``-th percentile of ``values`` by linear interpolation."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Summary statistics in milliseconds for timings given in seconds."""
+    return {
+        "count": len(values),
+        "mean_ms": statistics.fmean(values) * 1000 if values else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": max(values) * 1000 if values else 0.0
+    }
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes a sleeping task.
+    
+    Lag is a direct measure of time the loop spent blocked on synchronous work.
+    """
+    
+    def __init__(self, interval: float = 0.005):
+        """Create a monitor that wakes every ``interval`` seconds."""
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+    
+    def start(self) -> None:
+        """Start sampling."""
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop sampling."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+async def run_conversation(app, turns: int, offset: int, latencies: List[float]) -> None:
+    """Drive one simulated user through ``turns`` messages in its own Chainlit session."""
+    init_http_context()
+    await app.on_chat_start()
+    await app.on_settings_update({"show_all_models": True, "primary_model": "ChatGPT"})
+    
+    for turn in range(turns):
+        message = cl.Message(content=QUESTIONS[(offset + turn) % len(QUESTIONS)], author="User")
+        started = time.perf_counter()
+        await app.on_message(message)
+        latencies.append(time.perf_counter() - started)
+    
+    await app.on_chat_end()
+
+async def drain_background(app) -> None:
+    """Wait for background work (summaries, warm-up) started by the handlers."""
+    while app.background_tasks:
+        await asyncio.gather(*list(app.background_tasks), return_exceptions=True)
+
+async def bench_end_to_end(app, conversations: int, turns: int) -> Dict[str, Any]:
+    """End-to-end ``on_message`` latency over concurrent conversations."""
+    latencies: List[float] = []
+    monitor = LoopLagMonitor()
+    monitor.start()
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        asyncio.create_task(run_conversation(app, turns, index, latencies))
+        for index in range(conversations)
+    ))
+    elapsed = time.perf_counter() - started
+    
+    await monitor.stop()
+    await drain_background(app)
+    
+    result = summarize(latencies)
+    result["turns_per_second"] = len(latencies) / elapsed if elapsed else 0.0
+    result["loop_lag_p99_ms"] = percentile(monitor.lags, 99) * 1000
+    result["loop_lag_max_ms"] = max(monitor.lags, default=0.0) * 1000
+    return result
+
+async def bench_loop_overhead(app, turns: int) -> Dict[str, Any]:
+    """
+    Per-turn cost of the app itself, measured with zero-latency providers.
+    
+    With nothing to wait on, wall time per turn is pure event-loop and handler
+    overhead; CPU time separates it from scheduling delays.
+    """
+    install_mock_providers(kind="fixed", mean=0.0)
+    
+    init_http_context()
+    await app.on_chat_start()
+    
+    wall: List[float] = []
+    cpu: List[float] = []
+    for turn in range(turns):
+        message = cl.Message(content=QUESTIONS[turn % len(QUESTIONS)], author="User")
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        await app.on_message(message)
+        cpu.append(time.process_time() - cpu_started)
+        wall.append(time.perf_counter() - wall_started)
+    
+    await app.on_chat_end()
+    await drain_background(app)
+    
+    return {"wall": summarize(wall), "cpu": summarize(cpu)}
+
+def bench_payload_build(app, lengths: List[int], repeats: int) -> Dict[str, Any]:
+    """Cost of fitting history into each provider's payload, by history length."""
+    results = {}
+    for length in lengths:
+        conversation = Conversation("benchmark")
+        for index in range(length):
+            role = "user" if index % 2 == 0 else "assistant"
+            content = QUESTIONS[index % len(QUESTIONS)] if role == "user" else CANNED_RESPONSE
+            conversation.append(role, content)
+        
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            for provider in config.llms:
+                app.build_history(conversation, provider, QUESTIONS[0])
+            timings.append(time.perf_counter() - started)
+        results[str(length)] = summarize(timings)
+    return results
+
+def bench_comparison_render(repeats: int) -> Dict[str, Any]:
+    """Time to render the comparison (as the panel does on every update) for every provider."""
+    from components.comparison import render_comparison_markdown
+    
+    responses = {llm.display_name: CANNED_RESPONSE for llm in config.llms.values()}
+    
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        render_comparison_markdown(QUESTIONS[0], responses)
+        timings.append(time.perf_counter() - started)
+    return summarize(timings)
+
+def git_commit() -> Optional[str]:
+    """Current git commit, if available."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run every benchmark and collect the results."""
+    import app
+    
+    # Responses must come from the mocks every time
+    config.cache_enabled = False
+    install_mock_providers(args.latency, args.mean, args.spread, args.seed)
+    
+    results = {
+        "end_to_end": await bench_end_to_end(app, args.conversations, args.turns),
+        "loop_overhead": await bench_loop_overhead(app, args.turns),
+        "payload_build": bench_payload_build(app, [0, 10, 50, 200, 1000], args.repeats),
+        "comparison_render": bench_comparison_render(args.repeats)
+    }
+    
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "latency": {"kind": args.latency, "mean": args.mean, "spread": args.spread},
+            "seed": args.seed,
+            "conversations": args.conversations,
+            "turns": args.turns,
+            "repeats": args.repeats
+        },
+        "results": results
+    }
+
+def flatten(data: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """Flatten nested results into dotted keys."""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> str:
+    """Format the change in every metric between two result files."""
+    before = flatten(baseline["results"])
+    after = flatten(current["results"])
+    
+    lines = [
+        f"Comparing {baseline['meta'].get('commit')} -> {current['meta'].get('commit')}",
+        f"{'metric':<45} {'before':>12} {'after':>12} {'change':>9}"
+    ]
+    for name in sorted(before.keys() & after.keys()):
+        change = (after[name] - before[name]) / before[name] * 100 if before[name] else 0.0
+        lines.append(f"{name:<45} {before[name]:>12.3f} {after[name]:>12.3f} {change:>+8.1f}%")
+    return "\n".join(lines)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description="Benchmark the Chainlit app against mock providers.")
+    parser.add_argument("--conversations", type=int, default=20, help="Concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=5, help="Messages per simulated user")
+    parser.add_argument("--repeats", type=int, default=200, help="Iterations for the micro-benchmarks")
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal",
+                        help="Mock provider latency distribution")
+    parser.add_argument("--mean", type=float, default=0.2, help="Mean (median for lognormal) latency in seconds")
+    parser.add_argument("--spread", type=float, default=0.5, help="Spread of the latency distribution")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latencies and injected errors")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the benchmarks, write the results and optionally compare them."""
+    args = parse_args(argv)
+    results = asyncio.run(run_benchmarks(args))
+    
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), results))
+    else:
+        e2e = results["results"]["end_to_end"]
+        print(
+            f"on_message p50 {e2e['p50_ms']:.1f} ms, p95 {e2e['p95_ms']:.1f} ms, "
+            f"p99 {e2e['p99_ms']:.1f} ms, {e2e['turns_per_second']:.1f} turns/s"
+        )
+
+if __name__ == "__main__":
+    main()
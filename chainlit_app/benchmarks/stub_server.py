@@ -0,0 +1,288 @@
+"""
+Local OpenAI-compatible stub server for load tests.
+
+Serves ``/v1/chat/completions`` (streaming and non-streaming) and
+``/v1/models`` with seeded, tunable latency and error rates, so the app can be
+load tested without calling or paying for a real provider.
+
+Usage (from the chainlit_app directory):
+    python -m benchmarks.stub_server --port 8001 --latency lognormal --mean 0.5 --error-rate 0.01
+
+Then point the app at it with ``OPENAI_BASE_URL=http://127.0.0.1:8001/v1``.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.mock_providers import LatencyModel, CANNED_RESPONSE
+
+# Reason phrases for the status codes the stub sends
+REASONS = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+class StubServer:
+    """
+    Minimal asyncio HTTP/1.1 server speaking the OpenAI chat completions API.
+    
+    Each completion waits a latency sampled from ``latency``: a share of it
+    (``ttft_fraction``) before the first token and the rest spread over the
+    remaining chunks. A share of requests fails with a 500 (``error_rate``)
+    or a 429 with ``Retry-After`` (``rate_limit_rate``). Tests can script the
+    status of the first completions instead (``statuses``).
+    """
+    
+    def __init__(self,
+                 latency: LatencyModel,
+                 error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0,
+                 ttft_fraction: float = 0.3,
+                 words_per_chunk: int = 3,
+                 text: str = CANNED_RESPONSE,
+                 seed: int = 0,
+                 statuses: Optional[List[int]] = None,
+                 retry_after: float = 1.0):
+        """
+        Create the server; call ``start`` to begin listening.
+        
+        Args:
+            statuses: Status codes (200, 429 or 500) for the first completions,
+                in order, before the error rates apply
+            retry_after: Seconds sent in the ``Retry-After`` header of 429s
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.ttft_fraction = ttft_fraction
+        self.statuses = list(statuses or [])
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        
+        words = text.split(" ")
+        self.chunks = [
+            " ".join(words[i:i + words_per_chunk]) + " "
+            for i in range(0, len(words), words_per_chunk)
+        ]
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "in_flight": 0}
+        self._server: Optional[asyncio.AbstractServer] = None
+    
+    async def start(self, host: str = "127.0.0.1", port: int = 8001) -> int:
+        """
+        Start listening.
+        
+        Returns:
+            The bound port (useful with ``port=0``)
+        """
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+    
+    async def stop(self) -> None:
+        """Stop listening and close the server."""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+    
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        """Read one request, or return None when the client closed the connection."""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        
+        body = await reader.readexactly(int(headers.get("content-length", "0")))
+        return method, path, headers, body
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve keep-alive requests on one connection until the client goes away."""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                
+                if method == "GET" and path.rstrip("/").endswith("/models"):
+                    await self._send_json(writer, 200, {
+                        "object": "list",
+                        "data": [{"id": "stub-model", "object": "model", "owned_by": "stub"}]
+                    })
+                elif method == "POST" and path.rstrip("/").endswith("/chat/completions"):
+                    await self._complete(writer, json.loads(body or b"{}"))
+                else:
+                    await self._send_json(writer, 404, {"error": {"message": f"No route for {method} {path}"}})
+                
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # Idle keep-alive connections are cancelled at shutdown; end quietly
+            pass
+        finally:
+            writer.close()
+    
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict, extra_headers: str = "") -> None:
+        """Write a complete JSON response."""
+        body = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"{extra_headers}\r\n".encode() + body
+        )
+        await writer.drain()
+    
+    async def _complete(self, writer: asyncio.StreamWriter, request: Dict) -> None:
+        """Answer one chat completion request, streamed or not."""
+        self.stats["requests"] += 1
+        self.stats["in_flight"] += 1
+        try:
+            total = self.latency.sample()
+            await asyncio.sleep(total * self.ttft_fraction)
+            
+            status = self._next_status()
+            if status == 429:
+                self.stats["rate_limited"] += 1
+                await self._send_json(
+                    writer, 429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                    extra_headers=f"Retry-After: {self.retry_after:g}\r\n"
+                )
+                return
+            if status == 500:
+                self.stats["errors"] += 1
+                await self._send_json(writer, 500, {"error": {"message": "Injected failure", "type": "server_error"}})
+                return
+            
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            model = request.get("model", "stub-model")
+            gap = total * (1 - self.ttft_fraction) / max(1, len(self.chunks) - 1)
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in request.get("messages", [])) // 4
+            completion_tokens = len("".join(self.chunks)) // 4
+            
+            if not request.get("stream"):
+                await asyncio.sleep(total * (1 - self.ttft_fraction))
+                await self._send_json(writer, 200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(self.chunks)},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens
+                    }
+                })
+                return
+            
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/event-stream\r\n"
+                b"Transfer-Encoding: chunked\r\n\r\n"
+            )
+            for index, chunk in enumerate(self.chunks):
+                if index and gap:
+                    await asyncio.sleep(gap)
+                self._write_event(writer, {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": chunk} if index else {"role": "assistant", "content": chunk},
+                        "finish_reason": None
+                    }]
+                })
+                await writer.drain()
+            self._write_event(writer, {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            })
+            self._write_chunk(writer, b"data: [DONE]\n\n")
+            self._write_chunk(writer, b"")
+            await writer.drain()
+        finally:
+            self.stats["in_flight"] -= 1
+    
+    def _next_status(self) -> int:
+        """Pick the status of the next completion: scripted first, then by the error rates."""
+        if self.statuses:
+            return self.statuses.pop(0)
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return 200
+    
+    def _write_event(self, writer: asyncio.StreamWriter, payload: Dict) -> None:
+        """Write one server-sent event as an HTTP chunk."""
+        self._write_chunk(writer, f"data: {json.dumps(payload)}\n\n".encode())
+    
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+        """Write ``data`` with chunked transfer encoding (empty data ends the body)."""
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the stub server's latency and error options to a parser."""
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal",
+                        help="Completion latency distribution")
+    parser.add_argument("--mean", type=float, default=0.5, help="Mean (median for lognormal) latency in seconds")
+    parser.add_argument("--spread", type=float, default=0.5, help="Spread of the latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="Share of requests rejected with a 429 and Retry-After")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latencies and injected errors")
+
+def stub_from_args(args: argparse.Namespace) -> StubServer:
+    """Build a stub server from parsed ``add_stub_arguments`` options."""
+    return StubServer(
+        LatencyModel(args.latency, args.mean, args.spread, args.seed),
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed
+    )
+
+async def serve(args: argparse.Namespace) -> None:
+    """Run the stub server until interrupted."""
+    server = stub_from_args(args)
+    port = await server.start(args.host, args.port)
+    print(f"OpenAI-compatible stub listening on http://{args.host}:{port}/v1")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+def main() -> None:
+    """Parse options and serve."""
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub server.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8001, help="Port to bind")
+    add_stub_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,16 @@
 Initialize the components package.
 """
 
-from .comparison import create_comparison_element, create_css_element
+from .comparison import COMPARISON_CSS, ComparisonPanel, create_comparison_element, render_comparison, render_comparison_markdown
 from .instructions import get_gynecology_system_prompt, format_conversation_history
 
 # Export the component functions
 __all__ = [
+    "ComparisonPanel",
+    "COMPARISON_CSS",
     "create_comparison_element", 
-    "create_css_element",
+    "render_comparison",
+    "render_comparison_markdown",
     "get_gynecology_system_prompt",
     "format_conversation_history"
 ]
\ No newline at end of file
@@ -2,84 +2,19 @@
 Components for creating side-by-side model comparison UI.
 """
 
+import asyncio
+import html
+import time
 import chainlit as cl
-from typing import List, Dict, Any
-# Change from ..config import config
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from typing import Dict, Iterable, Optional
 from config import config
 
-async def create_comparison_element(
-    user_message: str,
-    responses: Dict[str, str],
-    chat_id: str
-) -> cl.Element:
-    """
-    Create a side-by-side comparison of multiple model responses.
-    
-    Args:
-        user_message: The original user message
-        responses: Dictionary mapping model names to their responses
-        chat_id: The current chat ID
-        
-    Returns:
-        A Chainlit Element for displaying the comparison
-    """
-    # Create HTML content for the comparison
-    html_content = f"""
-    <div class="comparison-container">
-        <div class="comparison-header">
-            <h3>Response Comparison</h3>
-            <p class="user-query">Query: <em>{user_message}</em></p>
-        </div>
-        <div class="comparison-grid">
-    """
-    
-    # Add each model response
-    for model_name, response_text in responses.items():
-        # Get model color from config
-        model_info = next((m for m in config.llms.values() if m.display_name == model_name), None)
-        model_color = model_info.color if model_info else "#666666"
-        
-        # Format the response with proper line breaks
-        formatted_response = response_text.replace("\n", "<br>")
-        
-        html_content += f"""
-        <div class="model-response">
-            <div class="model-header" style="background-color: {model_color};">
-                <h4>{model_name}</h4>
-            </div>
-            <div class="response-content">
-                {formatted_response}
-            </div>
-        </div>
-        """
-    
-    # Close the HTML container
-    html_content += """
-        </div>
-    </div>
-    """
-    
-    # Create a Chainlit Element with the HTML content
-    comparison_element = cl.Element(
-        type="html",
-        content=html_content,
-        name=f"comparison-{chat_id}",
-        display="inline"
-    )
-    
-    return comparison_element
+# Display name -> header color, built once instead of scanning config.llms per model
+MODEL_COLORS: Dict[str, str] = {llm.display_name: llm.color for llm in config.llms.values()}
+DEFAULT_COLOR = "#666666"
 
-async def create_css_element() -> cl.Element:
-    """
-    Create a CSS element for styling the comparison UI.
-    
-    Returns:
-        A Chainlit Element containing the CSS styles
-    """
-    css_content = """
+# Stylesheet for the HTML rendering (chat messages display Markdown instead)
+COMPARISON_CSS = """
     <style>
         .comparison-container {
             font-family: 'Open Sans', sans-serif;
@@ -145,6 +80,11 @@ async def create_css_element() -> cl.Element:
             max-height: 500px;
         }
         
+        .response-pending {
+            color: #999;
+            font-style: italic;
+        }
+        
         @media (max-width: 768px) {
             .comparison-grid {
                 grid-template-columns: 1fr;
@@ -152,13 +92,165 @@ async def create_css_element() -> cl.Element:
         }
     </style>
     """
+
+def render_comparison(user_message: str, responses: Dict[str, str]) -> str:
+    """
+    Render the comparison as HTML, for pages outside the chat (such as batch reports).
+    
+    Needs no Chainlit session; style it with ``COMPARISON_CSS``.
+    
+    Args:
+        user_message: The original user message (plain text)
+        responses: Dictionary mapping model names to their responses (plain text)
+    
+    Returns:
+        The HTML for the comparison container
+    """
+    parts = [
+        "<div class=\"comparison-container\">"
+        "<div class=\"comparison-header\"><h3>Response Comparison</h3>"
+        f"<p class=\"user-query\">Query: <em>{html.escape(user_message)}</em></p></div>"
+        "<div class=\"comparison-grid\">"
+    ]
+    
+    # Add each model response, with proper line breaks
+    for model_name, response_text in responses.items():
+        parts.append(
+            "<div class=\"model-response\">"
+            f"<div class=\"model-header\" style=\"background-color: {MODEL_COLORS.get(model_name, DEFAULT_COLOR)};\">"
+            f"<h4>{html.escape(model_name)}</h4></div>"
+            f"<div class=\"response-content\">{html.escape(response_text).replace(chr(10), '<br>')}</div>"
+            "</div>"
+        )
+    
+    parts.append("</div></div>")
+    return "".join(parts)
+
+def render_comparison_markdown(user_message: str, responses: Dict[str, Optional[str]]) -> str:
+    """
+    Render the comparison as Markdown, the format chat messages display.
+    
+    Args:
+        user_message: The original user message
+        responses: Dictionary mapping model names to their responses (None while waiting)
+    
+    Returns:
+        The Markdown for a message: the query, then one section per model
+    """
+    query = "\n".join(f"> {line}" for line in user_message.splitlines() or [""])
+    parts = [f"**Response Comparison**\n\n{query}"]
+    for model_name, response_text in responses.items():
+        parts.append(f"#### {model_name}\n\n{response_text or '_Waiting for a response..._'}")
+    return "\n\n---\n\n".join(parts)
+
+async def create_comparison_element(
+    user_message: str,
+    responses: Dict[str, str],
+    chat_id: str
+) -> cl.Text:
+    """
+    Create a side-by-side comparison of multiple model responses.
+    
+    Args:
+        user_message: The original user message
+        responses: Dictionary mapping model names to their responses
+        chat_id: The current chat ID
     
-    # Create a Chainlit Element with the CSS content
-    css_element = cl.Element(
-        type="html",
-        content=css_content,
-        name="comparison-css",
+    Returns:
+        A Chainlit Text element displaying the comparison inline
+    """
+    return cl.Text(
+        name=f"comparison-{chat_id}",
+        content=render_comparison_markdown(user_message, responses),
         display="inline"
     )
+
+class ComparisonPanel:
+    """
+    A comparison message created once per turn and filled in as responses arrive.
+    
+    Each model's section is updated from its stream or final response. Changes
+    are batched: the message is updated at most once per ``refresh_interval``
+    seconds, with everything that arrived in between.
+    """
+    
+    def __init__(self,
+                 user_message: str,
+                 model_names: Iterable[str],
+                 refresh_interval: Optional[float] = None):
+        """
+        Create the panel with an empty section per model.
+        
+        Args:
+            user_message: The original user message
+            model_names: Display names of the models, in display order
+            refresh_interval: Minimum seconds between UI updates
+                (defaults to ``config.comparison_refresh``)
+        """
+        self.user_message = user_message
+        self.texts: Dict[str, str] = {model_name: "" for model_name in model_names}
+        self.refresh_interval = config.comparison_refresh if refresh_interval is None else refresh_interval
+        self.message: Optional[cl.Message] = None
+        self.updates = 0
+        self._dirty = False
+        self._last_flush = 0.0
+        self._pending: Optional[asyncio.Task] = None
+    
+    def render(self) -> str:
+        """Render the panel with the text received so far."""
+        return render_comparison_markdown(self.user_message, self.texts)
+    
+    async def send(self, author: str = "Assistant") -> cl.Message:
+        """Send the panel in its own message."""
+        self._dirty = False
+        self.message = cl.Message(content=self.render(), author=author)
+        await self.message.send()
+        self._last_flush = time.monotonic()
+        return self.message
+    
+    def stream(self, model_name: str):
+        """Return an ``on_token`` callback that appends tokens to a model's section."""
+        async def on_token(token: str) -> None:
+            self.texts[model_name] += token
+            await self._schedule()
+        
+        return on_token
+    
+    async def set(self, model_name: str, text: str) -> None:
+        """Replace a model's section with its final response."""
+        self.texts[model_name] = text
+        await self._schedule()
+    
+    async def _schedule(self) -> None:
+        """Mark the panel changed and flush now or after the refresh interval."""
+        self._dirty = True
+        if self._pending is not None or self.message is None:
+            return
+        delay = self._last_flush + self.refresh_interval - time.monotonic()
+        if delay <= 0:
+            await self.flush()
+        else:
+            self._pending = asyncio.create_task(self._flush_later(delay))
+    
+    async def _flush_later(self, delay: float) -> None:
+        """Flush once the refresh interval has passed."""
+        await asyncio.sleep(delay)
+        self._pending = None
+        await self.flush()
+    
+    async def flush(self) -> None:
+        """Send the latest content if anything changed since the last update."""
+        if not self._dirty or self.message is None:
+            return
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self.message.content = self.render()
+        self.updates += 1
+        await self.message.update()
     
-    return css_element
\ No newline at end of file
+    async def close(self) -> None:
+        """Deliver any batched changes immediately and stop the refresh timer."""
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        await self.flush()
@@ -2,7 +2,8 @@
 System prompts and instructions for AI models.
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from services.history_buffers import HistoryBuffers
 
 def get_gynecology_system_prompt() -> str:
     """
@@ -22,45 +23,37 @@ def get_gynecology_system_prompt() -> str:
         "7. Use professional but accessible language"
     )
 
-def format_conversation_history(history: list) -> Dict[str, list]:
+def format_conversation_history(history: list,
+                                buffers: Optional[HistoryBuffers] = None) -> Dict[str, list]:
     """
     Format the conversation history for each model.
     
+    Each message is formatted once. Keep a ``HistoryBuffers`` and pass it on
+    every call for the same history; only the messages added since the
+    previous call are then formatted, instead of rebuilding every list.
+    
     Args:
         history: List of message objects from Chainlit
+        buffers: Optional buffers to fill incrementally across calls
         
     Returns:
-        Dictionary mapping model types to formatted history
+        Dictionary mapping model types to formatted history. The lists are
+        new, but share the buffers' message objects, which must not be mutated.
     """
-    openai_format = []
-    gemini_format = []
-    grok_format = []
+    if buffers is None:
+        buffers = HistoryBuffers()
     
-    # Process history for each message type
-    for msg in history:
+    # Process only the messages added since the last call
+    for msg in history[buffers.source_position:]:
         # Only process user and assistant messages
         if msg.author == "User":
-            # Format for OpenAI and Grok (they use the same format)
-            openai_msg = {"role": "user", "content": msg.content}
-            openai_format.append(openai_msg)
-            grok_format.append(openai_msg)
-            
-            # Format for Gemini
-            gemini_msg = {"role": "user", "parts": [{"text": msg.content}]}
-            gemini_format.append(gemini_msg)
-            
+            buffers.append("user", msg.content)
         elif msg.author == "Assistant":
-            # Format for OpenAI and Grok
-            openai_msg = {"role": "assistant", "content": msg.content}
-            openai_format.append(openai_msg)
-            grok_format.append(openai_msg)
-            
-            # Format for Gemini
-            gemini_msg = {"role": "model", "parts": [{"text": msg.content}]}
-            gemini_format.append(gemini_msg)
+            buffers.append("assistant", msg.content)
+    buffers.source_position = len(history)
     
     return {
-        "openai": openai_format,
-        "gemini": gemini_format,
-        "grok": grok_format
+        "openai": buffers.since("openai"),
+        "gemini": buffers.since("gemini"),
+        "grok": buffers.since("grok")
     }
\ No newline at end of file
@@ -6,11 +6,35 @@ This module loads environment variables and provides configuration settings.
 import os
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 # Load environment variables from .env file
 load_dotenv()
 
+def _env_float(name: str, default: Optional[float] = None) -> Optional[float]:
+    """Read an optional float from the environment."""
+    value = os.getenv(name, "")
+    return float(value) if value else default
+
+def _env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    """Read an optional integer from the environment."""
+    value = os.getenv(name, "")
+    return int(value) if value else default
+
+def _chainlit_session_timeout(default: int = 3600) -> int:
+    """Read ``session_timeout`` from the app's .chainlit/config.toml."""
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        import tomli as tomllib
+    
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".chainlit", "config.toml")
+    try:
+        with open(path, "rb") as f:
+            return int(tomllib.load(f).get("project", {}).get("session_timeout", default))
+    except (OSError, ValueError):
+        return default
+
 class LLMConfig(BaseModel):
     """Configuration for a single LLM model."""
     name: str
@@ -20,31 +44,134 @@ class LLMConfig(BaseModel):
     temperature: float = 0.1
     display_name: str
     color: str  # Color for UI display
+    enabled: bool = True  # Disabled providers are never imported or called
+    timeout: float = 30.0  # Seconds before a request is abandoned
+    hedge_after: Optional[float] = None  # Seconds before a duplicate request is fired (None disables hedging)
+    context_tokens: int = 8000  # Prompt + completion token budget per request
+    pool_size: int = 20  # Keep-alive connections held open to the provider
+    max_concurrency: int = 32  # In-flight requests allowed to the provider
+    executor_workers: int = 8  # Threads for blocking SDK calls (used when no async API exists)
+    rpm: Optional[int] = None  # Requests per minute allowed by the provider quota (None = unlimited)
+    tpm: Optional[int] = None  # Tokens per minute allowed by the provider quota (None = unlimited)
+    max_retries: int = 3  # Retries of rate-limited requests, after Retry-After or backoff
+    breaker_failures: int = 5  # Consecutive failures that open the provider's circuit
+    breaker_reset: float = 30.0  # Seconds an open circuit waits before probing the provider again
+    base_url: Optional[str] = None  # OpenAI-compatible API endpoint, e.g. a local stub server
+    quality_weight: float = 1.0  # Auto routing favors providers with a higher weight
 
 class AppConfig(BaseModel):
     """Main application configuration."""
     app_name: str = "Gynecology Chatbot"
     description: str = "Virtual gynecology assistant powered by multiple AI models"
     debug: bool = os.getenv("DEBUG", "False").lower() == "true"
+    # Idle conversations are evicted after the Chainlit session timeout
+    conversation_ttl: int = _chainlit_session_timeout()
+    max_conversations: int = int(os.getenv("MAX_CONVERSATIONS", "10000"))
+    max_conversation_bytes: int = int(os.getenv("MAX_CONVERSATION_BYTES", str(256 * 1024)))
+    # Recent history kept verbatim; older turns are folded into a rolling summary
+    history_window_tokens: int = int(os.getenv("HISTORY_WINDOW_TOKENS", "1500"))
+    summary_provider: str = os.getenv("SUMMARY_PROVIDER", "openai")
+    # Where conversations are kept: "memory" (this process only), "sqlite" or "redis".
+    # The persistent backends let conversations survive restarts and be shared by workers.
+    conversation_backend: str = os.getenv("CONVERSATION_BACKEND", "memory")
+    conversation_db_path: str = os.getenv("CONVERSATION_DB_PATH", ".cache/conversations.sqlite3")
+    conversation_redis_url: str = os.getenv("CONVERSATION_REDIS_URL", "redis://localhost:6379/0")
+    conversation_flush_interval: float = float(os.getenv("CONVERSATION_FLUSH_INTERVAL", "1.0"))  # Seconds changes are batched before writing
+    conversation_retention: Optional[float] = _env_float("CONVERSATION_RETENTION", 7 * 24 * 3600.0)  # Seconds kept after the last change
+    # Overlapping messages in one conversation: "queue" answers them in order,
+    # "supersede" cancels the earlier turns when a new message arrives
+    turn_policy: str = os.getenv("TURN_POLICY", "queue")
+    # Response cache: in-memory LRU in front of a SQLite file (empty path = memory only)
+    cache_enabled: bool = os.getenv("RESPONSE_CACHE", "True").lower() == "true"
+    cache_path: str = os.getenv("RESPONSE_CACHE_PATH", ".cache/responses.sqlite3")
+    cache_ttl: int = int(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600)))
+    cache_memory_entries: int = int(os.getenv("RESPONSE_CACHE_MEMORY_ENTRIES", "1024"))
+    cache_disk_entries: int = int(os.getenv("RESPONSE_CACHE_DISK_ENTRIES", "100000"))
+    # Identical concurrent provider requests share one upstream call
+    coalesce_requests: bool = os.getenv("COALESCE_REQUESTS", "True").lower() == "true"
+    # Prebuilt answers to frequent questions (built offline with ``python -m faq.build``)
+    faq_enabled: bool = os.getenv("FAQ_ENABLED", "True").lower() == "true"
+    faq_path: str = os.getenv("FAQ_PATH", "faq/answers.json")
+    faq_threshold: float = float(os.getenv("FAQ_THRESHOLD", "0.85"))
+    faq_require_vetted: bool = os.getenv("FAQ_REQUIRE_VETTED", "True").lower() == "true"
+    # Providers that answer, in order, when the primary model fails or its circuit is open
+    fallback_order: List[str] = [
+        provider.strip() for provider in os.getenv("FALLBACK_ORDER", "openai,gemini,grok").split(",")
+        if provider.strip()
+    ]
+    # One comparison message filled in as the models stream (when all model responses are shown)
+    comparison_panel: bool = os.getenv("COMPARISON_PANEL", "True").lower() == "true"
+    comparison_refresh: float = float(os.getenv("COMPARISON_REFRESH", "0.25"))  # Minimum seconds between panel updates
+    # "Auto" primary model: route each turn to the fastest healthy provider
+    routing_alpha: float = float(os.getenv("ROUTING_EWMA_ALPHA", "0.2"))  # Weight of each new request in the averages
+    routing_ttft_weight: float = float(os.getenv("ROUTING_TTFT_WEIGHT", "0.5"))  # Share of time to first token vs. total latency
+    routing_min_success: float = float(os.getenv("ROUTING_MIN_SUCCESS", "0.5"))  # Success rate below which a provider is avoided
+    routing_explore: float = float(os.getenv("ROUTING_EXPLORE", "0.05"))  # Share of turns sent to another healthy provider
+    routing_log_path: str = os.getenv("ROUTING_LOG_PATH", "")  # JSONL file of routing decisions (empty = not written)
+    # Provider slots go to primary-model requests before secondary (comparison) ones
+    priority_aging: float = float(os.getenv("PRIORITY_AGING", "2.0"))  # Seconds after which a waiting secondary counts as primary
+    secondary_max_wait: float = float(os.getenv("SECONDARY_MAX_WAIT", "10.0"))  # Seconds before a waiting secondary is shed (0 = never)
+    # Prometheus text endpoint served by the Chainlit server
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    metrics_path: str = os.getenv("METRICS_PATH", "/metrics")
     llms: Dict[str, LLMConfig] = {
         "openai": LLMConfig(
             name="openai",
             api_key=os.getenv("OPENAI_API_KEY", ""),
+            enabled=os.getenv("OPENAI_ENABLED", "True").lower() == "true",
             model_id=os.getenv("OPENAI_MODEL", "gpt-4o"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            timeout=_env_float("OPENAI_TIMEOUT", 30.0),
+            hedge_after=_env_float("OPENAI_HEDGE_AFTER"),
+            context_tokens=int(os.getenv("OPENAI_CONTEXT_TOKENS", "8000")),
+            pool_size=int(os.getenv("OPENAI_POOL_SIZE", "20")),
+            max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "32")),
+            rpm=_env_int("OPENAI_RPM"),
+            tpm=_env_int("OPENAI_TPM"),
+            max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "3")),
+            breaker_failures=int(os.getenv("OPENAI_BREAKER_FAILURES", "5")),
+            breaker_reset=_env_float("OPENAI_BREAKER_RESET", 30.0),
+            quality_weight=float(os.getenv("OPENAI_QUALITY_WEIGHT", "1.0")),
             display_name="ChatGPT",
             color="#10a37f"  # OpenAI green
         ),
         "gemini": LLMConfig(
             name="gemini",
             api_key=os.getenv("GEMINI_API_KEY", ""),
+            enabled=os.getenv("GEMINI_ENABLED", "True").lower() == "true",
             model_id=os.getenv("GEMINI_MODEL", "gemini-2.0-flash"),
+            timeout=_env_float("GEMINI_TIMEOUT", 30.0),
+            hedge_after=_env_float("GEMINI_HEDGE_AFTER"),
+            context_tokens=int(os.getenv("GEMINI_CONTEXT_TOKENS", "8000")),
+            pool_size=int(os.getenv("GEMINI_POOL_SIZE", "20")),
+            max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "32")),
+            rpm=_env_int("GEMINI_RPM"),
+            tpm=_env_int("GEMINI_TPM"),
+            max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+            breaker_failures=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+            breaker_reset=_env_float("GEMINI_BREAKER_RESET", 30.0),
+            quality_weight=float(os.getenv("GEMINI_QUALITY_WEIGHT", "1.0")),
+            executor_workers=int(os.getenv("GEMINI_EXECUTOR_WORKERS", "8")),
             display_name="Gemini",
             color="#1a73e8"  # Google blue gemini-pro
         ),
         "grok": LLMConfig(
             name="grok",
             api_key=os.getenv("GROK_API_KEY", ""),
+            enabled=os.getenv("GROK_ENABLED", "True").lower() == "true",
             model_id=os.getenv("GROK_MODEL", "grok-2"),
+            base_url=os.getenv("GROK_BASE_URL", "https://api.x.ai/v1"),
+            timeout=_env_float("GROK_TIMEOUT", 30.0),
+            hedge_after=_env_float("GROK_HEDGE_AFTER"),
+            context_tokens=int(os.getenv("GROK_CONTEXT_TOKENS", "8000")),
+            pool_size=int(os.getenv("GROK_POOL_SIZE", "20")),
+            max_concurrency=int(os.getenv("GROK_MAX_CONCURRENCY", "32")),
+            rpm=_env_int("GROK_RPM"),
+            tpm=_env_int("GROK_TPM"),
+            max_retries=int(os.getenv("GROK_MAX_RETRIES", "3")),
+            breaker_failures=int(os.getenv("GROK_BREAKER_FAILURES", "5")),
+            breaker_reset=_env_float("GROK_BREAKER_RESET", 30.0),
+            quality_weight=float(os.getenv("GROK_QUALITY_WEIGHT", "1.0")),
             display_name="Grok",
             color="#ff0000"  # Xitter red-ish
         )
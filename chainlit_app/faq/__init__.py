@@ -0,0 +1,3 @@
+"""
+Prebuilt answers to frequently asked questions.
+"""
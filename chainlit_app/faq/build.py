@@ -0,0 +1,122 @@
+"""
+Offline build step for prebuilt FAQ answers.
+
+Generates an answer for each curated question with the existing provider
+wrappers and stores them for review. Answers are written with
+``"vetted": false``; the app only serves answers a reviewer has marked
+``"vetted": true`` (unless FAQ_REQUIRE_VETTED=False).
+
+Usage (from the chainlit_app directory):
+    python -m faq.build
+    python -m faq.build --questions faq/questions.txt --output faq/answers.json --provider gemini
+    python -m faq.build --refresh   # regenerate answers that are not vetted yet
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from config import config
+from services.providers import providers
+from services.response_cache import normalize_prompt
+
+def read_questions(path: str) -> List[str]:
+    """Read the curated questions, one per line; blank lines and # comments are skipped."""
+    with open(path, encoding="utf-8") as f:
+        return [
+            line.strip() for line in f
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+
+def read_answers(path: str) -> List[Dict[str, Any]]:
+    """Read previously built answers, if any."""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def write_answers(path: str, entries: List[Dict[str, Any]]) -> None:
+    """Write the answers atomically, so the app never reads a half-written file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=2, ensure_ascii=False)
+    os.replace(temporary, path)
+
+async def build(questions: List[str],
+                existing: List[Dict[str, Any]],
+                provider: str,
+                concurrency: int,
+                refresh: bool) -> List[Dict[str, Any]]:
+    """
+    Generate answers for the questions that need one.
+    
+    Vetted answers are always kept. Unvetted answers are kept unless
+    ``refresh`` is set. Questions whose generation fails are reported and left
+    out, so a later run retries them.
+    
+    Returns:
+        The answers, in question order
+    """
+    by_question = {normalize_prompt(entry["question"]): entry for entry in existing}
+    model = providers.get(provider)
+    llm = config.llms[provider]
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def answer(question: str) -> Optional[Dict[str, Any]]:
+        entry = by_question.get(normalize_prompt(question))
+        if entry and (entry.get("vetted") or not refresh):
+            return entry
+        
+        async with semaphore:
+            response = await model.generate_response(question)
+        if response.startswith("Error"):
+            print(f"Skipped: {question} ({response})")
+            return None
+        
+        print(f"Answered: {question}")
+        return {
+            "question": question,
+            "answer": response,
+            "provider": provider,
+            "model": llm.model_id,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "vetted": False
+        }
+    
+    results = await asyncio.gather(*(answer(question) for question in questions))
+    return [entry for entry in results if entry]
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description="Build prebuilt answers for frequently asked questions.")
+    parser.add_argument("--questions", default="faq/questions.txt", help="Curated questions, one per line")
+    parser.add_argument("--output", default=config.faq_path, help="Where to store the answers")
+    parser.add_argument("--provider", default=config.summary_provider, choices=list(config.llms),
+                        help="Provider that writes the answers")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions answered at once")
+    parser.add_argument("--refresh", action="store_true", help="Regenerate answers that are not vetted yet")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Build the answers and write them."""
+    args = parse_args(argv)
+    if not providers.is_enabled(args.provider):
+        raise SystemExit(f"Provider '{args.provider}' is not enabled or has no API key.")
+    
+    questions = read_questions(args.questions)
+    entries = asyncio.run(build(
+        questions, read_answers(args.output), args.provider, args.concurrency, args.refresh
+    ))
+    write_answers(args.output, entries)
+    
+    vetted = sum(1 for entry in entries if entry.get("vetted"))
+    print(f"Wrote {len(entries)} of {len(questions)} answers to {args.output} ({vetted} vetted)")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,24 @@
 """
 Initialize the models package.
+
+The model classes are imported on first access, so importing one provider's
+wrapper does not pull in the others.
 """
 
-from .openai_model import OpenAIModel
-from .gemini_model import GeminiModel
-from .grok_model import GrokModel
+import importlib
+
+# Module that defines each exported model class
+_MODEL_MODULES = {
+    "OpenAIModel": ".openai_model",
+    "GeminiModel": ".gemini_model",
+    "GrokModel": ".grok_model"
+}
+
+def __getattr__(name):
+    if name in _MODEL_MODULES:
+        module = importlib.import_module(_MODEL_MODULES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Export the model classes
-__all__ = ["OpenAIModel", "GeminiModel", "GrokModel"]
\ No newline at end of file
+__all__ = ["OpenAIModel", "GeminiModel", "GrokModel"]
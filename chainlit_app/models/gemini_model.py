@@ -2,10 +2,17 @@
 Google Gemini model integration.
 """
 
-import google.generativeai as genai
 from typing import List, Dict, Any, Optional
 import asyncio
 from config import config
+from services.streaming import TokenCallback, stream_gemini
+from services.deadlines import call_with_deadline
+from services.response_cache import cached_generate
+from services.history_buffers import format_message
+from services.clients import clients
+from services.rate_limits import rate_limited
+from services.tokens import count_message_tokens
+from services.concurrency import get_executor, provider_slot
 
 class GeminiModel:
     """
@@ -19,19 +26,32 @@ class GeminiModel:
         self.max_tokens = config.llms["gemini"].max_tokens
         self.temperature = config.llms["gemini"].temperature
         self.name = config.llms["gemini"].display_name
+        self.timeout = config.llms["gemini"].timeout
+        self.hedge_after = config.llms["gemini"].hedge_after
         
-        # Configure the Gemini API
-        genai.configure(api_key=self.api_key)
+        # Gemini has no system role; the system prompt is sent as the first user turn
+        self.system_content = format_message("gemini", "user", config.system_prompt)
+        
+        # Build the long-lived model (and configure the API) up front
+        if self.api_key:
+            clients.gemini()
     
     async def generate_response(self, 
                                user_message: str, 
-                               chat_history: Optional[List[Dict[str, str]]] = None) -> str:
+                               chat_history: Optional[List[Dict[str, Any]]] = None,
+                               on_token: Optional[TokenCallback] = None) -> str:
         """
         Generate a response from the Gemini model.
         
+        The response is streamed so callers can render tokens as they arrive.
+        The call is abandoned after the configured timeout and, when configured,
+        hedged with a duplicate request.
+        
         Args:
             user_message: The user's message to respond to
-            chat_history: Optional list of previous messages for context
+            chat_history: Optional list of previous messages for context, either in
+                Gemini's ``{"role", "parts"}`` format or the OpenAI format
+            on_token: Optional async callback invoked with each text chunk
             
         Returns:
             The model's response text
@@ -40,62 +60,85 @@ class GeminiModel:
             return "Error: Gemini API key not configured."
         
         try:
-            # Format the history for Gemini
-            formatted_history = []
-            
-            # Add system instruction first
-            formatted_history.append({
-                "role": "user",
-                "parts": [{
-                    "text": config.system_prompt
-                }]
-            })
-            
-            # Add previous messages if any
-            if chat_history:
-                for msg in chat_history:
-                    role = "user" if msg["role"] == "user" else "model"
-                    formatted_history.append({
-                        "role": role,
-                        "parts": [{"text": msg["content"]}]
-                    })
-            
-            # Add current user message
-            formatted_history.append({
-                "role": "user",
-                "parts": [{"text": user_message}]
-            })
-            
-            # Use a synchronous call in an executor to make it async-compatible
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                self._generate_gemini_response,
-                formatted_history
-            )
-            
-            return response
+            return await self.complete(user_message, chat_history, on_token)
             
+        except asyncio.TimeoutError:
+            return f"Error: {self.name} did not respond within {self.timeout:g} seconds."
         except Exception as e:
             return f"Error generating response from Gemini: {str(e)}"
     
-    def _generate_gemini_response(self, formatted_history):
-        """Helper method to make the synchronous Gemini API call."""
-        # Initialize the Gemini model
-        generation_config = {
-            "temperature": self.temperature,
-            "max_output_tokens": self.max_tokens,
-        }
+    async def complete(self,
+                       user_message: str,
+                       chat_history: Optional[List[Dict[str, Any]]] = None,
+                       on_token: Optional[TokenCallback] = None) -> str:
+        """
+        Like ``generate_response`` but failures are raised instead of returned as text.
         
-        model = genai.GenerativeModel(
-            model_name=self.model,
-            generation_config=generation_config
-        )
+        Rate-limited requests queue for quota and are retried (see
+        ``services.rate_limits``) within the deadline.
+        
+        Raises:
+            asyncio.TimeoutError: If the model missed its deadline
+        """
+        # Format the history for Gemini: system instruction first, then
+        # previous messages if any, then the current user message.
+        # History from the conversation buffers is already in Gemini format.
+        formatted_history = [self.system_content]
+        if chat_history:
+            if "parts" in chat_history[0]:
+                formatted_history.extend(chat_history)
+            else:
+                formatted_history.extend(
+                    format_message("gemini", msg["role"], msg["content"])
+                    for msg in chat_history
+                )
+        formatted_history.append(format_message("gemini", "user", user_message))
+        
+        # Requests count against the token quota with their completion allowance
+        request_tokens = count_message_tokens(formatted_history) + self.max_tokens
         
-        # Generate the response
-        response = model.generate_content(
-            formatted_history
+        # Serve repeated requests from the response cache;
+        # otherwise call the Gemini API under the configured deadline
+        return await cached_generate(
+            config.llms["gemini"],
+            user_message,
+            chat_history,
+            config.system_prompt,
+            lambda cache_on_token: call_with_deadline(
+                lambda attempt_on_token: rate_limited(
+                    "gemini",
+                    request_tokens,
+                    lambda: self._stream_response(formatted_history, attempt_on_token)
+                ),
+                on_token=cache_on_token,
+                timeout=self.timeout,
+                hedge_after=self.hedge_after
+            ),
+            on_token=on_token
         )
+    
+    async def _stream_response(self,
+                               formatted_history: List[Dict[str, Any]],
+                               on_token: Optional[TokenCallback]) -> str:
+        """
+        Helper method to make one streaming Gemini API call.
+        
+        Uses the SDK's native async API when available; otherwise the synchronous
+        stream is iterated on Gemini's dedicated, bounded executor. If this attempt
+        is cancelled, a worker thread stops at the next chunk.
+        """
+        chunks = []
+        async with provider_slot("gemini"):
+            # Reuse the long-lived model (and its connection) from the client registry
+            async for chunk in stream_gemini(
+                clients.gemini(),
+                formatted_history,
+                get_executor("gemini")
+            ):
+                token = chunk.text
+                if token:
+                    chunks.append(token)
+                    if on_token:
+                        await on_token(token)
         
-        # Extract and return the text
-        return response.text
\ No newline at end of file
+        return "".join(chunks)
@@ -1,22 +1,23 @@
 """
-Grok model integration (simulation).
+Grok (xAI) model integration.
 """
 
-import requests
-import json
 from typing import List, Dict, Any, Optional
 import asyncio
-# Change from ..config import config
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import config
+from services.streaming import TokenCallback
+from services.deadlines import call_with_deadline
+from services.response_cache import cached_generate
+from services.clients import clients
+from services.rate_limits import rate_limited
+from services.tokens import count_message_tokens
+from services.concurrency import provider_slot
 
 class GrokModel:
     """
-    Wrapper for Grok's API (simulated for now).
+    Wrapper for Grok's OpenAI-compatible chat completions API.
     """
-    
+
     def __init__(self):
         """Initialize the Grok API with API key from config."""
         self.api_key = config.llms["grok"].api_key
@@ -24,92 +25,112 @@ class GrokModel:
         self.max_tokens = config.llms["grok"].max_tokens
         self.temperature = config.llms["grok"].temperature
         self.name = config.llms["grok"].display_name
-        
-        # Placeholder API URL (would need to be updated with actual Grok API)
-        self.api_url = "https://api.grok.ai/v1/chat/completions"
-    
-    async def generate_response(self, 
-                               user_message: str, 
-                               chat_history: Optional[List[Dict[str, str]]] = None) -> str:
+        self.timeout = config.llms["grok"].timeout
+        self.hedge_after = config.llms["grok"].hedge_after
+
+        # Requests go through the shared, pooled client for GROK_BASE_URL
+        self.client = clients.grok() if self.api_key else None
+        self.system_message = {"role": "system", "content": config.system_prompt}
+
+    async def generate_response(self,
+                               user_message: str,
+                               chat_history: Optional[List[Dict[str, str]]] = None,
+                               on_token: Optional[TokenCallback] = None) -> str:
         """
         Generate a response from the Grok model.
-        
+
+        The completion is streamed so callers can render tokens as they arrive.
+        The call is abandoned after the configured timeout and, when configured,
+        hedged with a duplicate request.
+
         Args:
             user_message: The user's message to respond to
             chat_history: Optional list of previous messages for context
-            
+            on_token: Optional async callback invoked with each text delta
+
         Returns:
             The model's response text
         """
         if not self.api_key:
-            return "Error: Grok API key not configured. Using simulated response."
-        
+            return "Error: Grok API key not configured."
+
         try:
-            # For now, we'll simulate a Grok response to demonstrate UI
-            # This would be replaced with actual API calls when Grok API is available
-            
-            # In a real implementation, we'd format the history for Grok
-            system_message = {
-                "role": "system",
-                "content": config.system_prompt
-            }
-            
-            messages = [system_message]
-            
-            # Add previous messages if any
-            if chat_history:
-                messages.extend(chat_history)
-            
-            # Add current user message
-            messages.append({
-                "role": "user",
-                "content": user_message
-            })
-            
-            # Simulate response delay
-            await asyncio.sleep(1)
-            
-            # For now, return a simulated response
-            return (
-                f"[SIMULATED GROK RESPONSE] As Grok doesn't have a public API yet, "
-                f"this is a simulated response to demonstrate UI functionality.\n\n"
-                f"In response to your query about '{user_message[:30]}...', "
-                f"I would provide gynecological information and guidance while "
-                f"recommending consultation with a healthcare provider for proper diagnosis."
-            )
-            
-            # When Grok API becomes available, it would look something like:
-            """
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "model": self.model,
-                "messages": messages,
-                "max_tokens": self.max_tokens,
-                "temperature": self.temperature
-            }
-            
-            response = await self._make_api_request(
-                self.api_url, 
-                headers=headers, 
-                json_data=data
-            )
-            
-            return response["choices"][0]["message"]["content"]
-            """
-            
+            return await self.complete(user_message, chat_history, on_token)
+
+        except asyncio.TimeoutError:
+            return f"Error: {self.name} did not respond within {self.timeout:g} seconds."
         except Exception as e:
             return f"Error generating response from Grok: {str(e)}"
-    
-    async def _make_api_request(self, url, headers, json_data):
-        """Make an async API request to the Grok endpoint."""
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: requests.post(url, headers=headers, json=json_data)
+
+    async def complete(self,
+                       user_message: str,
+                       chat_history: Optional[List[Dict[str, str]]] = None,
+                       on_token: Optional[TokenCallback] = None) -> str:
+        """
+        Like ``generate_response`` but failures are raised instead of returned as text.
+
+        Rate-limited requests queue for quota and are retried (see
+        ``services.rate_limits``) within the deadline.
+
+        Raises:
+            asyncio.TimeoutError: If the model missed its deadline
+        """
+        # Grok takes the OpenAI message format, system prompt first
+        messages = [self.system_message]
+
+        # Add chat history if provided
+        if chat_history:
+            messages.extend(chat_history)
+
+        # Add the current user message
+        messages.append({"role": "user", "content": user_message})
+
+        # Requests count against the token quota with their completion allowance
+        request_tokens = count_message_tokens(messages) + self.max_tokens
+
+        # Serve repeated requests from the response cache;
+        # otherwise call the Grok API under the configured deadline
+        return await cached_generate(
+            config.llms["grok"],
+            user_message,
+            chat_history,
+            config.system_prompt,
+            lambda cache_on_token: call_with_deadline(
+                lambda attempt_on_token: rate_limited(
+                    "grok",
+                    request_tokens,
+                    lambda: self._stream_response(messages, attempt_on_token)
+                ),
+                on_token=cache_on_token,
+                timeout=self.timeout,
+                hedge_after=self.hedge_after
+            ),
+            on_token=on_token
         )
-        response.raise_for_status()
-        return response.json()
\ No newline at end of file
+
+    async def _stream_response(self,
+                               messages: List[Dict[str, str]],
+                               on_token: Optional[TokenCallback]) -> str:
+        """Helper method to make one streaming Grok API call."""
+        # Stay within the provider's concurrency limit
+        async with provider_slot("grok"):
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                stream=True
+            )
+
+            # Forward each delta and accumulate the full response text
+            chunks = []
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = getattr(chunk.choices[0].delta, "content", None)
+                if token:
+                    chunks.append(token)
+                    if on_token:
+                        await on_token(token)
+
+        return "".join(chunks)
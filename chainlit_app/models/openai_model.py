@@ -2,14 +2,16 @@
 OpenAI (ChatGPT) model integration.
 """
 
-import openai
 from typing import List, Dict, Any, Optional
 import asyncio
-# Change from ..config import config
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import config
+from services.streaming import TokenCallback
+from services.deadlines import call_with_deadline
+from services.response_cache import cached_generate
+from services.clients import clients
+from services.rate_limits import rate_limited
+from services.tokens import count_message_tokens
+from services.concurrency import provider_slot
 
 class OpenAIModel:
     """
@@ -23,19 +25,28 @@ class OpenAIModel:
         self.max_tokens = config.llms["openai"].max_tokens
         self.temperature = config.llms["openai"].temperature
         self.name = config.llms["openai"].display_name
+        self.timeout = config.llms["openai"].timeout
+        self.hedge_after = config.llms["openai"].hedge_after
         
-        # Set the API key
-        openai.api_key = self.api_key
+        # Requests go through the shared, pooled client from the registry
+        self.client = clients.openai() if self.api_key else None
+        self.system_message = {"role": "system", "content": config.system_prompt}
     
     async def generate_response(self, 
                                user_message: str, 
-                               chat_history: Optional[List[Dict[str, str]]] = None) -> str:
+                               chat_history: Optional[List[Dict[str, str]]] = None,
+                               on_token: Optional[TokenCallback] = None) -> str:
         """
         Generate a response from the OpenAI model.
         
+        The completion is streamed so callers can render tokens as they arrive.
+        The call is abandoned after the configured timeout and, when configured,
+        hedged with a duplicate request.
+        
         Args:
             user_message: The user's message to respond to
             chat_history: Optional list of previous messages for context
+            on_token: Optional async callback invoked with each text delta
             
         Returns:
             The model's response text
@@ -44,26 +55,82 @@ class OpenAIModel:
             return "Error: OpenAI API key not configured."
         
         try:
-            # Create the messages array with system prompt
-            messages = [{"role": "system", "content": config.system_prompt}]
-            
-            # Add chat history if provided
-            if chat_history:
-                messages.extend(chat_history)
-            
-            # Add the current user message
-            messages.append({"role": "user", "content": user_message})
+            return await self.complete(user_message, chat_history, on_token)
             
-            # Call the OpenAI API
-            response = await openai.ChatCompletion.acreate(
+        except asyncio.TimeoutError:
+            return f"Error: {self.name} did not respond within {self.timeout:g} seconds."
+        except Exception as e:
+            return f"Error generating response from ChatGPT: {str(e)}"
+    
+    async def complete(self,
+                       user_message: str,
+                       chat_history: Optional[List[Dict[str, str]]] = None,
+                       on_token: Optional[TokenCallback] = None) -> str:
+        """
+        Like ``generate_response`` but failures are raised instead of returned as text.
+        
+        Rate-limited requests queue for quota and are retried (see
+        ``services.rate_limits``) within the deadline.
+        
+        Raises:
+            asyncio.TimeoutError: If the model missed its deadline
+        """
+        # Create the messages array with system prompt
+        messages = [self.system_message]
+        
+        # Add chat history if provided
+        if chat_history:
+            messages.extend(chat_history)
+        
+        # Add the current user message
+        messages.append({"role": "user", "content": user_message})
+        
+        # Requests count against the token quota with their completion allowance
+        request_tokens = count_message_tokens(messages) + self.max_tokens
+        
+        # Serve repeated requests from the response cache;
+        # otherwise call the OpenAI API under the configured deadline
+        return await cached_generate(
+            config.llms["openai"],
+            user_message,
+            chat_history,
+            config.system_prompt,
+            lambda cache_on_token: call_with_deadline(
+                lambda attempt_on_token: rate_limited(
+                    "openai",
+                    request_tokens,
+                    lambda: self._stream_response(messages, attempt_on_token)
+                ),
+                on_token=cache_on_token,
+                timeout=self.timeout,
+                hedge_after=self.hedge_after
+            ),
+            on_token=on_token
+        )
+    
+    async def _stream_response(self,
+                               messages: List[Dict[str, str]],
+                               on_token: Optional[TokenCallback]) -> str:
+        """Helper method to make one streaming OpenAI API call."""
+        # Stay within the provider's concurrency limit
+        async with provider_slot("openai"):
+            stream = await self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 max_tokens=self.max_tokens,
-                temperature=self.temperature
+                temperature=self.temperature,
+                stream=True
             )
             
-            # Extract and return the response text
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            return f"Error generating response from ChatGPT: {str(e)}"
\ No newline at end of file
+            # Forward each delta and accumulate the full response text
+            chunks = []
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = getattr(chunk.choices[0].delta, "content", None)
+                if token:
+                    chunks.append(token)
+                    if on_token:
+                        await on_token(token)
+        
+        return "".join(chunks)
@@ -0,0 +1,83 @@
+"""
+Initialize the services package.
+"""
+
+from .streaming import TokenCallback, iterate_in_thread, stream_gemini
+from .deadlines import call_with_deadline
+from .history_buffers import HistoryBuffers, format_message
+from .conversation_store import Conversation, ConversationStore
+from .conversation_backends import ConversationBackend, MemoryBackend, RedisBackend, SQLiteBackend, create_backend
+from .tokens import count_message_tokens, count_tokens
+from .summarizer import refresh_summary
+from .clients import ClientRegistry, clients
+from .concurrency import PRIMARY, SECONDARY, BoundedExecutor, PrioritySlots, ProviderBusy, RequestPriority, concurrency_stats, current_priority, get_executor, get_slots, provider_slot, request_priority
+from .providers import ProviderRegistry, providers
+from .response_cache import ResponseCache, cache_key, cached_generate, get_response_cache
+from .metrics import Counter, Gauge, Histogram, MetricsRegistry, metrics
+from .single_flight import SingleFlight, single_flight
+from .faq_index import FAQIndex, get_faq_index
+from .circuit_breaker import CircuitBreaker, get_breaker
+from .rate_limits import ProviderLimiter, TokenBucket, get_limiter, rate_limited
+from .routing import ProviderRouter, ProviderStats, router
+from .turns import TurnCancelled, TurnScheduler, turns
+
+# Export the service helpers
+__all__ = [
+    "TokenCallback",
+    "iterate_in_thread",
+    "stream_gemini",
+    "call_with_deadline",
+    "HistoryBuffers",
+    "format_message",
+    "Conversation",
+    "ConversationStore",
+    "ConversationBackend",
+    "MemoryBackend",
+    "SQLiteBackend",
+    "RedisBackend",
+    "create_backend",
+    "count_tokens",
+    "count_message_tokens",
+    "refresh_summary",
+    "ResponseCache",
+    "cache_key",
+    "cached_generate",
+    "get_response_cache",
+    "ClientRegistry",
+    "clients",
+    "BoundedExecutor",
+    "concurrency_stats",
+    "get_executor",
+    "provider_slot",
+    "PRIMARY",
+    "SECONDARY",
+    "PrioritySlots",
+    "ProviderBusy",
+    "RequestPriority",
+    "current_priority",
+    "get_slots",
+    "request_priority",
+    "ProviderRegistry",
+    "providers",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsRegistry",
+    "metrics",
+    "ProviderLimiter",
+    "TokenBucket",
+    "get_limiter",
+    "rate_limited",
+    "ProviderRouter",
+    "ProviderStats",
+    "router",
+    "TurnCancelled",
+    "TurnScheduler",
+    "turns",
+    "CircuitBreaker",
+    "get_breaker",
+    "SingleFlight",
+    "single_flight",
+    "FAQIndex",
+    "get_faq_index"
+]
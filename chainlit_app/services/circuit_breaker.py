@@ -0,0 +1,133 @@
+"""
+Per-provider circuit breakers, so an outage costs one timeout instead of one per turn.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from config import config
+from .concurrency import ProviderBusy
+from .metrics import Gauge, metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Gauge values for each state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitBreaker:
+    """
+    Stops calling a provider after repeated failures.
+    
+    Closed: calls go through; ``failure_threshold`` consecutive failures open
+    the circuit. Open: calls are skipped until ``reset_timeout`` seconds have
+    passed. Half-open: one probe call is let through; its success closes the
+    circuit and its failure opens it again.
+    """
+    
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """Create a closed breaker."""
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+    
+    def allow(self) -> bool:
+        """
+        Whether a call may be made now.
+        
+        A True answer in the half-open state reserves the probe, so the caller
+        must make the call (inside ``track``).
+        """
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            logger.info(f"Circuit for {self.name} is half-open; probing")
+        
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+    
+    def ready(self) -> bool:
+        """Whether ``allow`` would let a call through now, without reserving the half-open probe."""
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at >= self.reset_timeout
+        return not (self.state == HALF_OPEN and self.probe_in_flight)
+    
+    def record_success(self) -> None:
+        """Close the circuit after a successful call."""
+        if self.state != CLOSED:
+            logger.info(f"Circuit for {self.name} closed")
+        self.state = CLOSED
+        self.failures = 0
+        self.probe_in_flight = False
+    
+    def record_failure(self) -> None:
+        """Count a failed call, opening the circuit at the threshold or after a failed probe."""
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+    
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """
+        Record the outcome of the call made inside the block.
+        
+        A cancelled call (such as a secondary abandoned with its turn) or one
+        shed before it was sent says nothing about the provider's health and
+        is not counted. Neither is a request answered from the response cache
+        or by joining an identical call in flight (see ``metrics.mark_served``):
+        only the request that made the upstream call records its outcome.
+        """
+        with metrics.served_from() as served:
+            try:
+                yield
+            except (asyncio.CancelledError, ProviderBusy):
+                self.probe_in_flight = False
+                raise
+            except Exception:
+                if served["source"] is None:
+                    self.record_failure()
+                else:
+                    self.probe_in_flight = False
+                raise
+            else:
+                if served["source"] is None:
+                    self.record_success()
+                else:
+                    self.probe_in_flight = False
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    """Return the provider's breaker, configured from its ``breaker_*`` settings."""
+    if provider not in _breakers:
+        llm = config.llms[provider]
+        _breakers[provider] = CircuitBreaker(provider, llm.breaker_failures, llm.breaker_reset)
+    return _breakers[provider]
+
+def breaker_states() -> Dict[str, str]:
+    """Return the state of every breaker created so far."""
+    return {provider: breaker.state for provider, breaker in _breakers.items()}
+
+metrics.register(Gauge(
+    "llm_circuit_state",
+    "Provider circuit breaker state (0 closed, 1 half-open, 2 open).",
+    ("provider",),
+    collect=lambda: {(provider,): STATE_VALUES[state] for provider, state in breaker_states().items()}
+))
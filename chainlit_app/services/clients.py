@@ -0,0 +1,133 @@
+"""
+Process-wide registry of long-lived provider clients.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+class ClientRegistry:
+    """
+    Builds each provider client once per process and hands out the same instance.
+    
+    Each client owns a keep-alive connection pool sized from the provider's
+    ``pool_size`` setting, so requests reuse established TCP/TLS connections
+    instead of paying a new handshake every time. Provider SDKs are imported
+    when their client is first requested, and the time spent importing each
+    SDK and building each client is kept in ``timings``.
+    """
+    
+    def __init__(self):
+        """Create an empty registry."""
+        self._clients: Dict[str, Any] = {}
+        self._warmed = False
+        self.timings: Dict[str, Dict[str, float]] = {}
+    
+    def _openai_compatible(self, provider: str):
+        """Return the shared async OpenAI SDK client for a provider speaking the OpenAI API."""
+        if provider not in self._clients:
+            started = time.perf_counter()
+            import httpx
+            import openai
+            imported = time.perf_counter()
+            
+            llm = config.llms[provider]
+            self._clients[provider] = openai.AsyncOpenAI(
+                api_key=llm.api_key,
+                base_url=llm.base_url,
+                # Rate-limit retries are handled by services.rate_limits
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=llm.pool_size,
+                        max_keepalive_connections=llm.pool_size
+                    ),
+                    timeout=httpx.Timeout(llm.timeout)
+                )
+            )
+            self.timings[provider] = {"sdk_import": imported - started, "client": time.perf_counter() - imported}
+        return self._clients[provider]
+    
+    def openai(self):
+        """Return the shared async OpenAI client."""
+        return self._openai_compatible("openai")
+    
+    def gemini(self):
+        """Return the shared Gemini model, configured from config.llms["gemini"]."""
+        if "gemini" not in self._clients:
+            started = time.perf_counter()
+            import google.generativeai as genai
+            imported = time.perf_counter()
+            
+            llm = config.llms["gemini"]
+            genai.configure(api_key=llm.api_key)
+            
+            # The model reuses the SDK's default client and its gRPC channel
+            self._clients["gemini"] = genai.GenerativeModel(
+                model_name=llm.model_id,
+                generation_config={
+                    "temperature": llm.temperature,
+                    "max_output_tokens": llm.max_tokens,
+                }
+            )
+            self.timings["gemini"] = {"sdk_import": imported - started, "client": time.perf_counter() - imported}
+        return self._clients["gemini"]
+    
+    def grok(self):
+        """Return the shared async client for Grok's OpenAI-compatible API (``GROK_BASE_URL``)."""
+        return self._openai_compatible("grok")
+    
+    async def warm(self) -> None:
+        """
+        Build the clients of configured providers and open a first connection to each.
+        
+        Runs once per process; later calls return immediately. Failures are
+        logged and otherwise ignored, since warming is only an optimization.
+        """
+        if self._warmed:
+            return
+        self._warmed = True
+        
+        loop = asyncio.get_running_loop()
+        
+        async def warm_openai():
+            await self.openai().models.list()
+        
+        async def warm_grok():
+            await self.grok().models.list()
+        
+        async def warm_gemini():
+            import google.generativeai as genai
+            self.gemini()
+            await loop.run_in_executor(
+                None, genai.get_model, f"models/{config.llms['gemini'].model_id}"
+            )
+        
+        warmers = {"openai": warm_openai, "gemini": warm_gemini, "grok": warm_grok}
+        
+        results = await asyncio.gather(
+            *(
+                warm() for name, warm in warmers.items()
+                if config.llms[name].enabled and config.llms[name].api_key
+            ),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Client warm-up failed: {result}")
+    
+    async def aclose(self) -> None:
+        """Close every client's connection pool."""
+        for name, client in self._clients.items():
+            if name in ("openai", "grok"):
+                await client.close()
+        self._clients.clear()
+        self._warmed = False
+
+# Shared registry for the whole process
+clients = ClientRegistry()
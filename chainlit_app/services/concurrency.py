@@ -0,0 +1,317 @@
+"""
+Per-provider concurrency limits with priority scheduling, and dedicated,
+bounded executors.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Union
+
+from config import config
+from .metrics import Counter, Gauge, Histogram, metrics
+
+# Priority classes of provider requests: the answer the user is waiting for,
+# and the other models' responses shown for comparison
+PRIMARY = "primary"
+SECONDARY = "secondary"
+PRIORITIES = (PRIMARY, SECONDARY)
+
+class RequestPriority:
+    """
+    The priority class of a request's provider calls.
+    
+    Shared by every task the request starts (hedged attempts included), so
+    raising it with ``promote`` also moves calls already waiting for a slot.
+    """
+    
+    def __init__(self, level: str = PRIMARY):
+        """Create the priority; ``level`` is PRIMARY or SECONDARY."""
+        if level not in PRIORITIES:
+            raise ValueError(f"Unknown request priority '{level}' (expected {' or '.join(PRIORITIES)})")
+        self.level = level
+    
+    def promote(self) -> None:
+        """Make the request a primary one, for a primary caller waiting on it."""
+        self.level = PRIMARY
+
+# Priority of the provider requests made in the current task (and the tasks it starts)
+_priority: ContextVar[Optional[RequestPriority]] = ContextVar("request_priority", default=None)
+
+def current_priority() -> RequestPriority:
+    """Return the priority of the provider requests made in the current task."""
+    return _priority.get() or RequestPriority(PRIMARY)
+
+@contextmanager
+def request_priority(priority: Union[str, RequestPriority]) -> Iterator[RequestPriority]:
+    """Make the provider requests started inside the block ``priority`` requests."""
+    request = priority if isinstance(priority, RequestPriority) else RequestPriority(priority)
+    token = _priority.set(request)
+    try:
+        yield request
+    finally:
+        _priority.reset(token)
+
+# Queue waits are mostly near zero, so the buckets start finer than request latencies
+QUEUE_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class ProviderBusy(Exception):
+    """Raised when a secondary request is shed because the provider stayed saturated."""
+
+class BoundedExecutor(ThreadPoolExecutor):
+    """
+    Thread pool with a fixed size that reports its queue depth.
+    
+    Used instead of the loop's default executor for blocking SDK calls, so one
+    provider can neither starve other executor work nor pile up threads.
+    """
+    
+    def __init__(self, max_workers: int, thread_name_prefix: str = ""):
+        """Create the pool with at most ``max_workers`` threads."""
+        super().__init__(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self.max_workers = max_workers
+        self._counts_lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+    
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        """Submit work, tracking how long the queue in front of the workers is."""
+        with self._counts_lock:
+            self.queued += 1
+        
+        def tracked():
+            with self._counts_lock:
+                self.queued -= 1
+                self.running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._counts_lock:
+                    self.running -= 1
+                    self.completed += 1
+        
+        future = super().submit(tracked)
+        
+        def forget_if_cancelled(f: Future):
+            # A job cancelled before it started never runs ``tracked``
+            if f.cancelled():
+                with self._counts_lock:
+                    self.queued -= 1
+        
+        future.add_done_callback(forget_if_cancelled)
+        return future
+    
+    def stats(self) -> Dict[str, int]:
+        """Return the pool's size, queue depth and activity counters."""
+        with self._counts_lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed
+            }
+
+class _Waiter:
+    """A request waiting for a slot."""
+    
+    def __init__(self, request: RequestPriority, future: asyncio.Future, sequence: int):
+        self.request = request
+        self.future = future
+        self.sequence = sequence
+        self.enqueued_at = time.monotonic()
+    
+    @property
+    def priority(self) -> str:
+        """The request's current priority class (it may be promoted while waiting)."""
+        return self.request.level
+
+class PrioritySlots:
+    """
+    A provider's in-flight request slots, handed out by priority.
+    
+    Works like a semaphore of ``limit`` slots, except that when the provider
+    is at its limit, a freed slot goes to the waiting primary request before
+    any secondary one, so another user's comparison column never holds back
+    the answer someone is waiting for. A secondary that has waited
+    ``aging`` seconds competes as a primary (oldest first), so secondaries
+    are deferred but not starved; one still waiting after ``max_secondary_wait``
+    seconds is shed with ``ProviderBusy``. A waiting secondary whose
+    ``RequestPriority`` is promoted is served, and kept, as a primary.
+    """
+    
+    def __init__(self, limit: int, aging: Optional[float] = 2.0, max_secondary_wait: Optional[float] = None):
+        """
+        Create the slots.
+        
+        Args:
+            limit: Number of requests allowed in flight at once
+            aging: Seconds after which a waiting secondary counts as a primary (None never promotes)
+            max_secondary_wait: Seconds a secondary may wait before it is shed (None never sheds)
+        """
+        self.limit = limit
+        self.aging = aging
+        self.max_secondary_wait = max_secondary_wait
+        self.in_flight = 0
+        self.shed = 0
+        self._waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+    
+    def queued(self, priority: str) -> int:
+        """Return the number of requests of a priority class waiting for a slot."""
+        return sum(1 for waiter in self._waiters if waiter.priority == priority)
+    
+    def _rank(self, waiter: _Waiter, now: float):
+        """Order of service: primaries and aged secondaries, then other secondaries, each oldest first."""
+        deferred = (
+            waiter.priority == SECONDARY
+            and (self.aging is None or now - waiter.enqueued_at < self.aging)
+        )
+        return (deferred, waiter.enqueued_at, waiter.sequence)
+    
+    async def acquire(self, priority: Union[str, RequestPriority] = PRIMARY) -> None:
+        """
+        Take a slot, waiting by priority while the provider is at its limit.
+        
+        Args:
+            priority: PRIMARY or SECONDARY, or a ``RequestPriority`` that may be
+                promoted while the request waits
+        
+        Raises:
+            ProviderBusy: If a secondary waited longer than ``max_secondary_wait``
+        """
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        
+        request = priority if isinstance(priority, RequestPriority) else RequestPriority(priority)
+        waiter = _Waiter(request, asyncio.get_running_loop().create_future(), next(self._sequence))
+        self._waiters.append(waiter)
+        timeout = self.max_secondary_wait if waiter.priority == SECONDARY else None
+        try:
+            while True:
+                try:
+                    # Shielded so a timeout leaves the wait in place for a promoted request
+                    await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+                    return
+                except asyncio.TimeoutError:
+                    if waiter.priority == SECONDARY:
+                        raise
+                    # Promoted to primary while waiting: primaries are never shed
+                    timeout = None
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was handed over just as the wait ended; pass it on
+                self.release()
+            else:
+                waiter.future.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed += 1
+                raise ProviderBusy(f"shed after waiting {timeout:g}s for a free slot") from None
+            raise
+    
+    def release(self) -> None:
+        """Free a slot, handing it straight to the next waiter in priority order."""
+        now = time.monotonic()
+        while self._waiters:
+            waiter = min(self._waiters, key=lambda waiter: self._rank(waiter, now))
+            self._waiters.remove(waiter)
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+                return
+        self.in_flight -= 1
+
+_executors: Dict[str, BoundedExecutor] = {}
+_slots: Dict[str, PrioritySlots] = {}
+
+def get_executor(provider: str) -> BoundedExecutor:
+    """Return the provider's dedicated executor, sized from its ``executor_workers``."""
+    if provider not in _executors:
+        _executors[provider] = BoundedExecutor(
+            max_workers=config.llms[provider].executor_workers,
+            thread_name_prefix=f"{provider}-worker"
+        )
+    return _executors[provider]
+
+def get_slots(provider: str) -> PrioritySlots:
+    """Return the provider's request slots, sized from its ``max_concurrency``."""
+    if provider not in _slots:
+        _slots[provider] = PrioritySlots(
+            config.llms[provider].max_concurrency,
+            aging=config.priority_aging,
+            max_secondary_wait=config.secondary_max_wait or None
+        )
+    return _slots[provider]
+
+@asynccontextmanager
+async def provider_slot(provider: str) -> AsyncIterator[None]:
+    """
+    Hold one of the provider's in-flight request slots.
+    
+    Each provider has its own slots sized from ``max_concurrency``, so
+    Gemini requests can be capped independently of OpenAI ones. Callers wait
+    here when the provider is at its limit, primary requests ahead of
+    secondary ones (see ``request_priority`` and ``PrioritySlots``).
+    
+    Raises:
+        ProviderBusy: If a secondary request was shed instead of waiting longer
+    """
+    slots = get_slots(provider)
+    request = current_priority()
+    started = time.perf_counter()
+    try:
+        await slots.acquire(request)
+    except ProviderBusy:
+        shed_requests.inc(provider)
+        raise
+    finally:
+        queue_wait.observe(time.perf_counter() - started, provider, request.level)
+    
+    try:
+        yield
+    finally:
+        slots.release()
+
+def concurrency_stats() -> Dict[str, Dict[str, int]]:
+    """Return in-flight counts and executor queue depths per provider."""
+    stats: Dict[str, Dict[str, int]] = {}
+    for provider, llm in config.llms.items():
+        slots = _slots.get(provider)
+        stats[provider] = {
+            "in_flight": slots.in_flight if slots else 0,
+            "max_concurrency": llm.max_concurrency,
+            "queued_primary": slots.queued(PRIMARY) if slots else 0,
+            "queued_secondary": slots.queued(SECONDARY) if slots else 0,
+            "shed": slots.shed if slots else 0
+        }
+        if provider in _executors:
+            stats[provider]["executor"] = _executors[provider].stats()
+    return stats
+
+queue_wait = metrics.register(Histogram(
+    "llm_queue_wait_seconds",
+    "Time requests waited for a free provider slot, by priority class (primary, secondary).",
+    ("provider", "priority"),
+    buckets=QUEUE_WAIT_BUCKETS
+))
+shed_requests = metrics.register(Counter(
+    "llm_shed_requests_total",
+    "Secondary requests dropped because the provider stayed at its concurrency limit.",
+    ("provider",)
+))
+metrics.register(Gauge(
+    "llm_requests_queued",
+    "Requests waiting for a free provider slot, by priority class.",
+    ("provider", "priority"),
+    collect=lambda: {
+        (provider, priority): slots.queued(priority)
+        for provider, slots in _slots.items()
+        for priority in PRIORITIES
+    }
+))
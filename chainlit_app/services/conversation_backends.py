@@ -0,0 +1,196 @@
+"""
+Persistent backends for the conversation store, so conversations survive
+restarts and can be shared by several app workers.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import config
+
+# Expired rows are purged from SQLite once every this many batches
+PURGE_INTERVAL = 100
+
+class ConversationBackend:
+    """
+    Storage behind ``ConversationStore``.
+    
+    The base backend persists nothing: conversations live only in the
+    process's store, as they always have. Persistent backends store one JSON
+    snapshot per conversation (see ``Conversation.snapshot``) and receive the
+    store's writes in batches.
+    """
+    
+    # Whether snapshots outlive the process (and may be written by other workers)
+    persistent = False
+    
+    async def load(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored snapshot of a conversation, or None."""
+        return None
+    
+    async def save_many(self, snapshots: Dict[str, Dict[str, Any]]) -> None:
+        """Store a batch of snapshots, keyed by conversation ID."""
+    
+    async def delete(self, conversation_id: str) -> None:
+        """Remove a stored conversation."""
+    
+    async def close(self) -> None:
+        """Release the backend's connections."""
+
+class MemoryBackend(ConversationBackend):
+    """Keeps conversations in process memory only (the default)."""
+
+class SQLiteBackend(ConversationBackend):
+    """
+    Stores snapshots in a SQLite file.
+    
+    Suits a restart-safe single host; several workers on the same host can
+    share the file. Queries run in the default executor, and each batch is
+    written in one transaction.
+    """
+    
+    persistent = True
+    
+    def __init__(self, path: str, retention: Optional[float] = None):
+        """
+        Open (or create) the database.
+        
+        Args:
+            path: SQLite file
+            retention: Seconds a conversation is kept after its last write (None keeps it forever)
+        """
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._batches = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL)"
+        )
+        self._db.commit()
+    
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.retention if self.retention else None
+    
+    async def load(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored snapshot of a conversation, or None."""
+        loop = asyncio.get_running_loop()
+        row = await loop.run_in_executor(None, self._load, conversation_id)
+        return json.loads(row[0]) if row else None
+    
+    def _load(self, conversation_id: str) -> Optional[tuple]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT data FROM conversations WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (conversation_id, time.time())
+            ).fetchone()
+    
+    async def save_many(self, snapshots: Dict[str, Dict[str, Any]]) -> None:
+        """Store a batch of snapshots in one transaction."""
+        expires_at = self._expires_at()
+        rows = [
+            (conversation_id, json.dumps(snapshot, ensure_ascii=False), expires_at)
+            for conversation_id, snapshot in snapshots.items()
+        ]
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._save_many, rows)
+    
+    def _save_many(self, rows: list) -> None:
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO conversations (id, data, expires_at) VALUES (?, ?, ?)",
+                rows
+            )
+            self._batches += 1
+            if self._batches % PURGE_INTERVAL == 0:
+                self._db.execute("DELETE FROM conversations WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+    
+    async def delete(self, conversation_id: str) -> None:
+        """Remove a stored conversation."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._delete, conversation_id)
+    
+    def _delete(self, conversation_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+            self._db.commit()
+    
+    async def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._db.close()
+
+class RedisBackend(ConversationBackend):
+    """
+    Stores snapshots in Redis (or any server speaking the Redis protocol).
+    
+    Lets any number of workers on any host serve the same conversations
+    without sticky sessions. Each batch is sent as one pipelined round trip;
+    retention is enforced with key expiry.
+    """
+    
+    persistent = True
+    
+    def __init__(self, url: str, retention: Optional[float] = None, prefix: str = "conversation:"):
+        """
+        Connect lazily to the server.
+        
+        Args:
+            url: Redis URL, e.g. ``redis://localhost:6379/0``
+            retention: Seconds a conversation is kept after its last write (None keeps it forever)
+            prefix: Key prefix for the snapshots
+        """
+        import redis.asyncio as redis
+        
+        self.retention = retention
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+    
+    async def load(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored snapshot of a conversation, or None."""
+        data = await self._client.get(self.prefix + conversation_id)
+        return json.loads(data) if data else None
+    
+    async def save_many(self, snapshots: Dict[str, Dict[str, Any]]) -> None:
+        """Store a batch of snapshots in one pipelined round trip."""
+        expire = int(self.retention) if self.retention else None
+        async with self._client.pipeline(transaction=False) as pipe:
+            for conversation_id, snapshot in snapshots.items():
+                pipe.set(self.prefix + conversation_id, json.dumps(snapshot, ensure_ascii=False), ex=expire)
+            await pipe.execute()
+    
+    async def delete(self, conversation_id: str) -> None:
+        """Remove a stored conversation."""
+        await self._client.delete(self.prefix + conversation_id)
+    
+    async def close(self) -> None:
+        """Close the connection pool."""
+        await self._client.aclose()
+
+def create_backend(name: Optional[str] = None) -> ConversationBackend:
+    """
+    Create the configured conversation backend.
+    
+    Args:
+        name: "memory", "sqlite" or "redis" (defaults to ``config.conversation_backend``)
+    
+    Returns:
+        The backend
+    """
+    name = (name or config.conversation_backend).lower()
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend(config.conversation_db_path, config.conversation_retention)
+    if name == "redis":
+        return RedisBackend(config.conversation_redis_url, config.conversation_retention)
+    raise ValueError(f"Unknown conversation backend '{name}' (expected memory, sqlite or redis)")
@@ -0,0 +1,414 @@
+"""
+Bounded, evicting in-memory store for conversation histories and settings,
+optionally backed by a persistent, shared backend.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .tokens import count_tokens
+from .history_buffers import PROVIDER_FORMATS, HistoryBuffers, format_message
+from .conversation_backends import ConversationBackend, MemoryBackend
+
+logger = logging.getLogger(__name__)
+
+# Settings every new conversation starts with
+DEFAULT_SETTINGS = {
+    "show_all_models": True,
+    "primary_model": "ChatGPT"
+}
+
+# Prefix for the rolling summary when it is sent ahead of the recent window
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+def _message_size(message: Dict[str, str]) -> int:
+    """Approximate the memory held by one history entry (UTF-8 bytes of its text)."""
+    return len(message["content"].encode("utf-8")) + len(message["role"])
+
+class Conversation:
+    """
+    History and settings for a single conversation.
+    
+    The history is kept in append-only buffers, one per provider message
+    format, so each turn is formatted once rather than on every request.
+    ``history`` is the OpenAI-format view. Its size is capped: once
+    ``max_bytes`` is exceeded the oldest messages are dropped.
+    
+    Each message's token count is computed once on append. Older turns can be
+    folded into a rolling ``summary``; ``window()`` then returns the summary
+    plus as many recent messages as fit in a provider's token budget, already
+    in that provider's format.
+    
+    Every change bumps ``revision`` and calls ``on_change`` (set by the store,
+    which uses it to schedule a write to its backend).
+    """
+    
+    def __init__(self,
+                 conversation_id: str,
+                 settings: Optional[Dict[str, Any]] = None,
+                 max_bytes: Optional[int] = None):
+        """Create an empty conversation."""
+        self.id = conversation_id
+        self.buffers = HistoryBuffers()
+        self.settings: Dict[str, Any] = dict(settings or DEFAULT_SETTINGS)
+        self.max_bytes = max_bytes
+        self.bytes_held = 0
+        self.last_access = time.monotonic()
+        
+        # Cached token count for each history entry
+        self.token_counts: Deque[int] = deque()
+        
+        # Rolling summary of history entries that have been folded away. Positions
+        # are absolute (they count messages trimmed by the size cap) so that a
+        # summary computed in the background stays valid if trimming happens meanwhile.
+        self.summary = ""
+        self.summary_tokens = 0
+        self._summary_messages: Dict[str, Dict[str, Any]] = {}
+        self.summarized_upto = 0
+        self.trimmed = 0
+        self.summarizing = False
+        
+        self.revision = 0
+        self.on_change: Optional[Callable[["Conversation"], None]] = None
+    
+    @property
+    def history(self) -> Deque[Dict[str, str]]:
+        """The full retained history in the OpenAI format (do not mutate it)."""
+        return self.buffers.for_provider("openai")
+    
+    def _changed(self) -> None:
+        """Record a change for the store."""
+        self.revision += 1
+        if self.on_change is not None:
+            self.on_change(self)
+    
+    def append(self, role: str, content: str) -> None:
+        """Add a message, trimming the oldest history if the size cap is exceeded."""
+        self._add(role, content)
+        self._changed()
+    
+    def _add(self, role: str, content: str) -> None:
+        """Add a message without recording a change."""
+        self.buffers.append(role, content)
+        self.token_counts.append(count_tokens(content))
+        self.bytes_held += _message_size(self.history[-1])
+        
+        if self.max_bytes is not None:
+            # Always keep the newest message, even if it alone exceeds the cap
+            while self.bytes_held > self.max_bytes and len(self.buffers) > 1:
+                self.bytes_held -= _message_size(self.history[0])
+                self.buffers.pop_oldest()
+                self.token_counts.popleft()
+                self.trimmed += 1
+    
+    def _first_unsummarized(self) -> int:
+        """Index into ``history`` of the first message not covered by the summary."""
+        return max(0, self.summarized_upto - self.trimmed)
+    
+    def window(self, budget: int, provider: str = "openai") -> List[Dict[str, Any]]:
+        """
+        Return the history to send within a token budget.
+        
+        The rolling summary (if any) comes first as a system message, followed
+        by the newest unsummarized messages that still fit. The window never
+        opens on an assistant reply.
+        
+        Args:
+            budget: Tokens available for history (excluding system prompt and new message)
+            provider: Provider whose message format to return
+            
+        Returns:
+            List of messages in the provider's format
+        """
+        used = 0
+        prefix = []
+        if self.summary and self.summary_tokens <= budget:
+            used = self.summary_tokens
+            prefix = [self._summary_messages[PROVIDER_FORMATS[provider]]]
+        
+        start = len(self.history)
+        for i in range(len(self.history) - 1, self._first_unsummarized() - 1, -1):
+            if used + self.token_counts[i] > budget:
+                break
+            used += self.token_counts[i]
+            start = i
+        
+        while start < len(self.history) and self.history[start]["role"] != "user":
+            start += 1
+        
+        return prefix + self.buffers.since(provider, start)
+    
+    def unsummarized_tokens(self) -> int:
+        """Tokens held by messages not yet folded into the summary."""
+        return sum(islice(self.token_counts, self._first_unsummarized(), None))
+    
+    def messages_to_summarize(self, keep_tokens: int) -> Tuple[int, List[Dict[str, str]]]:
+        """
+        Pick the oldest unsummarized messages to fold into the summary.
+        
+        Enough messages are picked that at most ``keep_tokens`` of unsummarized
+        history remain, stopping on a turn boundary so that the recent window
+        starts with a user message.
+        
+        Returns:
+            The absolute position the summary will cover up to, and the messages to fold
+        """
+        first = self._first_unsummarized()
+        remaining = self.unsummarized_tokens()
+        end = first
+        while end < len(self.history) and remaining > keep_tokens:
+            remaining -= self.token_counts[end]
+            end += 1
+        while end < len(self.history) and self.history[end]["role"] != "user":
+            end += 1
+        
+        return end + self.trimmed, list(islice(self.history, first, end))
+    
+    def apply_summary(self, summary: str, upto: int) -> None:
+        """Install a new rolling summary covering history up to absolute position ``upto``."""
+        self.bytes_held += len(summary.encode("utf-8")) - len(self.summary.encode("utf-8"))
+        self.summary = summary
+        self.summary_tokens = count_tokens(SUMMARY_PREFIX + summary)
+        self._summary_messages = {
+            fmt: format_message(fmt, "system", SUMMARY_PREFIX + summary)
+            for fmt in set(PROVIDER_FORMATS.values())
+        }
+        self.summarized_upto = max(self.summarized_upto, upto)
+        self._changed()
+    
+    def update_settings(self, settings: Dict[str, Any]) -> None:
+        """Merge new settings into the conversation's settings."""
+        self.settings.update(settings)
+        self._changed()
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the conversation's persistent state as a JSON-serializable dict."""
+        return {
+            "revision": self.revision,
+            "settings": self.settings,
+            "messages": [{"role": m["role"], "content": m["content"]} for m in self.history],
+            "summary": self.summary,
+            "summarized_upto": self.summarized_upto,
+            "trimmed": self.trimmed
+        }
+    
+    def restore(self, snapshot: Dict[str, Any]) -> None:
+        """Load the state saved by ``snapshot`` into this (empty) conversation."""
+        self.settings = dict(snapshot.get("settings") or DEFAULT_SETTINGS)
+        for message in snapshot.get("messages", []):
+            self._add(message["role"], message["content"])
+        self.trimmed += snapshot.get("trimmed", 0)
+        if snapshot.get("summary"):
+            # apply_summary counts as a change; the revision is set below
+            self.apply_summary(snapshot["summary"], snapshot.get("summarized_upto", 0))
+        self.revision = snapshot.get("revision", 0)
+    
+    def touch(self) -> None:
+        """Mark the conversation as recently used."""
+        self.last_access = time.monotonic()
+
+class ConversationStore:
+    """
+    LRU + TTL store of live conversations.
+    
+    Conversations idle for longer than ``ttl`` seconds are evicted, and once
+    ``max_conversations`` is reached the least recently used one is evicted to
+    make room. Expired entries are swept lazily on access; because entries are
+    kept in recency order the sweep only ever looks at expired items.
+    
+    With a persistent backend the store is a write-behind cache in front of
+    it: changed conversations are collected and written in one batch every
+    ``flush_interval`` seconds, and ``load`` reads a conversation back after a
+    restart, after eviction, or when another worker has changed it since.
+    """
+    
+    def __init__(self,
+                 ttl: Optional[float] = 3600,
+                 max_conversations: Optional[int] = None,
+                 max_bytes_per_conversation: Optional[int] = None,
+                 backend: Optional[ConversationBackend] = None,
+                 flush_interval: float = 1.0):
+        """
+        Initialize the store.
+        
+        Args:
+            ttl: Idle seconds after which a conversation is evicted (None disables)
+            max_conversations: Maximum number of live conversations (None for unbounded)
+            max_bytes_per_conversation: History size cap applied to each conversation
+            backend: Where conversations are persisted (defaults to process memory only)
+            flush_interval: Seconds changes are batched before being written to the backend
+        """
+        self.ttl = ttl
+        self.max_conversations = max_conversations
+        self.max_bytes_per_conversation = max_bytes_per_conversation
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self.evictions = 0
+        
+        self.backend = backend or MemoryBackend()
+        self.flush_interval = flush_interval
+        # Changed conversations awaiting a write, kept even if evicted meanwhile
+        self._dirty: Dict[str, Conversation] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self.batches_written = 0
+        self.write_errors = 0
+    
+    def create(self,
+               conversation_id: str,
+               settings: Optional[Dict[str, Any]] = None,
+               snapshot: Optional[Dict[str, Any]] = None) -> Conversation:
+        """Create (or reset) a conversation, optionally from a stored snapshot, and return it."""
+        self.evict_expired()
+        self._conversations.pop(conversation_id, None)
+        
+        if self.max_conversations is not None:
+            while len(self._conversations) >= self.max_conversations:
+                self._conversations.popitem(last=False)
+                self.evictions += 1
+        
+        conversation = Conversation(
+            conversation_id,
+            settings=settings,
+            max_bytes=self.max_bytes_per_conversation
+        )
+        if snapshot is not None:
+            conversation.restore(snapshot)
+        conversation.on_change = self._mark_dirty
+        self._conversations[conversation_id] = conversation
+        return conversation
+    
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        """Return a live conversation and mark it as recently used, or None."""
+        self.evict_expired()
+        conversation = self._conversations.get(conversation_id)
+        if conversation is not None:
+            conversation.touch()
+            self._conversations.move_to_end(conversation_id)
+        return conversation
+    
+    def get_or_create(self, conversation_id: str) -> Conversation:
+        """Return a live conversation, creating an empty one if it was evicted."""
+        conversation = self.get(conversation_id)
+        if conversation is None:
+            conversation = self.create(conversation_id)
+        return conversation
+    
+    def delete(self, conversation_id: str) -> None:
+        """Drop a conversation from memory, e.g. when its chat ends."""
+        self._conversations.pop(conversation_id, None)
+    
+    async def load(self, conversation_id: str) -> Conversation:
+        """
+        Return a conversation, reading it from the backend when needed.
+        
+        With a persistent backend the stored snapshot is checked on every call,
+        so a conversation changed by another worker is picked up; unsaved
+        local changes are never overwritten by an older snapshot.
+        """
+        conversation = self.get(conversation_id)
+        if not self.backend.persistent:
+            return conversation or self.create(conversation_id)
+        
+        try:
+            snapshot = await self.backend.load(conversation_id)
+        except Exception as e:
+            logger.warning(f"Could not load conversation {conversation_id}: {e}")
+            snapshot = None
+        
+        if snapshot is not None and (conversation is None or snapshot.get("revision", 0) > conversation.revision):
+            # The stored copy is newer, so any pending write of ours is stale
+            self._dirty.pop(conversation_id, None)
+            return self.create(conversation_id, snapshot=snapshot)
+        return conversation or self.create(conversation_id)
+    
+    async def release(self, conversation_id: str) -> None:
+        """Write a conversation's pending changes and drop it from memory, e.g. when its chat ends."""
+        if conversation_id in self._dirty:
+            await self.flush()
+        self.delete(conversation_id)
+    
+    def _mark_dirty(self, conversation: Conversation) -> None:
+        """Queue a changed conversation for the next batched write."""
+        if not self.backend.persistent:
+            return
+        self._dirty[conversation.id] = conversation
+        self._schedule_flush()
+    
+    def _schedule_flush(self) -> None:
+        """Start the flush timer unless it is already running."""
+        if self._flusher is not None and not self._flusher.done():
+            return
+        try:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_later())
+        except RuntimeError:
+            # No event loop (e.g. offline tooling); written by the next flush()
+            pass
+    
+    async def _flush_later(self) -> None:
+        """Write the queued changes after the flush interval."""
+        await asyncio.sleep(self.flush_interval)
+        self._flusher = None
+        await self.flush()
+    
+    async def flush(self) -> None:
+        """Write every queued change to the backend in one batch."""
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        snapshots = {conversation_id: c.snapshot() for conversation_id, c in batch.items()}
+        try:
+            await self.backend.save_many(snapshots)
+            self.batches_written += 1
+        except Exception as e:
+            self.write_errors += 1
+            logger.warning(f"Could not write {len(snapshots)} conversations: {e}")
+            # Retry with the next batch, unless they have been queued again since
+            for conversation_id, conversation in batch.items():
+                self._dirty.setdefault(conversation_id, conversation)
+            self._schedule_flush()
+    
+    async def close(self) -> None:
+        """Write pending changes and close the backend."""
+        if self._flusher is not None and not self._flusher.done():
+            self._flusher.cancel()
+        await self.flush()
+        await self.backend.close()
+    
+    def evict_expired(self) -> int:
+        """Evict conversations idle for longer than the TTL and return how many."""
+        if self.ttl is None:
+            return 0
+        
+        cutoff = time.monotonic() - self.ttl
+        evicted = 0
+        while self._conversations:
+            oldest = next(iter(self._conversations.values()))
+            if oldest.last_access > cutoff:
+                break
+            self._conversations.popitem(last=False)
+            evicted += 1
+        
+        self.evictions += evicted
+        return evicted
+    
+    def __len__(self) -> int:
+        return len(self._conversations)
+    
+    @property
+    def bytes_held(self) -> int:
+        """Approximate bytes of history held across all live conversations."""
+        return sum(c.bytes_held for c in self._conversations.values())
+    
+    def stats(self) -> Dict[str, int]:
+        """Return counters describing the store's current footprint."""
+        return {
+            "live_conversations": len(self._conversations),
+            "bytes_held": self.bytes_held,
+            "evictions": self.evictions,
+            "pending_writes": len(self._dirty),
+            "batches_written": self.batches_written,
+            "write_errors": self.write_errors
+        }
@@ -0,0 +1,109 @@
+"""
+Deadlines, hedged requests and cancellation for provider calls.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+from .streaming import TokenCallback
+
+# Starts one provider attempt; receives the token callback the attempt must stream into
+AttemptFactory = Callable[[Optional[TokenCallback]], Awaitable[str]]
+
+async def call_with_deadline(make_attempt: AttemptFactory,
+                             on_token: Optional[TokenCallback] = None,
+                             timeout: Optional[float] = None,
+                             hedge_after: Optional[float] = None) -> str:
+    """
+    Run a provider call under a deadline, optionally hedging it with a duplicate.
+    
+    If ``hedge_after`` seconds pass without the first attempt producing a token
+    or finishing, a second identical attempt is started (at once if the first
+    attempt fails sooner). Whichever attempt streams first (or succeeds first)
+    wins: only its tokens reach ``on_token`` and the other attempt is cancelled
+    straight away. An attempt that fails without streaming never wins, so the
+    other one can still answer. All attempts still running when the deadline
+    expires or the caller is cancelled are cancelled too.
+    
+    Args:
+        make_attempt: Callable that starts one attempt and returns its full text
+        on_token: Optional async callback for the winning attempt's tokens
+        timeout: Overall deadline in seconds, or None for no deadline
+        hedge_after: Delay in seconds before the hedge is fired, or None to disable
+        
+    Returns:
+        The winning attempt's response text
+        
+    Raises:
+        asyncio.TimeoutError: If no attempt finished before the deadline
+        Exception: The error of the winning attempt if it failed after
+            streaming, or of the first attempt once every attempt has failed
+    """
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    attempts: List[asyncio.Task] = []
+    winner: Optional[int] = None
+    
+    def claim(index: int) -> bool:
+        """Make ``index`` the winning attempt if nobody has won yet."""
+        nonlocal winner
+        if winner is None:
+            winner = index
+            for other, task in enumerate(attempts):
+                if other != index:
+                    task.cancel()
+        return winner == index
+    
+    def gated(index: int) -> TokenCallback:
+        async def forward(token: str):
+            if claim(index) and on_token:
+                await on_token(token)
+        return forward
+    
+    def remaining() -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - loop.time())
+    
+    attempts.append(asyncio.create_task(make_attempt(gated(0))))
+    
+    def failed(task: asyncio.Task) -> bool:
+        return task.done() and not task.cancelled() and task.exception() is not None
+    
+    try:
+        if hedge_after is not None and (timeout is None or hedge_after < timeout):
+            await asyncio.wait(attempts, timeout=hedge_after)
+            if winner is None and (not attempts[0].done() or failed(attempts[0])):
+                attempts.append(asyncio.create_task(make_attempt(gated(1))))
+        
+        errors: List[BaseException] = []
+        pending = set(attempts)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=remaining(),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                raise asyncio.TimeoutError()
+            
+            for task in sorted(done, key=attempts.index):
+                if task.cancelled():
+                    continue
+                index = attempts.index(task)
+                if not failed(task):
+                    if claim(index):
+                        return task.result()
+                elif winner == index:
+                    # Its tokens already reached the caller, so no other attempt can take over
+                    raise task.exception()
+                else:
+                    errors.append(task.exception())
+        
+        if errors:
+            # Every attempt failed
+            raise errors[0]
+        
+        # Every attempt was cancelled from outside before producing a result
+        raise asyncio.CancelledError()
+    finally:
+        for task in attempts:
+            task.cancel()
@@ -0,0 +1,154 @@
+"""
+In-memory index of prebuilt answers to frequently asked questions.
+"""
+
+import json
+import logging
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import config
+from .response_cache import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+def tokenize(text: str) -> List[str]:
+    """Split normalized text into word unigrams and bigrams."""
+    words = re.findall(r"[a-z0-9']+", normalize_prompt(text))
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+class FAQIndex:
+    """
+    Looks up the prebuilt answer closest to a user question.
+    
+    An exact match on the normalized question is found through a dict;
+    otherwise questions are compared by cosine similarity of TF-IDF vectors
+    (unigrams and bigrams), held as one L2-normalized NumPy matrix so a lookup
+    is a single matrix-vector product.
+    
+    Query terms missing from the indexed questions still count towards the
+    query's norm, weighted like the rarest indexed term, so a qualifier the
+    prebuilt answers never considered ("pregnant", "in men") lowers the
+    similarity instead of being ignored.
+    """
+    
+    def __init__(self, entries: List[Dict[str, Any]]):
+        """
+        Build the index.
+        
+        Args:
+            entries: Dicts with at least "question" and "answer"
+        """
+        import numpy as np
+        
+        self.entries = entries
+        self._exact = {normalize_prompt(entry["question"]): index for index, entry in enumerate(entries)}
+        
+        documents = [Counter(tokenize(entry["question"])) for entry in entries]
+        self.vocabulary: Dict[str, int] = {}
+        for document in documents:
+            for term in document:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+        
+        # Smoothed inverse document frequency, as in scikit-learn
+        document_frequency = np.zeros(len(self.vocabulary))
+        for document in documents:
+            for term in document:
+                document_frequency[self.vocabulary[term]] += 1
+        self.idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+        # Weight of a term no indexed question contains (document frequency 0)
+        self.unknown_idf = np.log(1 + len(documents)) + 1
+        
+        self.matrix = np.zeros((len(documents), len(self.vocabulary)))
+        for row, document in enumerate(documents):
+            for term, count in document.items():
+                self.matrix[row, self.vocabulary[term]] = count
+        self.matrix *= self.idf
+        norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        self.matrix /= np.where(norms == 0, 1, norms)
+    
+    def __len__(self) -> int:
+        """Number of indexed questions."""
+        return len(self.entries)
+    
+    def _vector(self, text: str):
+        """TF-IDF vector of a question over the index vocabulary, normalized over all its terms."""
+        import numpy as np
+        
+        vector = np.zeros(len(self.vocabulary))
+        unknown = 0.0
+        for term, count in Counter(tokenize(text)).items():
+            column = self.vocabulary.get(term)
+            if column is not None:
+                vector[column] = count
+            else:
+                unknown += (count * self.unknown_idf) ** 2
+        vector *= self.idf
+        # Terms outside the vocabulary have no column but still dilute the match
+        norm = np.sqrt(np.dot(vector, vector) + unknown)
+        return vector / norm if norm else vector
+    
+    def search(self, question: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Find the closest indexed question.
+        
+        Returns:
+            The matching entry and its similarity (1.0 for an exact match), or None
+        """
+        if not self.entries:
+            return None
+        
+        index = self._exact.get(normalize_prompt(question))
+        if index is not None:
+            return self.entries[index], 1.0
+        
+        scores = self.matrix @ self._vector(question)
+        best = int(scores.argmax())
+        return self.entries[best], float(scores[best])
+    
+    def lookup(self, question: str, threshold: float) -> Optional[Dict[str, Any]]:
+        """Return the entry matching ``question`` with at least ``threshold`` similarity."""
+        match = self.search(question)
+        if match and match[1] >= threshold:
+            return match[0]
+        return None
+
+def load_entries(path: str, require_vetted: bool = True) -> List[Dict[str, Any]]:
+    """
+    Read built answers from ``path``.
+    
+    Args:
+        path: JSON file written by ``python -m faq.build``
+        require_vetted: Skip answers nobody has marked as vetted yet
+    
+    Returns:
+        The usable entries (empty if the file does not exist)
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    return [
+        entry for entry in entries
+        if entry.get("answer") and (entry.get("vetted") or not require_vetted)
+    ]
+
+_shared_index: Optional[FAQIndex] = None
+_loaded = False
+
+def get_faq_index() -> Optional[FAQIndex]:
+    """Return the process-wide FAQ index, or None if it is disabled or has no answers."""
+    global _shared_index, _loaded
+    
+    if not config.faq_enabled:
+        return None
+    
+    if not _loaded:
+        _loaded = True
+        entries = load_entries(config.faq_path, config.faq_require_vetted)
+        if entries:
+            _shared_index = FAQIndex(entries)
+        logger.info(f"Loaded {len(entries)} prebuilt answers from {config.faq_path}")
+    return _shared_index
@@ -0,0 +1,82 @@
+"""
+Append-only, ready-to-send history buffers in each provider's message format.
+"""
+
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, List
+
+# Message format used by each provider (Grok speaks the OpenAI format)
+PROVIDER_FORMATS = {
+    "openai": "openai",
+    "gemini": "gemini",
+    "grok": "openai"
+}
+
+def format_message(fmt: str, role: str, content: str) -> Dict[str, Any]:
+    """
+    Format one message for a provider message format.
+    
+    Args:
+        fmt: "openai" or "gemini"
+        role: "user", "assistant" or "system"
+        content: The message text
+        
+    Returns:
+        The message in the requested format
+    """
+    if fmt == "gemini":
+        # Gemini only knows "user" and "model" turns
+        return {
+            "role": "user" if role == "user" else "model",
+            "parts": [{"text": content}]
+        }
+    return {"role": role, "content": content}
+
+class HistoryBuffers:
+    """
+    One conversation history kept in every provider format at once.
+    
+    Each message is formatted exactly once, when it is appended, so building a
+    request never re-converts earlier turns. Providers sharing a format share
+    the same buffer (and the same message objects). Buffers are deques, so
+    trimming the oldest message is O(1).
+    """
+    
+    def __init__(self):
+        """Create empty buffers."""
+        self._by_format: Dict[str, Deque[Dict[str, Any]]] = {
+            fmt: deque() for fmt in set(PROVIDER_FORMATS.values())
+        }
+        
+        # How far into a caller's source list the buffers have been filled, for
+        # incremental builders whose source contains messages they skip
+        self.source_position = 0
+    
+    def append(self, role: str, content: str) -> None:
+        """Add a message to every buffer."""
+        for fmt, buffer in self._by_format.items():
+            buffer.append(format_message(fmt, role, content))
+    
+    def pop_oldest(self) -> None:
+        """Drop the oldest message from every buffer."""
+        for buffer in self._by_format.values():
+            buffer.popleft()
+    
+    def for_provider(self, provider: str) -> Deque[Dict[str, Any]]:
+        """Return the ready-to-send buffer for a provider (do not mutate it)."""
+        return self._by_format[PROVIDER_FORMATS[provider]]
+    
+    def since(self, provider: str, start: int = 0) -> List[Dict[str, Any]]:
+        """
+        Return a provider's messages from position ``start`` on, as a new list.
+        
+        Walks back from the newest message, so only the returned messages are visited.
+        """
+        buffer = self.for_provider(provider)
+        messages = list(islice(reversed(buffer), max(0, len(buffer) - start)))
+        messages.reverse()
+        return messages
+    
+    def __len__(self) -> int:
+        return len(self._by_format["openai"])
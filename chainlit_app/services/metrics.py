@@ -0,0 +1,383 @@
+"""
+In-process metrics with a Prometheus text exposition.
+"""
+
+import asyncio
+import bisect
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import config
+from .streaming import TokenCallback
+from .tokens import count_message_tokens, count_tokens
+
+# Bucket upper bounds in seconds, from fast cache hits to slow generations
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+# Called after each provider request with (provider, outcome, duration, time to first token or None)
+RequestObserver = Callable[[str, str, float, Optional[float]], None]
+
+# How the request tracked in the current task was served, set by ``mark_served``
+_served: ContextVar[Optional[Dict[str, Optional[str]]]] = ContextVar("served", default=None)
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    """Render a Prometheus label set such as ``{provider="openai"}``."""
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    """Render a sample value without a trailing ``.0`` on whole numbers."""
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+class Metric:
+    """Base class for a named metric with optional labels."""
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        """Create the metric."""
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+    
+    def samples(self) -> List[str]:
+        """Return the metric's sample lines."""
+        raise NotImplementedError
+    
+    def render(self) -> str:
+        """Render the metric in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    """Monotonically increasing count per label set."""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        """Create the counter."""
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+    
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Add ``amount`` to the count for ``labels``."""
+        self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def value(self, *labels: str) -> float:
+        """Current count for ``labels``."""
+        return self._values.get(labels, 0)
+    
+    def samples(self) -> List[str]:
+        """Return one line per label set."""
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+class Gauge(Metric):
+    """
+    Value that can go up and down per label set.
+    
+    A gauge built with ``collect`` reads its values from that callback at
+    render time instead of being set directly.
+    """
+    
+    kind = "gauge"
+    
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labels: Tuple[str, ...] = (),
+                 collect: Optional[Callable[[], Dict[LabelValues, float]]] = None):
+        """Create the gauge."""
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._collect = collect
+    
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Raise the value for ``labels``."""
+        self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        """Lower the value for ``labels``."""
+        self.inc(*labels, amount=-amount)
+    
+    def set(self, value: float, *labels: str) -> None:
+        """Set the value for ``labels``."""
+        self._values[labels] = value
+    
+    def value(self, *labels: str) -> float:
+        """Current value for ``labels``."""
+        if self._collect:
+            return self._collect().get(labels, 0)
+        return self._values.get(labels, 0)
+    
+    def samples(self) -> List[str]:
+        """Return one line per label set."""
+        values = self._collect() if self._collect else self._values
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in sorted(values.items())
+        ]
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets per label set."""
+    
+    kind = "histogram"
+    
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """Create the histogram."""
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket counts (plus +Inf), sum and count
+        self._series: Dict[LabelValues, List[Any]] = {}
+    
+    def observe(self, value: float, *labels: str) -> None:
+        """Record one observation for ``labels``."""
+        series = self._series.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0, 0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+    
+    def count(self, *labels: str) -> int:
+        """Number of observations for ``labels``."""
+        return self._series.get(labels, [None, 0.0, 0])[2]
+    
+    def samples(self) -> List[str]:
+        """Return cumulative bucket, sum and count lines per label set."""
+        lines = []
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket_labels = _format_labels(self.label_names, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """
+    The app's metrics, rendered together for the ``/metrics`` endpoint.
+    
+    Token counts are estimates from ``count_tokens`` (streamed responses don't
+    report usage), consistent with how prompts are budgeted.
+    """
+    
+    def __init__(self):
+        """Create the app's metrics."""
+        self._metrics: List[Metric] = []
+        self._request_observers: List[RequestObserver] = []
+        
+        self.request_duration = self.register(Histogram(
+            "llm_request_duration_seconds",
+            "Provider request latency, from dispatch to the complete response.",
+            ("provider", "outcome")
+        ))
+        self.time_to_first_token = self.register(Histogram(
+            "llm_time_to_first_token_seconds",
+            "Time from dispatch to the first streamed token.",
+            ("provider",)
+        ))
+        self.requests = self.register(Counter(
+            "llm_requests_total",
+            "Provider requests by outcome (success, error, timeout, cancelled, shed, cache_hit, coalesced).",
+            ("provider", "outcome")
+        ))
+        self.prompt_tokens = self.register(Counter(
+            "llm_prompt_tokens_total",
+            "Estimated prompt tokens sent to each provider.",
+            ("provider",)
+        ))
+        self.completion_tokens = self.register(Counter(
+            "llm_completion_tokens_total",
+            "Estimated completion tokens received from each provider.",
+            ("provider",)
+        ))
+        self.requests_in_flight = self.register(Gauge(
+            "llm_requests_in_flight",
+            "Provider requests currently in progress.",
+            ("provider",)
+        ))
+        self.rate_limit_wait = self.register(Histogram(
+            "llm_rate_limit_wait_seconds",
+            "Time requests waited for the provider's request and token budget.",
+            ("provider",)
+        ))
+        self.rate_limit_retries = self.register(Counter(
+            "llm_rate_limit_retries_total",
+            "Requests retried after a rate-limit response.",
+            ("provider",)
+        ))
+        self.coalesced_requests = self.register(Counter(
+            "llm_coalesced_requests_total",
+            "Requests that joined an identical in-flight upstream call instead of making their own.",
+            ("provider",)
+        ))
+        self.fallbacks = self.register(Counter(
+            "chat_primary_fallbacks_total",
+            "Turns answered by a fallback provider because the primary failed or was unavailable.",
+            ("provider",)
+        ))
+        self.faq_answers = self.register(Counter(
+            "chat_faq_answers_total",
+            "Turns answered from the prebuilt FAQ answers instead of the live models."
+        ))
+        self.turn_duration = self.register(Histogram(
+            "chat_turn_duration_seconds",
+            "Time to handle one user message, until every response is final."
+        ))
+        self.turns_in_flight = self.register(Gauge(
+            "chat_turns_in_flight",
+            "User messages currently being handled."
+        ))
+    
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric to the exposition and return it."""
+        self._metrics.append(metric)
+        return metric
+    
+    def observe_requests(self, observer: RequestObserver) -> None:
+        """Also report every tracked request that reached the provider to ``observer``."""
+        self._request_observers.append(observer)
+    
+    def mark_served(self, source: str) -> None:
+        """
+        Record that the request tracked in this task made no upstream call of its own.
+        
+        Args:
+            source: "cache_hit" for a cached response, or "coalesced" for a
+                request that joined an identical one already in flight
+        """
+        served = _served.get()
+        if served is not None:
+            served["source"] = source
+    
+    @contextmanager
+    def served_from(self) -> Iterator[Dict[str, Optional[str]]]:
+        """
+        Collect how the request made inside the block was served.
+        
+        Yields a dict whose "source" ``mark_served`` sets to "cache_hit" or
+        "coalesced", and which stays None when the request reached the
+        provider. A ``track_request`` inside an enclosing block (such as a
+        circuit breaker's) shares that block's dict.
+        """
+        served = _served.get()
+        if served is not None:
+            yield served
+            return
+        served = {"source": None}
+        token = _served.set(served)
+        try:
+            yield served
+        finally:
+            _served.reset(token)
+    
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format."""
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+    
+    @contextmanager
+    def track_turn(self) -> Iterator[None]:
+        """Time one user message and count it as in flight while it is handled."""
+        started = time.perf_counter()
+        self.turns_in_flight.inc()
+        try:
+            yield
+        finally:
+            self.turns_in_flight.dec()
+            self.turn_duration.observe(time.perf_counter() - started)
+    
+    async def track_request(self,
+                            provider: str,
+                            prompt: str,
+                            history: Optional[List[Dict[str, Any]]],
+                            call: Callable[[Optional[TokenCallback]], Awaitable[str]],
+                            on_token: Optional[TokenCallback] = None) -> str:
+        """
+        Run one provider call, recording its latency, first token, tokens and outcome.
+        
+        Requests served from the response cache or by joining an identical
+        request in flight (see ``mark_served``) are counted under the outcome
+        "cache_hit" or "coalesced" and kept out of the latency and token
+        metrics, which only describe calls that reached the provider.
+        
+        Args:
+            provider: Provider key, such as "openai"
+            prompt: The user message sent with the call
+            history: The history sent with the call, in the provider's format
+            call: Makes the call, given the ``on_token`` callback to stream into
+            on_token: Optional async callback invoked with each text delta
+        
+        Returns:
+            The call's response text (failures are re-raised after recording)
+        """
+        started = time.perf_counter()
+        first_token: Optional[float] = None
+        scope = ExitStack()
+        served = scope.enter_context(self.served_from())
+        
+        async def timed_on_token(token: str) -> None:
+            nonlocal first_token
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            if on_token:
+                await on_token(token)
+        
+        self.requests_in_flight.inc(provider)
+        outcome = "error"
+        response = ""
+        try:
+            response = await call(timed_on_token)
+            outcome = "success"
+            return response
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            # Secondary requests shed before reaching the provider aren't its errors
+            from .concurrency import ProviderBusy
+            if isinstance(e, ProviderBusy):
+                outcome = "shed"
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            scope.close()
+            self.requests_in_flight.dec(provider)
+            if served["source"] is not None:
+                # No upstream call of its own: nothing to time or charge, and
+                # nothing the request observers (the router) should learn from
+                self.requests.inc(provider, served["source"])
+            else:
+                self.requests.inc(provider, outcome)
+                self.request_duration.observe(duration, provider, outcome)
+                if first_token is not None:
+                    self.time_to_first_token.observe(first_token, provider)
+                if outcome != "shed":
+                    self.prompt_tokens.inc(
+                        provider,
+                        amount=count_tokens(config.system_prompt) + count_tokens(prompt) + count_message_tokens(history or [])
+                    )
+                if response:
+                    self.completion_tokens.inc(provider, amount=count_tokens(response))
+                for observer in self._request_observers:
+                    observer(provider, outcome, duration, first_token)
+
+# Shared metrics for the whole process
+metrics = MetricsRegistry()
@@ -0,0 +1,149 @@
+"""
+Registry of provider adapters, imported and initialized on first use.
+"""
+
+import importlib
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from config import config
+from .clients import clients
+
+logger = logging.getLogger(__name__)
+
+# Adapter class for each provider in config.llms, as (module, class name)
+ADAPTERS = {
+    "openai": ("models.openai_model", "OpenAIModel"),
+    "gemini": ("models.gemini_model", "GeminiModel"),
+    "grok": ("models.grok_model", "GrokModel")
+}
+
+class ProviderRegistry:
+    """
+    Lazily loads the model wrapper for each enabled provider in ``config.llms``.
+    
+    A provider's module (and through it, its SDK) is imported and its wrapper
+    constructed the first time the provider is used. Providers that are
+    disabled or have no API key are never imported. Time spent importing each
+    wrapper module, importing its SDK and building its client (both done by
+    ``clients`` while the wrapper initializes), and the rest of its
+    initialization is recorded for the startup report.
+    """
+    
+    def __init__(self):
+        """Create an empty registry."""
+        self._adapters: Dict[str, Any] = {}
+        self._overrides: Dict[str, Any] = {}
+        self._by_display_name = {llm.display_name: name for name, llm in config.llms.items()}
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self._warmed = False
+    
+    def is_enabled(self, provider: str) -> bool:
+        """Whether a provider is switched on and has credentials."""
+        if provider in self._overrides:
+            return True
+        llm = config.llms.get(provider)
+        return bool(llm and llm.enabled and llm.api_key and provider in ADAPTERS)
+    
+    def enabled(self) -> List[str]:
+        """Enabled providers, in ``config.llms`` order."""
+        return [name for name in config.llms if self.is_enabled(name)]
+    
+    def provider_for(self, display_name: str) -> Optional[str]:
+        """Return the provider key for a display name such as "ChatGPT"."""
+        return self._by_display_name.get(display_name)
+    
+    def get(self, provider: str) -> Any:
+        """
+        Return the provider's adapter, importing and initializing it on first use.
+        
+        Raises:
+            KeyError: If the provider is unknown or disabled
+        """
+        adapter = self._overrides.get(provider) or self._adapters.get(provider)
+        if adapter is not None:
+            return adapter
+        
+        if not self.is_enabled(provider):
+            raise KeyError(f"Provider '{provider}' is not enabled")
+        
+        module_name, class_name = ADAPTERS[provider]
+        
+        client_built = provider in clients.timings
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        imported = time.perf_counter()
+        adapter = getattr(module, class_name)()
+        initialized = time.perf_counter()
+        
+        # The wrapper imports its SDK and builds its client while it initializes
+        client = {} if client_built else clients.timings.get(provider, {})
+        sdk_import = client.get("sdk_import", 0.0)
+        client_build = client.get("client", 0.0)
+        self.timings[provider] = {
+            "import": imported - started,
+            "sdk_import": sdk_import,
+            "client": client_build,
+            "init": initialized - imported - sdk_import - client_build
+        }
+        self._adapters[provider] = adapter
+        return adapter
+    
+    def override(self, provider: str, adapter: Any) -> None:
+        """
+        Serve ``provider`` from ``adapter`` instead of its model wrapper.
+        
+        Used by benchmarks and load tests to swap in mock providers. The adapter
+        must offer the wrappers' ``complete`` and ``generate_response`` methods.
+        """
+        self._overrides[provider] = adapter
+    
+    def clear_overrides(self) -> None:
+        """Go back to the real model wrappers."""
+        self._overrides.clear()
+    
+    async def warm(self) -> None:
+        """Load every enabled adapter, open its connections and log the startup report.
+        
+        Runs once per process; later calls return immediately.
+        """
+        if self._warmed:
+            return
+        self._warmed = True
+        
+        for provider in self.enabled():
+            try:
+                self.get(provider)
+            except Exception as e:
+                logger.warning(f"Failed to initialize provider '{provider}': {e}")
+        
+        started = time.perf_counter()
+        await clients.warm()
+        self.timings["connections"] = {"warm": time.perf_counter() - started}
+        
+        logger.info(self.startup_report())
+    
+    def startup_report(self) -> str:
+        """Describe time spent importing and initializing each provider so far (SDK imports separately)."""
+        lines = ["Provider startup report:"]
+        for provider in config.llms:
+            if provider not in self.timings:
+                state = "loaded" if provider in self._adapters else (
+                    "not loaded yet" if self.is_enabled(provider) else "disabled, skipped"
+                )
+                lines.append(f"  {provider}: {state}")
+                continue
+            timing = self.timings[provider]
+            lines.append(
+                f"  {provider}: wrapper import {timing['import'] * 1000:.1f} ms, "
+                f"SDK import {timing['sdk_import'] * 1000:.1f} ms, "
+                f"client {timing['client'] * 1000:.1f} ms, "
+                f"init {timing['init'] * 1000:.1f} ms"
+            )
+        if "connections" in self.timings:
+            lines.append(f"  connection warm-up: {self.timings['connections']['warm'] * 1000:.1f} ms")
+        return "\n".join(lines)
+
+# Shared registry for the whole process
+providers = ProviderRegistry()
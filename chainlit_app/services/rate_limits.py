@@ -0,0 +1,166 @@
+"""
+Per-provider request and token rate limits with rate-limit retries.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import config
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Exponential backoff for rate-limited requests without a Retry-After, in seconds
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at ``per_minute`` tokens a minute.
+    
+    Callers that find the bucket short wait in line (first come, first served)
+    until it has refilled enough, instead of failing.
+    """
+    
+    def __init__(self, per_minute: int):
+        """Create a full bucket."""
+        self.capacity = per_minute
+        self.fill_rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self._queue: Optional[asyncio.Lock] = None
+    
+    def _refill(self) -> None:
+        """Add the tokens accrued since the last refill."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+    
+    async def acquire(self, amount: float = 1) -> None:
+        """Take ``amount`` tokens, waiting in line until the bucket holds them."""
+        # A request larger than the bucket could never fit; let it drain the bucket instead
+        amount = min(amount, self.capacity)
+        
+        if self._queue is None:
+            self._queue = asyncio.Lock()
+        
+        async with self._queue:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.fill_rate)
+                self._refill()
+            self.tokens -= amount
+
+class ProviderLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits for one provider.
+    
+    When the provider answers with a rate-limit error, every request to it
+    is held back until its Retry-After (or backoff) delay has passed.
+    """
+    
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        """Create the limiter; a limit of None is not enforced."""
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+    
+    async def acquire(self, tokens: int) -> None:
+        """Wait until a request of ``tokens`` tokens may be sent."""
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.requests:
+            await self.requests.acquire(1)
+        if self.tokens:
+            await self.tokens.acquire(tokens)
+    
+    def pause(self, seconds: float) -> None:
+        """Hold back every request for the next ``seconds``."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+_limiters: Dict[str, ProviderLimiter] = {}
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    """Return the provider's limiter, sized from its ``rpm`` and ``tpm`` settings."""
+    if provider not in _limiters:
+        llm = config.llms[provider]
+        _limiters[provider] = ProviderLimiter(llm.rpm, llm.tpm)
+    return _limiters[provider]
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether an SDK or HTTP error is a rate-limit (HTTP 429) response."""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    response = getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    try:
+        if int(status) == 429:
+            return True
+    except (TypeError, ValueError):
+        pass
+    return type(error).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests")
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds to wait according to the error's Retry-After headers, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            # HTTP dates aren't worth parsing; fall back to backoff
+            return None
+    return None
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (from 0)."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+async def rate_limited(provider: str, tokens: int, call: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Make a provider call within its rate limits, retrying rate-limit errors.
+    
+    The call waits for request and token budget first. If the provider still
+    answers with a rate-limit error, the call is retried (up to the provider's
+    ``max_retries``) after the Retry-After delay or, without one, after an
+    exponential backoff with jitter. Rate-limit errors are only raised before
+    a response starts streaming, so retrying never repeats streamed tokens.
+    
+    Args:
+        provider: Provider key, such as "openai"
+        tokens: Estimated tokens the request uses (prompt plus completion allowance)
+        call: Makes one attempt at the request
+    
+    Returns:
+        The call's result
+    """
+    limiter = get_limiter(provider)
+    max_retries = config.llms[provider].max_retries
+    
+    attempt = 0
+    while True:
+        started = time.perf_counter()
+        await limiter.acquire(tokens)
+        metrics.rate_limit_wait.observe(time.perf_counter() - started, provider)
+        
+        try:
+            return await call()
+        except Exception as e:
+            if not is_rate_limited(e) or attempt >= max_retries:
+                raise
+            
+            delay = retry_after(e)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            limiter.pause(delay)
+            metrics.rate_limit_retries.inc(provider)
+            logger.info(f"{provider} rate limited; retrying in {delay:.2f}s (attempt {attempt + 1}/{max_retries})")
+            attempt += 1
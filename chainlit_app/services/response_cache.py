@@ -0,0 +1,260 @@
+"""
+Two-tier (in-memory LRU + SQLite) cache of provider responses.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import config
+from .streaming import TokenCallback
+from .single_flight import single_flight
+from .metrics import metrics
+
+# The disk tier is trimmed once every this many writes rather than on each one
+DISK_TRIM_INTERVAL = 100
+
+def normalize_prompt(text: str) -> str:
+    """Normalize a user message so trivially different phrasings share a cache entry."""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip(" ?!.")
+
+def history_fingerprint(history: Optional[List[Dict[str, str]]]) -> str:
+    """Return a stable hash of the history sent with a request."""
+    payload = json.dumps(history or [], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def cache_key(llm: Any,
+              user_message: str,
+              history: Optional[List[Dict[str, str]]] = None,
+              system_prompt: str = "") -> str:
+    """
+    Build the cache key for one provider request.
+    
+    Args:
+        llm: The provider's LLMConfig (its name, model_id, temperature and max_tokens are keyed)
+        user_message: The new user message (normalized before hashing)
+        history: The history actually sent with the request
+        system_prompt: The system prompt sent with the request
+        
+    Returns:
+        Hex digest identifying the request
+    """
+    parts = [
+        llm.name,
+        llm.model_id,
+        repr(llm.temperature),
+        str(llm.max_tokens),
+        hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+        history_fingerprint(history),
+        normalize_prompt(user_message)
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def is_cacheable(response_text: Optional[str]) -> bool:
+    """Error strings and empty responses must never be served from the cache."""
+    return bool(response_text) and not response_text.startswith("Error")
+
+class ResponseCache:
+    """
+    Response cache with an in-memory LRU tier in front of an on-disk SQLite tier.
+    
+    Memory hits are served without leaving the event loop. Disk lookups and
+    writes run in the default executor. Both tiers honour the same TTL; the
+    disk tier is periodically trimmed to ``max_disk_entries`` (oldest first).
+    """
+    
+    def __init__(self,
+                 path: Optional[str] = None,
+                 ttl: float = 86400,
+                 max_memory_entries: int = 1024,
+                 max_disk_entries: int = 100000):
+        """
+        Initialize the cache.
+        
+        Args:
+            path: SQLite file for the persistent tier, or None for memory only
+            ttl: Seconds an entry stays valid
+            max_memory_entries: Capacity of the in-memory LRU tier
+            max_disk_entries: Capacity of the SQLite tier
+        """
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0
+        }
+        
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._disk_writes = 0
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)"
+            )
+            self._db.commit()
+    
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached response for ``key``, or None on a miss."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return value
+            del self._memory[key]
+        
+        if self._db is not None:
+            loop = asyncio.get_running_loop()
+            row = await loop.run_in_executor(None, self._disk_get, key)
+            if row is not None:
+                expires_at, value = row
+                self._remember(key, value, expires_at)
+                self._stats["disk_hits"] += 1
+                return value
+        
+        self._stats["misses"] += 1
+        return None
+    
+    async def set(self, key: str, value: str) -> None:
+        """Store a response in both tiers."""
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        self._stats["writes"] += 1
+        
+        if self._db is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._disk_set, key, value, expires_at)
+    
+    def _remember(self, key: str, value: str, expires_at: float) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+    
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT expires_at, value FROM responses WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        return row
+    
+    def _disk_set(self, key: str, value: str, expires_at: float) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            self._disk_writes += 1
+            if self._disk_writes % DISK_TRIM_INTERVAL == 0:
+                # Entries share one TTL, so expiry order is also insertion order
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,)
+                )
+            self._db.commit()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and tier sizes."""
+        lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+        hits = lookups - self._stats["misses"]
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["memory_entries"] = len(self._memory)
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        return stats
+
+# Shared cache used by the app and the model wrappers, created on first use
+_shared_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None if caching is disabled."""
+    global _shared_cache
+    
+    if not config.cache_enabled:
+        return None
+    
+    if _shared_cache is None:
+        _shared_cache = ResponseCache(
+            path=config.cache_path or None,
+            ttl=config.cache_ttl,
+            max_memory_entries=config.cache_memory_entries,
+            max_disk_entries=config.cache_disk_entries
+        )
+    return _shared_cache
+
+
+async def cached_generate(llm: Any,
+                          user_message: str,
+                          history: Optional[List[Dict[str, str]]],
+                          system_prompt: str,
+                          generate: Callable[[Optional[TokenCallback]], Awaitable[str]],
+                          on_token: Optional[TokenCallback] = None) -> str:
+    """
+    Serve a provider request from the shared cache, or generate and store it.
+    
+    A cache hit is delivered to ``on_token`` in one piece. Error responses are
+    returned but never stored. On a miss, identical requests already in
+    flight are coalesced onto a single upstream call (see ``single_flight``).
+    
+    Args:
+        llm: The provider's LLMConfig
+        user_message: The new user message
+        history: The history sent with the request
+        system_prompt: The system prompt sent with the request
+        generate: Callable that performs the upstream request, streaming into its argument
+        on_token: Optional async callback for the response text
+        
+    Returns:
+        The response text
+    """
+    cache = get_response_cache()
+    if cache is None and not config.coalesce_requests:
+        return await generate(on_token)
+    
+    key = cache_key(llm, user_message, history, system_prompt)
+    if cache is not None:
+        cached = await cache.get(key)
+        if cached is not None:
+            metrics.mark_served("cache_hit")
+            if on_token:
+                await on_token(cached)
+            return cached
+    
+    async def generate_and_store(stream_to: Optional[TokenCallback]) -> str:
+        response_text = await generate(stream_to)
+        if cache is not None and is_cacheable(response_text):
+            await cache.set(key, response_text)
+        return response_text
+    
+    if not config.coalesce_requests:
+        return await generate_and_store(on_token)
+    
+    if key in single_flight:
+        metrics.coalesced_requests.inc(llm.name)
+        metrics.mark_served("coalesced")
+    return await single_flight.do(key, generate_and_store, on_token)
@@ -0,0 +1,240 @@
+"""
+Adaptive primary-model routing: send each turn to the fastest healthy provider.
+"""
+
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from config import config
+from .concurrency import BoundedExecutor
+from .metrics import Counter, Gauge, metrics
+
+logger = logging.getLogger(__name__)
+
+class ProviderStats:
+    """
+    Rolling latency and reliability of one provider.
+    
+    Time to first token, total latency and success rate are exponentially
+    weighted moving averages, so recent requests count most and a provider
+    that slows down or starts failing is noticed within a few requests.
+    """
+    
+    def __init__(self, alpha: float = 0.2):
+        """Create empty statistics; ``alpha`` is the weight of each new sample."""
+        self.alpha = alpha
+        self.ttft: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.success_rate = 1.0
+        self.samples = 0
+        self.updated_at = 0.0
+    
+    def _average(self, current: Optional[float], sample: float) -> float:
+        return sample if current is None else current + self.alpha * (sample - current)
+    
+    def record(self, succeeded: bool, latency: float, ttft: Optional[float] = None) -> None:
+        """Fold one finished request into the averages."""
+        self.samples += 1
+        self.updated_at = time.time()
+        self.success_rate = self._average(self.success_rate if self.samples > 1 else None, float(succeeded))
+        # A failure's latency is how long the user waited for nothing; it counts too
+        self.latency = self._average(self.latency, latency)
+        if ttft is not None:
+            self.ttft = self._average(self.ttft, ttft)
+    
+    def expected_latency(self, ttft_weight: float) -> Optional[float]:
+        """Blend of time to first token and total latency, or None before any sample."""
+        if self.latency is None:
+            return None
+        ttft = self.ttft if self.ttft is not None else self.latency
+        return ttft_weight * ttft + (1 - ttft_weight) * self.latency
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """The statistics, for decision records."""
+        return {
+            "ttft": self.ttft,
+            "latency": self.latency,
+            "success_rate": round(self.success_rate, 4),
+            "samples": self.samples
+        }
+
+class ProviderRouter:
+    """
+    Picks the primary provider for turns whose user selected "Auto".
+    
+    Each candidate is scored by its expected latency (a blend of the TTFT and
+    total latency averages) divided by its success rate and its quality
+    weight; the lowest score wins. Providers below ``min_success`` are
+    skipped while any healthier one is available. Providers without samples
+    are tried first, and with probability ``explore`` another healthy
+    provider is picked so that the statistics of the others stay current.
+    
+    Every decision is recorded with its inputs: the most recent ones are kept
+    in memory, counted in the metrics and, if ``log_path`` is set, appended
+    to a JSONL file.
+    """
+    
+    def __init__(self,
+                 alpha: float = 0.2,
+                 ttft_weight: float = 0.5,
+                 min_success: float = 0.5,
+                 explore: float = 0.0,
+                 log_path: Optional[str] = None,
+                 history: int = 1000,
+                 seed: Optional[int] = None):
+        """
+        Create the router.
+        
+        Args:
+            alpha: EWMA weight of each new request
+            ttft_weight: Share of time to first token (vs. total latency) in the expected latency
+            min_success: Success rate below which a provider counts as unhealthy
+            explore: Probability of routing to a healthy provider other than the best one
+            log_path: JSONL file decisions are appended to by a background thread (None disables)
+            history: Number of recent decisions kept in memory
+            seed: Seed for exploration, for reproducible runs
+        """
+        self.alpha = alpha
+        self.ttft_weight = ttft_weight
+        self.min_success = min_success
+        self.explore = explore
+        self.log_path = log_path
+        self.stats: Dict[str, ProviderStats] = {}
+        self.decisions: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._random = random.Random(seed)
+        # Appends to the log file, off the event loop and in decision order
+        self._log_writer: Optional[BoundedExecutor] = None
+    
+    def get_stats(self, provider: str) -> ProviderStats:
+        """Return a provider's statistics, creating empty ones on first use."""
+        if provider not in self.stats:
+            self.stats[provider] = ProviderStats(self.alpha)
+        return self.stats[provider]
+    
+    def observe(self, provider: str, outcome: str, duration: float, ttft: Optional[float]) -> None:
+        """Record a finished request (a ``metrics.observe_requests`` observer)."""
+        # A cancelled or shed request says nothing about the provider
+        if outcome in ("cancelled", "shed"):
+            return
+        self.get_stats(provider).record(outcome == "success", duration, ttft)
+    
+    def score(self, provider: str) -> Optional[float]:
+        """Lower is better; None for a provider without samples."""
+        stats = self.get_stats(provider)
+        expected = stats.expected_latency(self.ttft_weight)
+        if expected is None:
+            return None
+        weight = config.llms[provider].quality_weight if provider in config.llms else 1.0
+        return expected / (max(stats.success_rate, 0.01) * max(weight, 0.01))
+    
+    def choose(self, candidates: List[str], conversation_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Pick the primary provider for one turn and record the decision.
+        
+        Args:
+            candidates: Providers that may answer (enabled, circuit not open), in order of preference
+            conversation_id: Recorded with the decision
+        
+        Returns:
+            The decision (its "provider" is the choice), or None without candidates
+        """
+        if not candidates:
+            return None
+        
+        inputs = {}
+        for provider in candidates:
+            stats = self.get_stats(provider)
+            inputs[provider] = dict(
+                stats.as_dict(),
+                quality_weight=config.llms[provider].quality_weight if provider in config.llms else 1.0,
+                score=self.score(provider),
+                healthy=stats.success_rate >= self.min_success
+            )
+        
+        unmeasured = [provider for provider in candidates if inputs[provider]["score"] is None]
+        healthy = [provider for provider in candidates if inputs[provider]["healthy"]] or candidates
+        ranked = sorted(
+            (provider for provider in healthy if inputs[provider]["score"] is not None),
+            key=lambda provider: inputs[provider]["score"]
+        )
+        
+        if unmeasured:
+            provider, reason = unmeasured[0], "unmeasured"
+        elif len(ranked) > 1 and self._random.random() < self.explore:
+            provider, reason = self._random.choice(ranked[1:]), "explore"
+        else:
+            provider, reason = ranked[0], "fastest"
+        
+        decision = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "conversation_id": conversation_id,
+            "provider": provider,
+            "reason": reason,
+            "candidates": inputs
+        }
+        self.record(decision)
+        return decision
+    
+    def record(self, decision: Dict[str, Any]) -> None:
+        """Keep, count and optionally log a decision (the file is written in the background)."""
+        self.decisions.append(decision)
+        routing_decisions.inc(decision["provider"], decision["reason"])
+        logger.debug(f"Routed turn to {decision['provider']} ({decision['reason']})")
+        if self.log_path:
+            if self._log_writer is None:
+                self._log_writer = BoundedExecutor(max_workers=1, thread_name_prefix="routing-log")
+            self._log_writer.submit(self._append_log, json.dumps(decision) + "\n")
+    
+    def _append_log(self, line: str) -> None:
+        """Append one decision to the log file (runs on the log writer thread)."""
+        try:
+            directory = os.path.dirname(self.log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            logger.warning(f"Could not write routing decision to {self.log_path}: {e}")
+    
+    def flush_log(self) -> None:
+        """Wait until every decision recorded so far has been written to the log file."""
+        if self._log_writer is not None:
+            self._log_writer.submit(lambda: None).result()
+
+routing_decisions = metrics.register(Counter(
+    "chat_routing_decisions_total",
+    "Turns routed by the Auto primary model, by chosen provider and reason (fastest, explore, unmeasured).",
+    ("provider", "reason")
+))
+
+# Shared router; it learns from every tracked provider request
+router = ProviderRouter(
+    alpha=config.routing_alpha,
+    ttft_weight=config.routing_ttft_weight,
+    min_success=config.routing_min_success,
+    explore=config.routing_explore,
+    log_path=config.routing_log_path or None
+)
+metrics.observe_requests(router.observe)
+
+metrics.register(Gauge(
+    "llm_routing_expected_latency_seconds",
+    "Rolling expected latency per provider, as used by Auto routing.",
+    ("provider",),
+    collect=lambda: {
+        (provider,): stats.expected_latency(router.ttft_weight)
+        for provider, stats in router.stats.items()
+        if stats.latency is not None
+    }
+))
+metrics.register(Gauge(
+    "llm_routing_success_rate",
+    "Rolling success rate per provider, as used by Auto routing.",
+    ("provider",),
+    collect=lambda: {(provider,): stats.success_rate for provider, stats in router.stats.items()}
+))
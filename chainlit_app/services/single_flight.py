@@ -0,0 +1,154 @@
+"""
+Coalescing of identical in-flight provider requests.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .concurrency import PRIMARY, RequestPriority, current_priority, request_priority
+from .streaming import TokenCallback
+
+logger = logging.getLogger(__name__)
+
+class Flight:
+    """
+    One shared upstream call and the callers waiting on it.
+    
+    Tokens are kept as they stream so a caller that joins late first receives
+    everything streamed so far, then the rest as it arrives. The call runs
+    with its own ``priority``, which is raised to primary as soon as a
+    primary caller joins, so that caller never waits in the secondary queue.
+    """
+    
+    def __init__(self, priority: str = PRIMARY):
+        """Create a flight with no callers yet, at the priority of the caller starting it."""
+        self.tokens: List[str] = []
+        self.subscribers: List[TokenCallback] = []
+        self.waiters = 0
+        self.task: Optional[asyncio.Task] = None
+        self.priority = RequestPriority(priority)
+    
+    async def publish(self, token: str) -> None:
+        """Forward a token to every subscribed caller."""
+        self.tokens.append(token)
+        for on_token in list(self.subscribers):
+            try:
+                await on_token(token)
+            except Exception as e:
+                # A caller whose stream broke (e.g. a closed session) stops
+                # receiving tokens; the shared call carries on for the others
+                logger.warning(f"Dropping a coalesced stream subscriber: {e}")
+                self.unsubscribe(on_token)
+    
+    async def subscribe(self, on_token: TokenCallback) -> TokenCallback:
+        """
+        Replay the tokens streamed so far to ``on_token`` and subscribe it.
+        
+        Tokens published while the replay is being delivered are held back and
+        sent after it, so the caller sees the stream in order.
+        
+        Returns:
+            The subscription, for ``unsubscribe``
+        """
+        replay = "".join(self.tokens)
+        pending: List[str] = []
+        replaying = True
+        
+        async def deliver(token: str) -> None:
+            if replaying:
+                pending.append(token)
+            else:
+                await on_token(token)
+        
+        self.subscribers.append(deliver)
+        try:
+            if replay:
+                await on_token(replay)
+            while pending:
+                await on_token(pending.pop(0))
+        except BaseException:
+            self.unsubscribe(deliver)
+            raise
+        replaying = False
+        return deliver
+    
+    def unsubscribe(self, subscription: Optional[TokenCallback]) -> None:
+        """Stop forwarding tokens to a subscription."""
+        if subscription in self.subscribers:
+            self.subscribers.remove(subscription)
+
+class SingleFlight:
+    """
+    Runs at most one upstream call per request key at a time.
+    
+    Callers asking for a key that is already in flight attach to the running
+    call (its streamed tokens and its result) instead of starting another. The
+    call runs in its own task and each caller awaits it through
+    ``asyncio.shield``, so one caller being cancelled leaves the shared result
+    intact for the others; the call itself is cancelled only when every caller
+    has gone.
+    """
+    
+    def __init__(self):
+        """Create an empty set of flights."""
+        self._flights: Dict[str, Flight] = {}
+        self.coalesced = 0
+    
+    def __contains__(self, key: str) -> bool:
+        """Whether a call for ``key`` is in flight."""
+        return key in self._flights
+    
+    def __len__(self) -> int:
+        """Number of distinct upstream calls in flight."""
+        return len(self._flights)
+    
+    async def do(self,
+                 key: str,
+                 generate: Callable[[Optional[TokenCallback]], Awaitable[str]],
+                 on_token: Optional[TokenCallback] = None) -> str:
+        """
+        Return the result of ``generate`` for ``key``, sharing it with identical in-flight calls.
+        
+        Args:
+            key: Identifies the request (see ``response_cache.cache_key``)
+            generate: Performs the upstream request, streaming into its argument
+            on_token: Optional async callback for this caller's streamed tokens
+        
+        Returns:
+            The shared response text
+        """
+        priority = current_priority().level
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = Flight(priority)
+            with request_priority(flight.priority):
+                flight.task = asyncio.create_task(generate(flight.publish))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.coalesced += 1
+            if priority == PRIMARY:
+                # Don't leave a primary caller queued behind a secondary's priority
+                flight.priority.promote()
+        
+        flight.waiters += 1
+        subscription = None
+        try:
+            if on_token:
+                subscription = await flight.subscribe(on_token)
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            flight.unsubscribe(subscription)
+            # Nobody is left to use the result
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+    
+    def _forget(self, key: str, flight: Flight) -> None:
+        """Remove a finished flight so later callers start a fresh call."""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+# Shared flights for the whole process
+single_flight = SingleFlight()
@@ -0,0 +1,112 @@
+"""
+Helpers for streaming model output token by token.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+
+# Async callback that receives each text delta as soon as the model produces it
+TokenCallback = Callable[[str], Awaitable[None]]
+
+# Sentinel pushed onto the queue once the worker thread is done
+_DONE = object()
+
+async def iterate_in_thread(make_iterable: Callable[[], Iterable[Any]],
+                            executor: Optional[Executor] = None) -> AsyncIterator[Any]:
+    """
+    Consume a blocking iterator on a worker thread and yield its items asynchronously.
+    
+    SDKs such as google-generativeai only expose a synchronous streaming iterator.
+    Running it in an executor and handing each chunk back to the event loop lets
+    the caller forward tokens to the UI while the rest of the stream is pending.
+    
+    If the consumer stops early (it is cancelled, times out or breaks out of the
+    loop) the worker is told to stop and abandons the stream at the next chunk
+    boundary, so an expired request does not keep holding an executor thread.
+    
+    Args:
+        make_iterable: Zero-argument callable that performs the blocking request
+            and returns an iterable of chunks. It is invoked on the worker thread.
+        executor: Executor to run on; defaults to the loop's default executor
+            
+    Yields:
+        Each item produced by the iterable, in order
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    
+    def publish(item, error=None):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+        except RuntimeError:
+            # The event loop has already shut down; nobody is listening
+            stop.set()
+    
+    def produce():
+        iterable = None
+        try:
+            if stop.is_set():
+                return
+            iterable = make_iterable()
+            for item in iterable:
+                if stop.is_set():
+                    break
+                publish(item)
+        except Exception as e:
+            publish(_DONE, e)
+        else:
+            publish(_DONE)
+        finally:
+            close = getattr(iterable, "close", None)
+            if stop.is_set() and callable(close):
+                try:
+                    close()
+                except Exception:
+                    pass
+    
+    worker = loop.run_in_executor(executor, produce)
+    
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        stop.set()
+    
+    await worker
+    if error is not None:
+        raise error
+
+
+async def stream_gemini(model: Any,
+                        contents: List[Dict[str, Any]],
+                        executor: Optional[Executor] = None) -> AsyncIterator[Any]:
+    """
+    Yield Gemini response chunks, using the SDK's native async API when it has one.
+    
+    Older google-generativeai releases only offer the blocking
+    ``generate_content``; in that case the stream is consumed on ``executor``.
+    
+    Args:
+        model: A ``genai.GenerativeModel``
+        contents: The request contents in Gemini format
+        executor: Executor for the blocking fallback
+        
+    Yields:
+        Response chunks, in order
+    """
+    if hasattr(model, "generate_content_async"):
+        response = await model.generate_content_async(contents, stream=True)
+        async for chunk in response:
+            yield chunk
+    else:
+        async for chunk in iterate_in_thread(
+            lambda: model.generate_content(contents, stream=True),
+            executor
+        ):
+            yield chunk
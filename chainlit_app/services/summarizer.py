@@ -0,0 +1,62 @@
+"""
+Incremental summarization of older conversation turns.
+"""
+
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .conversation_store import Conversation
+
+# Generates text for a prompt; returns None if the provider failed
+SummaryGenerator = Callable[[str], Awaitable[Optional[str]]]
+
+def build_summary_request(previous_summary: str, messages: List[Dict[str, str]]) -> str:
+    """Build the prompt that folds ``messages`` into the existing summary."""
+    transcript = "\n".join(
+        f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+        for msg in messages
+    )
+    return (
+        "Update the running summary of this conversation between a user and a virtual "
+        "gynecology assistant. Keep every symptom, duration, medication, relevant history "
+        "and advice already given; drop pleasantries. Reply with the updated summary only, "
+        "in at most 150 words.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\n"
+        f"New messages:\n{transcript}"
+    )
+
+async def refresh_summary(conversation: Conversation,
+                          generate: SummaryGenerator,
+                          window_tokens: int) -> bool:
+    """
+    Fold older turns into the conversation's rolling summary if it has grown too long.
+    
+    Nothing happens until the unsummarized history exceeds ``window_tokens``;
+    then enough old turns are folded that about half of that budget remains,
+    so summarization runs every few turns rather than on every turn. Meant to
+    run as a background task between turns.
+    
+    Args:
+        conversation: The conversation to summarize
+        generate: Callable that produces text for a prompt
+        window_tokens: Size of the recent window kept verbatim
+        
+    Returns:
+        True if a new summary was installed
+    """
+    if conversation.summarizing or conversation.unsummarized_tokens() <= window_tokens:
+        return False
+    
+    conversation.summarizing = True
+    try:
+        upto, messages = conversation.messages_to_summarize(window_tokens // 2)
+        if not messages:
+            return False
+        
+        summary = await generate(build_summary_request(conversation.summary, messages))
+        if not summary:
+            return False
+        
+        conversation.apply_summary(summary.strip(), upto)
+        return True
+    finally:
+        conversation.summarizing = False
@@ -0,0 +1,39 @@
+"""
+Token estimation for prompt budgeting.
+"""
+
+from typing import Any, Dict, List
+
+# Rough average for English text across the OpenAI, Gemini and Grok tokenizers
+CHARS_PER_TOKEN = 4
+
+# Per-message framing overhead (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate how many tokens a piece of text will use.
+    
+    The providers use different tokenizers, so an exact count for one would
+    still be an estimate for the others. A character-based estimate is cheap,
+    provider-neutral and errs slightly on the high side for English prose.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+def count_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    """
+    Estimate the tokens used by a list of chat messages.
+    
+    Accepts messages in the OpenAI (``content``) or Gemini (``parts``) format.
+    """
+    total = 0
+    for message in messages:
+        if "content" in message:
+            text = str(message["content"])
+        else:
+            text = "".join(
+                part.get("text", "") if isinstance(part, dict) else str(part)
+                for part in message.get("parts", [])
+            )
+        total += count_tokens(text)
+    return total
@@ -0,0 +1,149 @@
+"""
+Per-conversation turn scheduling: one turn at a time per conversation, with
+cancellation of turns the user has superseded or stopped.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Set, TypeVar
+
+from config import config
+from .metrics import Counter, Gauge, metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class TurnCancelled(Exception):
+    """Raised to the caller of ``TurnScheduler.run`` when its turn was cancelled."""
+    
+    def __init__(self, reason: str):
+        """Create the error; ``reason`` is "superseded", "stopped" or "ended"."""
+        super().__init__(f"Turn {reason}")
+        self.reason = reason
+
+class TurnScheduler:
+    """
+    Serializes the turns of each conversation.
+    
+    Each turn runs in its own task, and a conversation's turns take its lock
+    in arrival order, so a turn always sees the history left by the previous
+    one and never interleaves its appends with another turn's. Turns of
+    different conversations run concurrently.
+    
+    With ``policy="supersede"`` a new message cancels the conversation's
+    running and queued turns, so their provider calls are abandoned instead
+    of generating answers no one will read; with ``policy="queue"`` (the
+    default) turns wait their turn. Either way ``cancel`` stops a
+    conversation's turns on request (the stop button).
+    """
+    
+    def __init__(self, policy: str = "queue"):
+        """
+        Create the scheduler.
+        
+        Args:
+            policy: "queue" to run a conversation's turns in order, or
+                "supersede" to cancel earlier turns when a new one arrives
+        """
+        if policy not in ("queue", "supersede"):
+            raise ValueError(f"Unknown turn policy '{policy}' (expected queue or supersede)")
+        self.policy = policy
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._turns: Dict[str, Set[asyncio.Task]] = {}
+        # Why a turn task was cancelled by the scheduler, until it finishes
+        self._reasons: Dict[asyncio.Task, str] = {}
+    
+    async def run(self, conversation_id: str, turn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run one turn of a conversation once the previous turns are done.
+        
+        Cancelling the caller cancels the turn too.
+        
+        Args:
+            conversation_id: Conversation the turn belongs to
+            turn: Starts the turn's work (called once the turn holds the lock)
+        
+        Returns:
+            The turn's result
+        
+        Raises:
+            TurnCancelled: If the turn was superseded or stopped
+        """
+        if self.policy == "supersede":
+            self.cancel(conversation_id, "superseded")
+        
+        lock = self._locks.setdefault(conversation_id, asyncio.Lock())
+        conversation_turns = self._turns.setdefault(conversation_id, set())
+        
+        async def locked():
+            async with lock:
+                return await turn()
+        
+        task = asyncio.create_task(locked())
+        conversation_turns.add(task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            reason = self._reasons.get(task)
+            if reason is None:
+                # The caller itself was cancelled
+                raise
+            turns_cancelled.inc(reason)
+            raise TurnCancelled(reason) from None
+        finally:
+            conversation_turns.discard(task)
+            self._reasons.pop(task, None)
+            if not conversation_turns:
+                # Forget idle conversations
+                self._turns.pop(conversation_id, None)
+                self._locks.pop(conversation_id, None)
+    
+    def cancel(self, conversation_id: str, reason: str = "stopped") -> int:
+        """
+        Cancel a conversation's running and queued turns.
+        
+        Args:
+            conversation_id: Conversation whose turns are cancelled
+            reason: Recorded with the cancellation ("superseded", "stopped" or "ended")
+        
+        Returns:
+            The number of turns cancelled
+        """
+        cancelled = 0
+        for task in self._turns.get(conversation_id, ()):
+            if not task.done() and task not in self._reasons:
+                self._reasons[task] = reason
+                task.cancel()
+                cancelled += 1
+        if cancelled:
+            logger.debug(f"Cancelled {cancelled} turn(s) of conversation {conversation_id} ({reason})")
+        return cancelled
+    
+    def pending(self, conversation_id: Optional[str] = None) -> int:
+        """Return the number of unfinished turns, of one conversation or in total."""
+        if conversation_id is not None:
+            return len(self._turns.get(conversation_id, ()))
+        return sum(len(turns) for turns in self._turns.values())
+    
+    def queued(self) -> int:
+        """Return the number of turns waiting for an earlier turn of their conversation."""
+        return sum(
+            len(turns) - (1 if self._locks[conversation_id].locked() else 0)
+            for conversation_id, turns in self._turns.items()
+        )
+
+turns_cancelled = metrics.register(Counter(
+    "chat_turns_cancelled_total",
+    "Turns cancelled before they finished, by reason (superseded, stopped, ended).",
+    ("reason",)
+))
+
+# Shared scheduler for every conversation handled by this process
+turns = TurnScheduler(config.turn_policy)
+
+metrics.register(Gauge(
+    "chat_turns_queued",
+    "Turns waiting for an earlier turn of the same conversation to finish.",
+    collect=lambda: {(): turns.queued()}
+))
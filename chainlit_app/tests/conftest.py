@@ -0,0 +1,9 @@
+"""
+Shared test setup: the app's modules import each other from the chainlit_app
+directory (``from config import config``), as they do when the app runs.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,99 @@
+"""
+Tests for the circuit breaker around provider requests served through the
+response cache and request coalescing.
+"""
+
+import asyncio
+
+import pytest
+
+from config import config
+from services import response_cache
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from services.metrics import metrics
+from services.response_cache import ResponseCache, cached_generate
+
+class FakeLLM:
+    """The LLMConfig fields the response cache keys on."""
+    
+    name = "gemini"
+    model_id = "fake-model"
+    temperature = 0.0
+    max_tokens = 100
+
+@pytest.fixture
+def cache(monkeypatch):
+    """Serve requests through a fresh in-memory cache, with coalescing on."""
+    cache = ResponseCache(path=None)
+    monkeypatch.setattr(config, "cache_enabled", True)
+    monkeypatch.setattr(config, "coalesce_requests", True)
+    monkeypatch.setattr(response_cache, "_shared_cache", cache)
+    return cache
+
+async def request(breaker, question, generate):
+    """Make one tracked provider request, as ``app.run_model`` does."""
+    with breaker.track():
+        return await metrics.track_request(
+            "gemini",
+            question,
+            [],
+            lambda on_token: cached_generate(FakeLLM(), question, [], "system", generate, on_token)
+        )
+
+async def succeed(on_token):
+    return "An answer"
+
+async def fail(on_token):
+    await asyncio.sleep(0.05)
+    raise RuntimeError("upstream failure")
+
+def test_cache_hits_do_not_hide_an_outage(cache):
+    breaker = CircuitBreaker("gemini", failure_threshold=5)
+    
+    async def scenario():
+        await request(breaker, "cached question", succeed)
+        for attempt in range(5):
+            # A cache hit between upstream failures must not reset the count
+            await request(breaker, "cached question", fail)
+            with pytest.raises(RuntimeError):
+                await request(breaker, f"new question {attempt}", fail)
+    
+    asyncio.run(scenario())
+    assert breaker.state == OPEN
+
+def test_cache_hit_does_not_close_a_half_open_circuit(cache):
+    breaker = CircuitBreaker("gemini", failure_threshold=1, reset_timeout=0.0)
+    
+    async def scenario():
+        await request(breaker, "cached question", succeed)
+        with pytest.raises(RuntimeError):
+            await request(breaker, "new question", fail)
+        assert breaker.state == OPEN
+        
+        assert breaker.allow()
+        assert breaker.state == HALF_OPEN
+        await request(breaker, "cached question", fail)
+    
+    asyncio.run(scenario())
+    assert breaker.state == HALF_OPEN
+    assert not breaker.probe_in_flight
+
+def test_coalesced_failure_counts_once(cache):
+    breaker = CircuitBreaker("gemini", failure_threshold=5)
+    upstream_calls = []
+    
+    async def fail_once_shared(on_token):
+        upstream_calls.append(1)
+        return await fail(on_token)
+    
+    async def scenario():
+        results = await asyncio.gather(
+            *(request(breaker, "same question", fail_once_shared) for _ in range(5)),
+            return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+    
+    asyncio.run(scenario())
+    assert len(upstream_calls) == 1
+    assert breaker.failures == 1
+    assert breaker.state == CLOSED
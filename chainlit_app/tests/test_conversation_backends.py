@@ -0,0 +1,151 @@
+"""
+Tests for the conversation backends, with Redis served by the local stand-in
+in ``benchmarks.redis_stub``.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+
+from benchmarks.redis_stub import RedisStub
+from services.conversation_backends import MemoryBackend, RedisBackend, SQLiteBackend, create_backend
+from services.conversation_store import ConversationStore
+
+PERSISTENT_BACKENDS = ["sqlite", "redis"]
+
+@asynccontextmanager
+async def open_backend(kind, tmp_path, retention=None):
+    """Yield a fresh backend of ``kind``, closing it (and any stand-in server) afterwards."""
+    if kind == "memory":
+        backend = MemoryBackend()
+        yield backend
+        await backend.close()
+    elif kind == "sqlite":
+        backend = SQLiteBackend(str(tmp_path / "conversations.db"), retention)
+        yield backend
+        await backend.close()
+    else:
+        server = RedisStub()
+        port = await server.start(port=0)
+        backend = RedisBackend(f"redis://127.0.0.1:{port}/0", retention)
+        try:
+            yield backend
+        finally:
+            await backend.close()
+            await server.stop()
+
+def snapshot_of(*messages, revision=1):
+    """Build the snapshot of a conversation holding ``messages`` as (role, content) pairs."""
+    return {
+        "revision": revision,
+        "settings": {"show_all_models": False, "primary_model": "ChatGPT"},
+        "messages": [{"role": role, "content": content} for role, content in messages],
+        "summary": "",
+        "summarized_upto": 0,
+        "trimmed": 0
+    }
+
+@pytest.mark.parametrize("kind", PERSISTENT_BACKENDS)
+def test_save_and_load_round_trip(kind, tmp_path):
+    async def scenario():
+        async with open_backend(kind, tmp_path) as backend:
+            assert backend.persistent
+            assert await backend.load("a") is None
+            
+            first = snapshot_of(("user", "Is spotting normal?"), ("assistant", "Often, yes."))
+            second = snapshot_of(("user", "Qu'est-ce que l'endométriose ?"))
+            await backend.save_many({"a": first, "b": second})
+            assert await backend.load("a") == first
+            assert await backend.load("b") == second
+            
+            # A later batch replaces the stored snapshot
+            updated = snapshot_of(("user", "Is spotting normal?"), revision=2)
+            await backend.save_many({"a": updated})
+            assert await backend.load("a") == updated
+            
+            await backend.delete("a")
+            assert await backend.load("a") is None
+            assert await backend.load("b") == second
+    
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("kind", PERSISTENT_BACKENDS)
+def test_retention_expires_snapshots(kind, tmp_path):
+    async def scenario():
+        async with open_backend(kind, tmp_path, retention=1) as backend:
+            await backend.save_many({"a": snapshot_of(("user", "Hello"))})
+            assert await backend.load("a") is not None
+            await asyncio.sleep(1.2)
+            assert await backend.load("a") is None
+    
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("kind", PERSISTENT_BACKENDS)
+def test_store_restores_and_prefers_newer_revisions(kind, tmp_path):
+    async def scenario():
+        async with open_backend(kind, tmp_path) as backend:
+            # Two workers sharing one backend
+            first = ConversationStore(backend=backend, flush_interval=60)
+            second = ConversationStore(backend=backend, flush_interval=60)
+            
+            conversation = await first.load("c")
+            conversation.append("user", "What causes cramps?")
+            conversation.append("assistant", "Prostaglandins, mostly.")
+            await first.flush()
+            assert first.batches_written == 1
+            
+            restored = await second.load("c")
+            assert restored.revision == conversation.revision
+            assert restored.history == conversation.history
+            
+            # The second worker moves the conversation on; the first picks it up
+            restored.append("user", "And heavy bleeding?")
+            await second.flush()
+            reloaded = await first.load("c")
+            assert reloaded.revision == restored.revision
+            assert reloaded.history[-1]["content"] == "And heavy bleeding?"
+            
+            # Unsaved local changes are never replaced by an older snapshot
+            reloaded.append("assistant", "That is worth checking with a provider.")
+            reloaded.append("user", "Thanks")
+            assert (await first.load("c")) is reloaded
+            assert reloaded.history[-1]["content"] == "Thanks"
+            
+            await first.close()
+    
+    asyncio.run(scenario())
+
+def test_memory_backend_keeps_conversations_in_process_only(tmp_path):
+    async def scenario():
+        async with open_backend("memory", tmp_path) as backend:
+            assert not backend.persistent
+            await backend.save_many({"a": snapshot_of(("user", "Hello"))})
+            assert await backend.load("a") is None
+            
+            store = ConversationStore(backend=backend)
+            conversation = await store.load("a")
+            conversation.append("user", "Hello")
+            assert conversation.revision == 1
+            assert store.stats()["pending_writes"] == 0
+            assert (await store.load("a")) is conversation
+            
+            # A new store (a restart) starts empty
+            assert len((await ConversationStore(backend=backend).load("a")).history) == 0
+    
+    asyncio.run(scenario())
+
+def test_memory_store_evicts_idle_conversations():
+    store = ConversationStore(ttl=0.05)
+    store.get_or_create("a").append("user", "Hello")
+    assert store.get("a") is not None
+    
+    time.sleep(0.1)
+    assert store.get("a") is None
+    assert store.evictions == 1
+
+def test_create_backend_rejects_unknown_names():
+    assert isinstance(create_backend("memory"), MemoryBackend)
+    with pytest.raises(ValueError):
+        create_backend("bogus")
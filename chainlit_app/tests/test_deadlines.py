@@ -0,0 +1,66 @@
+"""
+Tests for deadlines and hedged provider calls.
+"""
+
+import asyncio
+
+import pytest
+
+from services.deadlines import call_with_deadline
+
+def attempt_factory(*plans):
+    """
+    Return an attempt factory whose n-th attempt follows ``plans[n]``.
+    
+    Each plan is (delay, outcome): after ``delay`` seconds the attempt streams
+    and returns the outcome text, or raises it if it is an exception.
+    """
+    started = []
+    
+    async def make_attempt(on_token):
+        delay, outcome = plans[len(started)]
+        started.append(outcome)
+        await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if on_token:
+            await on_token(outcome)
+        return outcome
+    
+    make_attempt.started = started
+    return make_attempt
+
+def run(make_attempt, **options):
+    """Run ``call_with_deadline`` and return its result with the streamed tokens."""
+    tokens = []
+    
+    async def on_token(token):
+        tokens.append(token)
+    
+    result = asyncio.run(call_with_deadline(make_attempt, on_token, **options))
+    return result, tokens
+
+def test_hedge_answers_when_the_first_attempt_fails():
+    make_attempt = attempt_factory((0.05, RuntimeError("boom")), (0.05, "hedged"))
+    assert run(make_attempt, timeout=1.0, hedge_after=0.2) == ("hedged", ["hedged"])
+    assert len(make_attempt.started) == 2
+
+def test_first_attempt_still_wins_when_the_hedge_fails():
+    make_attempt = attempt_factory((0.2, "first"), (0.0, RuntimeError("boom")))
+    assert run(make_attempt, timeout=1.0, hedge_after=0.05) == ("first", ["first"])
+
+def test_error_raised_once_every_attempt_failed():
+    make_attempt = attempt_factory((0.0, RuntimeError("first")), (0.0, RuntimeError("hedge")))
+    with pytest.raises(RuntimeError, match="first"):
+        run(make_attempt, timeout=1.0, hedge_after=0.2)
+
+def test_failure_without_hedging_is_raised():
+    make_attempt = attempt_factory((0.0, RuntimeError("boom")))
+    with pytest.raises(RuntimeError, match="boom"):
+        run(make_attempt, timeout=1.0)
+    assert len(make_attempt.started) == 1
+
+def test_deadline_cancels_slow_attempts():
+    make_attempt = attempt_factory((5.0, "late"), (5.0, "late"))
+    with pytest.raises(asyncio.TimeoutError):
+        run(make_attempt, timeout=0.2, hedge_after=0.05)
@@ -0,0 +1,40 @@
+"""
+Tests for matching user questions against the prebuilt FAQ answers.
+"""
+
+import os
+
+import pytest
+
+from config import config
+from services.faq_index import FAQIndex
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "faq", "questions.txt")
+
+@pytest.fixture(scope="module")
+def index():
+    """Index the curated FAQ questions, each answered with its own text."""
+    with open(QUESTIONS_PATH, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return FAQIndex([{"question": question, "answer": question} for question in questions])
+
+@pytest.mark.parametrize("question", [
+    "Is light spotting between periods normal?",
+    "is light spotting between periods normal",
+    "What are common symptoms of PCOS?"
+])
+def test_matches_the_curated_question(index, question):
+    entry = index.lookup(question, config.faq_threshold)
+    assert entry is not None
+    assert entry["question"].lower().rstrip("?") == question.lower().rstrip("?")
+
+@pytest.mark.parametrize("question", [
+    "I am pregnant, is light spotting between periods normal?",
+    "Is light spotting between periods normal if I am postmenopausal?",
+    "Is light spotting between periods normal? I am 62 and went through menopause 10 years ago",
+    "What are common symptoms of PCOS in men?"
+])
+def test_qualified_questions_fall_below_the_threshold(index, question):
+    entry, score = index.search(question)
+    assert score < config.faq_threshold
+    assert index.lookup(question, config.faq_threshold) is None
@@ -0,0 +1,108 @@
+"""
+Tests for the Grok integration against the local OpenAI-compatible stub server.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import openai
+import pytest
+
+from benchmarks.mock_providers import LatencyModel
+from benchmarks.stub_server import StubServer
+from config import config
+from models.grok_model import GrokModel
+from services import concurrency, rate_limits
+from services.clients import clients
+
+@pytest.fixture
+def grok_settings(monkeypatch):
+    """Send every request upstream with fresh clients and limits, and return Grok's settings."""
+    monkeypatch.setattr(config, "cache_enabled", False)
+    monkeypatch.setattr(config, "coalesce_requests", False)
+    monkeypatch.setattr(rate_limits, "_limiters", {})
+    monkeypatch.setattr(concurrency, "_slots", {})
+    llm = config.llms["grok"]
+    monkeypatch.setattr(llm, "api_key", "stub")
+    monkeypatch.setattr(llm, "hedge_after", None)
+    # Restored after the test; ``grok_against`` points it at the stub
+    monkeypatch.setattr(llm, "base_url", llm.base_url)
+    return llm
+
+@asynccontextmanager
+async def grok_against(stub, llm):
+    """Start ``stub`` and yield a GrokModel pointed at it."""
+    port = await stub.start(port=0)
+    llm.base_url = f"http://127.0.0.1:{port}/v1"
+    try:
+        yield GrokModel()
+    finally:
+        await clients.aclose()
+        await stub.stop()
+
+def test_streams_deltas(grok_settings):
+    stub = StubServer(LatencyModel("fixed", 0.05))
+    
+    async def scenario():
+        tokens = []
+        
+        async def on_token(token):
+            tokens.append(token)
+        
+        async with grok_against(stub, grok_settings) as model:
+            response = await model.complete("What is a Pap smear?", [], on_token)
+        
+        assert tokens == stub.chunks
+        assert response == "".join(stub.chunks)
+        assert stub.stats["requests"] == 1
+    
+    asyncio.run(scenario())
+
+def test_retries_rate_limits_after_retry_after(grok_settings):
+    stub = StubServer(LatencyModel("fixed", 0.0), statuses=[429, 200], retry_after=0.2)
+    
+    async def scenario():
+        async with grok_against(stub, grok_settings) as model:
+            started = time.perf_counter()
+            response = await model.complete("What is a Pap smear?")
+            elapsed = time.perf_counter() - started
+        
+        assert response == "".join(stub.chunks)
+        assert stub.stats["rate_limited"] == 1
+        assert stub.stats["requests"] == 2
+        assert elapsed >= 0.2
+    
+    asyncio.run(scenario())
+
+def test_server_errors_are_raised_without_retrying(grok_settings):
+    stub = StubServer(LatencyModel("fixed", 0.0), statuses=[500, 500])
+    
+    async def scenario():
+        async with grok_against(stub, grok_settings) as model:
+            with pytest.raises(openai.InternalServerError):
+                await model.complete("What is a Pap smear?")
+            assert stub.stats["requests"] == 1
+            
+            response = await model.generate_response("What is a Pap smear?")
+        
+        assert response.startswith("Error generating response from Grok:")
+    
+    asyncio.run(scenario())
+
+def test_slow_responses_time_out(grok_settings, monkeypatch):
+    monkeypatch.setattr(grok_settings, "timeout", 0.2)
+    stub = StubServer(LatencyModel("fixed", 5.0))
+    
+    async def scenario():
+        async with grok_against(stub, grok_settings) as model:
+            started = time.perf_counter()
+            with pytest.raises(asyncio.TimeoutError):
+                await model.complete("What is a Pap smear?")
+            assert time.perf_counter() - started < 1.0
+            
+            response = await model.generate_response("What is a Pap smear?")
+        
+        assert response == f"Error: {model.name} did not respond within 0.2 seconds."
+    
+    asyncio.run(scenario())
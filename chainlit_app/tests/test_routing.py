@@ -0,0 +1,29 @@
+"""
+Tests for the provider router's decision log.
+"""
+
+import json
+import threading
+
+from services.routing import ProviderRouter
+
+def test_decisions_are_logged_in_order_off_the_calling_thread(tmp_path):
+    log_path = tmp_path / "routing" / "decisions.jsonl"
+    router = ProviderRouter(log_path=str(log_path), seed=1)
+    caller = threading.current_thread()
+    writers = []
+    append_log = router._append_log
+    
+    def recording_append(line):
+        writers.append(threading.current_thread())
+        append_log(line)
+    
+    router._append_log = recording_append
+    for turn in range(10):
+        router.choose(["openai", "gemini"], conversation_id=str(turn))
+    router.flush_log()
+    
+    with open(log_path, encoding="utf-8") as f:
+        logged = [json.loads(line)["conversation_id"] for line in f]
+    assert logged == [str(turn) for turn in range(10)]
+    assert writers and caller not in writers